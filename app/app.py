@@ -152,6 +152,27 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
+def render_recommendations(gemini_client, text_input=None, image_input=None):
+    """Stream the model's recommendations, then append their validation"""
+    st.markdown('<h2 class="sub-header">LCSH Recommendations</h2>', unsafe_allow_html=True)
+    
+    # The response renders as it is generated; validation waits for the full text
+    response_area = st.empty()
+    model_response = response_area.write_stream(
+        gemini_client.stream_model_response(text_input=text_input, image_input=image_input)
+    )
+    if not model_response:
+        st.warning("Unable to generate recommendations. Please try again with different input.")
+        return
+    
+    with st.spinner("Validating LCSH recommendations..."):
+        resolved_response, validation = gemini_client.complete_recommendations(model_response)
+    
+    # Show authorized headings in place of the variant labels the model streamed
+    if resolved_response != model_response:
+        response_area.markdown(resolved_response)
+    st.markdown(validation)
+
 def main():
     """Main application function"""
     load_css()
@@ -209,19 +230,14 @@ def main():
             if not text_input:
                 st.error("Please enter some bibliographic information.")
             else:
-                with st.spinner("Generating LCSH recommendations..."):
-                    try:
-                        # Initialize Gemini client
-                        gemini_client = GeminiClient(api_key)
-                        
-                        # Generate recommendations
-                        result = gemini_client.generate_lcsh_recommendations(text_input=text_input)
-                        
-                        # Display results
-                        st.markdown('<h2 class="sub-header">LCSH Recommendations</h2>', unsafe_allow_html=True)
-                        st.markdown(result)
-                    except Exception as e:
-                        st.error(f"Error generating recommendations: {str(e)}")
+                try:
+                    # Initialize Gemini client
+                    gemini_client = GeminiClient(api_key)
+                    
+                    # Generate and display recommendations
+                    render_recommendations(gemini_client, text_input=text_input)
+                except Exception as e:
+                    st.error(f"Error generating recommendations: {str(e)}")
     
     # File upload tab
     with tab2:
@@ -252,28 +268,21 @@ def main():
             if not uploaded_files:
                 st.error("Please upload at least one file.")
             else:
-                with st.spinner("Processing files and generating LCSH recommendations..."):
-                    try:
+                try:
+                    with st.spinner("Processing files..."):
                         # Process the uploaded files
                         processed_files = process_multiple_files(uploaded_files)
                         
                         # Combine file contents
                         combined_text, first_image = combine_file_contents(processed_files)
-                        
-                        # Initialize Gemini client
-                        gemini_client = GeminiClient(api_key)
-                        
-                        # Generate recommendations
-                        result = gemini_client.generate_lcsh_recommendations(
-                            text_input=combined_text,
-                            image_input=first_image
-                        )
-                        
-                        # Display results
-                        st.markdown('<h2 class="sub-header">LCSH Recommendations</h2>', unsafe_allow_html=True)
-                        st.markdown(result)
-                    except Exception as e:
-                        st.error(f"Error processing files or generating recommendations: {str(e)}")
+                    
+                    # Initialize Gemini client
+                    gemini_client = GeminiClient(api_key)
+                    
+                    # Generate and display recommendations
+                    render_recommendations(gemini_client, text_input=combined_text, image_input=first_image)
+                except Exception as e:
+                    st.error(f"Error processing files or generating recommendations: {str(e)}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Async LCSH API Module - Handles interactions with the LCSH API from asyncio code
+"""
+import asyncio
+import httpx
+from typing import List, Dict, Any, Union, Optional
+
+class AsyncLCSHApi:
+    """
+    Asyncio client for interacting with the LCSH API
+
+    Drop-in counterpart to ``LCSHApi`` for event-loop based servers and batch
+    runners: ``await get_recommendations(terms)`` returns the same dictionary
+    shape, so results can be passed straight to
+    ``GeminiClient.format_validation_results``. A semaphore bounds how many
+    requests are in flight at once, independently of the connection pool.
+    """
+    def __init__(self,
+                 base_url: str = "https://lcsh.098484.xyz",
+                 max_concurrency: int = 64,
+                 semaphore: Optional[asyncio.Semaphore] = None,
+                 max_connections: int = 32,
+                 max_keepalive_connections: int = 16,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 15.0):
+        """
+        Initialize the async LCSH API client
+
+        Args:
+            base_url: Base URL of the LCSH API
+            max_concurrency: Maximum number of requests in flight at once
+            semaphore: Semaphore to bound concurrency with, e.g. one shared by
+                several clients. Overrides ``max_concurrency`` when given.
+            max_connections: Maximum number of open connections
+            max_keepalive_connections: Maximum number of idle keep-alive connections
+            connect_timeout: Seconds to wait for a connection to be established
+            read_timeout: Seconds to wait for the server to send a response
+        """
+        self.base_url = base_url
+        self.recommend_endpoint = f"{self.base_url}/recommend"
+        self.semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+
+        # Usage counters; only touched from the event loop, so no lock needed
+        self._requests = 0
+        self._errors = 0
+        self._deadlines_exceeded = 0
+        self._waiting = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """
+        Close all pooled connections. The client cannot be used afterwards.
+        """
+        await self._client.aclose()
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get concurrency and request counters
+
+        Returns:
+            Dictionary with request counters
+        """
+        return {
+            "requests": self._requests,
+            "errors": self._errors,
+            "deadlines_exceeded": self._deadlines_exceeded,
+            "waiting": self._waiting,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "closed": self.closed,
+        }
+
+    async def get_recommendations(self,
+                                  terms: Union[List[str], str],
+                                  timeout: Optional[float] = None,
+                                  deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        The deadline covers both waiting for a concurrency slot and the request
+        itself. Cancelling the calling task cancels the request and releases its
+        slot; ``asyncio.CancelledError`` is propagated, not turned into an error
+        result.
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+            timeout: Seconds from now after which to give up
+            deadline: Event loop time (``loop.time()``) after which to give up.
+                The earlier of ``timeout`` and ``deadline`` applies.
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if self.closed:
+            return {
+                "error": "LCSH API client is closed",
+                "recommendations": []
+            }
+
+        if timeout is not None:
+            timeout_deadline = asyncio.get_running_loop().time() + timeout
+            deadline = timeout_deadline if deadline is None else min(deadline, timeout_deadline)
+
+        self._requests += 1
+        try:
+            async with asyncio.timeout_at(deadline):
+                self._waiting += 1
+                try:
+                    await self.semaphore.acquire()
+                finally:
+                    self._waiting -= 1
+
+                self._in_flight += 1
+                self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+                try:
+                    payload = {"terms": terms}
+                    response = await self._client.post(self.recommend_endpoint, json=payload)
+                    response.raise_for_status()
+                    return response.json()
+                finally:
+                    self._in_flight -= 1
+                    self.semaphore.release()
+        except TimeoutError:
+            self._errors += 1
+            self._deadlines_exceeded += 1
+            return {
+                "error": "LCSH API request exceeded its deadline",
+                "recommendations": []
+            }
+        except (httpx.HTTPError, ValueError) as e:
+            self._errors += 1
+            # Handle API errors gracefully, matching LCSHApi
+            return {
+                "error": str(e),
+                "recommendations": []
+            }
@@ -0,0 +1,3 @@
+"""
+Authority Package - Local index of Library of Congress authority data
+"""
@@ -0,0 +1,200 @@
+"""
+Authority Command Line - Builds the local authority index
+
+Usage:
+    python -m app.authority ingest DUMP [DUMP ...] --output HEADINGS [--workers N]
+    python -m app.authority build HEADINGS --output INDEX_DIR
+    python -m app.authority update INDEX_DIR CHANGES [CHANGES ...] [--cancelled URIS]
+    python -m app.authority compact INDEX_DIR [--headings HEADINGS]
+    python -m app.authority related INDEX_DIR TERM [--relation narrower] [--hops N]
+    python -m app.authority embed INDEX_DIR [--embedder hashing|sentence|gemini] [--dtype int8|float16|pq]
+
+The default hashing embedder is lexical and finds reworded labels but not
+synonyms or paraphrases. For those, embed with the local, CPU-only
+"sentence" embedder (pip install "lcsh-chatbot[semantic]") or with Gemini.
+    python -m app.authority similar INDEX_DIR TERM [-k N]
+    python -m app.authority eval-ann INDEX_DIR [--queries N] [-k N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from app.authority.builder import build_index
+from app.authority.graph import RELATIONS, NARROWER
+from app.authority.heading_table import HeadingTable
+from app.authority.ingest import ingest, print_progress, read_headings
+from app.authority.records import iter_dump_records
+from app.authority.semantic import SemanticIndex, HashingEmbedder, SentenceEmbedder, GeminiEmbedder
+from app.authority.shards import ingest_parallel
+from app.authority.updates import COMPACT_AFTER, apply_changes, compact, read_uri_list, reset_manifest
+from app.local_lcsh_api import SegmentedLCSHApi
+
+def ingest_command(args: argparse.Namespace) -> None:
+    """Stream LC bulk download files into a headings file"""
+    if args.workers == 1:
+        stats = ingest(args.dumps, args.output, progress=print_progress)
+    else:
+        stats = ingest_parallel(args.dumps, args.output, workers=args.workers or None)
+    print(f"Ingested {stats['records']:,} records from {stats['triples']:,} triples "
+          f"in {stats['seconds']:.1f}s ({stats['triples_per_second']:,.0f} triples/sec) -> {args.output}")
+
+def build_command(args: argparse.Namespace) -> None:
+    """Build the memory-mapped index directory from a headings file"""
+    build_index(args.headings, args.output, log=print)
+    # A fresh build starts a new manifest; change files are applied on top of it
+    reset_manifest(args.output, args.headings)
+
+def update_command(args: argparse.Namespace) -> None:
+    """Apply LC change files to an index as a delta segment"""
+    def records():
+        for path in args.changes:
+            # Headings files from the ingest command, or raw N-Triples / JSON-LD change dumps
+            if path.endswith((".tsv", ".tsv.gz")):
+                yield from read_headings(path)
+            else:
+                yield from iter_dump_records(path)
+
+    cancelled = read_uri_list(args.cancelled) if args.cancelled else []
+    apply_changes(args.index, records(), cancelled, compact_after=args.compact_after, log=print)
+
+def compact_command(args: argparse.Namespace) -> None:
+    """Merge the delta segments of an index into a new base"""
+    try:
+        compact(args.index, args.headings, log=print)
+    except ValueError as error:
+        sys.exit(f"{error}; pass it with --headings")
+
+def related_command(args: argparse.Namespace) -> None:
+    """Print the headings linked to a term in the index"""
+    result = SegmentedLCSHApi.from_path(args.index).related_headings(args.term, args.relation, args.hops, args.limit)
+    if result.get("error"):
+        sys.exit(result["error"])
+    if result["heading"] is None:
+        sys.exit(f"No heading matches {args.term!r}")
+    heading = result["heading"]
+    print(f"{heading['term']} ({heading['id']})")
+    for item in result["related"]:
+        print(f"{'  ' * item['hops']}{item['term']} ({item['id']})")
+
+def embed_command(args: argparse.Namespace) -> None:
+    """Embed every label and scope note of an index and write its semantic search index"""
+    if args.embedder == GeminiEmbedder.name:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            sys.exit("GEMINI_API_KEY is required for Gemini embeddings")
+        embedder = GeminiEmbedder(api_key, dim=args.dim)
+    elif args.embedder == SentenceEmbedder.name:
+        try:
+            embedder = SentenceEmbedder(args.model or SentenceEmbedder.DEFAULT_MODEL)
+        except ImportError as error:
+            sys.exit(str(error))
+    else:
+        embedder = HashingEmbedder(args.dim)
+    started = time.perf_counter()
+    stats = SemanticIndex.build(HeadingTable(args.index), args.index, embedder, args.dtype, args.lists,
+                                args.subspaces)
+    print(f"Embedded {stats['vectors']:,} labels and scope notes into {stats['lists']:,} lists "
+          f"({stats['bytes'] / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s -> {args.index}")
+
+def similar_command(args: argparse.Namespace) -> None:
+    """Print the nearest headings to a term by embedding similarity"""
+    table = HeadingTable(args.index)
+    index = SemanticIndex(args.index, table, nprobe=args.nprobe)
+    for row, score in index.search([args.term], args.k)[0]:
+        print(f"{score:.3f}  {table.label(row)} ({table.id(row)})")
+
+def eval_ann_command(args: argparse.Namespace) -> None:
+    """Report recall@k of the semantic search against an exhaustive scan"""
+    table = HeadingTable(args.index)
+    index = SemanticIndex(args.index, table, nprobe=args.nprobe, rerank=args.rerank)
+    # Labels with a word dropped, so queries are near but not on stored vectors
+    rng = random.Random(args.seed)
+    queries = []
+    for row in rng.sample(range(len(table)), min(args.queries, len(table))):
+        words = table.label(row).split()
+        if len(words) > 1:
+            del words[rng.randrange(len(words))]
+        queries.append(" ".join(words))
+    stats = index.evaluate(queries, args.k)
+    print(f"{index.meta['dtype']} index, {len(index):,} vectors, nprobe {args.nprobe}: "
+          f"recall@{args.k} {stats['recall']:.3f} over {stats['queries']:,} queries, "
+          f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, "
+          f"{stats['bytes_per_vector']} bytes scanned per vector ({stats['compression']:.0f}x smaller than float32)")
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.authority", description="Local LC authority index tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Stream LC bulk downloads into a compact headings file")
+    ingest_parser.add_argument("dumps", nargs="+", help="N-Triples or line-delimited JSON-LD files (optionally .gz)")
+    ingest_parser.add_argument("--output", "-o", required=True, help="Headings file to write (.gz to compress)")
+    ingest_parser.add_argument("--workers", "-j", type=int, default=1,
+                               help="Worker processes for a sharded, sorted build (0 = one per CPU)")
+    ingest_parser.set_defaults(handler=ingest_command)
+
+    build_parser = commands.add_parser("build", help="Build the memory-mapped index from a headings file")
+    build_parser.add_argument("headings", help="Headings file written by the ingest command")
+    build_parser.add_argument("--output", "-o", required=True, help="Index directory to write")
+    build_parser.set_defaults(handler=build_command)
+
+    update_parser = commands.add_parser("update", help="Apply LC change files to an index as a delta segment")
+    update_parser.add_argument("index", help="Index directory written by the build command")
+    update_parser.add_argument("changes", nargs="*",
+                               help="New and changed records: headings files (.tsv) or N-Triples / JSON-LD dumps")
+    update_parser.add_argument("--cancelled", help="File of cancelled heading URIs, one per line")
+    update_parser.add_argument("--compact-after", type=int, default=COMPACT_AFTER,
+                               help="Compact once there are more segments than this (0 = never)")
+    update_parser.set_defaults(handler=update_command)
+
+    compact_parser = commands.add_parser("compact", help="Merge the delta segments of an index into a new base")
+    compact_parser.add_argument("index", help="Index directory written by the build command")
+    compact_parser.add_argument("--headings", help="Headings file the base was built from, if not recorded")
+    compact_parser.set_defaults(handler=compact_command)
+
+    related_parser = commands.add_parser("related", help="Show headings linked to a term by BT/NT/RT relations")
+    related_parser.add_argument("index", help="Index directory written by the build command")
+    related_parser.add_argument("term", help="Heading to start from")
+    related_parser.add_argument("--relation", "-r", choices=RELATIONS, default=NARROWER, help="Relation to follow")
+    related_parser.add_argument("--hops", type=int, default=1, help="Maximum number of links to follow")
+    related_parser.add_argument("--limit", "-n", type=int, default=20, help="Maximum number of headings to show")
+    related_parser.set_defaults(handler=related_command)
+
+    embed_parser = commands.add_parser("embed", help="Build the semantic search index of a built index")
+    embed_parser.add_argument("index", help="Index directory written by the build command")
+    embed_parser.add_argument("--embedder", choices=(HashingEmbedder.name, SentenceEmbedder.name, GeminiEmbedder.name),
+                              default=HashingEmbedder.name,
+                              help="Offline feature hashing, a local sentence-transformers model, "
+                                   "or the Gemini embedding API")
+    embed_parser.add_argument("--model", default=None,
+                              help=f"Model of the sentence embedder (default {SentenceEmbedder.DEFAULT_MODEL})")
+    embed_parser.add_argument("--dim", type=int, default=256,
+                              help="Embedding dimensions; the sentence embedder uses its model's")
+    embed_parser.add_argument("--dtype", choices=("int8", "float16", "pq"), default="int8",
+                              help="Stored vector type; pq scans product-quantized codes and re-ranks")
+    embed_parser.add_argument("--subspaces", type=int, default=32, help="Bytes per vector with --dtype pq")
+    embed_parser.add_argument("--lists", type=int, default=None, help="Number of IVF lists (default 2 * sqrt(labels))")
+    embed_parser.set_defaults(handler=embed_command)
+
+    similar_parser = commands.add_parser("similar", help="Show the nearest headings to a term by embedding")
+    similar_parser.add_argument("index", help="Index directory with a semantic search index")
+    similar_parser.add_argument("term", help="Term to look up")
+    similar_parser.add_argument("-k", type=int, default=10, help="Number of headings to show")
+    similar_parser.add_argument("--nprobe", type=int, default=16, help="Number of lists to scan")
+    similar_parser.set_defaults(handler=similar_command)
+
+    eval_parser = commands.add_parser("eval-ann", help="Measure recall@k of the semantic search against exact search")
+    eval_parser.add_argument("index", help="Index directory with a semantic search index")
+    eval_parser.add_argument("--queries", type=int, default=1000, help="Number of sampled queries")
+    eval_parser.add_argument("-k", type=int, default=10, help="Number of nearest labels compared")
+    eval_parser.add_argument("--nprobe", type=int, default=16, help="Number of lists to scan")
+    eval_parser.add_argument("--rerank", type=int, default=100, help="Candidates re-scored exactly in pq mode")
+    eval_parser.add_argument("--seed", type=int, default=0, help="Seed for sampling queries")
+    eval_parser.set_defaults(handler=eval_ann_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,82 @@
+"""
+Authority Builder Module - Builds every structure of an index directory from a headings file
+"""
+import time
+from typing import Dict, Any, Optional, Callable
+
+from app.authority.compound import CompoundIndex
+from app.authority.graph import RelationGraph
+from app.authority.heading_table import HeadingTable
+from app.authority.ingest import read_headings
+from app.authority.membership import HeadingMembership
+from app.authority.names import NameIndex
+from app.authority.romanization import RomanizationTable
+from app.authority.scorer import SimilarityScorer
+from app.authority.trigram import TrigramIndex
+from app.authority.variants import VariantTable
+
+def build_index(headings_path: str, directory: str,
+                log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Build the memory-mapped index directory from a headings file
+
+    Each structure is written in turn and reopened from disk by the next
+    one, so only one of them is in memory at a time. The semantic index is
+    not part of this; it is built separately with the ``embed`` command.
+
+    Args:
+        headings_path: Headings file written by the ingest command
+        directory: Index directory to write
+        log: Called with one line of progress per structure built
+
+    Returns:
+        Dictionary with the number of headings, variants and links
+    """
+    log = log or (lambda line: None)
+
+    started = time.perf_counter()
+    stats = HeadingTable.build(read_headings(headings_path), directory)
+    totals = dict(stats)
+    log(f"Built table of {stats['headings']:,} headings and {stats['variants']:,} variants "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = HeadingMembership.build(HeadingTable(directory), directory)
+    log(f"Built membership check of {stats['keys']:,} headings ({stats['bytes'] / 1e6:.1f} MB) "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = VariantTable.build(HeadingTable(directory), directory)
+    log(f"Built variant table of {stats['keys']:,} see-from labels ({stats['bytes'] / 1e6:.1f} MB) "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = RomanizationTable.build(HeadingTable(directory), directory)
+    log(f"Built romanization table of {stats['keys']:,} folded labels ({stats['bytes'] / 1e6:.1f} MB) "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = NameIndex.build(HeadingTable(directory), directory)
+    log(f"Built name index of {stats['names']:,} personal names under {stats['surnames']:,} surnames "
+        f"({stats['bytes'] / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = CompoundIndex.build(HeadingTable(directory), directory)
+    log(f"Built compound index of {stats['main_headings']:,} main headings and "
+        f"{stats['subdivisions']:,} subdivisions in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = RelationGraph.build(read_headings(headings_path), HeadingTable(directory), directory)
+    totals["links"] = stats
+    log(f"Built relation graph of {stats['broader']:,} broader and {stats['related'] // 2:,} related links "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    stats = TrigramIndex.build(HeadingTable(directory), directory)
+    log(f"Built trigram index of {stats['entries']:,} labels, {stats['trigrams']:,} trigrams "
+        f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    SimilarityScorer.build(TrigramIndex(directory), directory)
+    log(f"Built similarity scorer in {time.perf_counter() - started:.1f}s -> {directory}")
+    return totals
@@ -0,0 +1,188 @@
+"""
+Compound Heading Module - Segment-by-segment validation of "--" subdivided headings
+"""
+import os
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from app.authority.heading_table import HeadingTable, StringPool, FLAG_COMPOUND
+from app.normalize import heading_key
+
+SEPARATOR = "--"
+
+# Chronological subdivisions are open-ended ("1945-", "20th century", "To 1500")
+_CHRONOLOGICAL = re.compile(r"^(?:to |ca\. )?\d{1,4}(?:th|st|nd|rd)? ?(?:century|-\d{0,4}|\d*)(?:, .*)?$")
+
+def split_heading(heading: str) -> List[str]:
+    """
+    Split a heading or its folded key into its "--" segments
+    """
+    return [segment.strip() for segment in heading.split(SEPARATOR)]
+
+def is_chronological(segment_key: str) -> bool:
+    """
+    Check whether a folded segment reads as a chronological subdivision
+    """
+    return bool(_CHRONOLOGICAL.match(segment_key))
+
+
+class CompoundIndex:
+    """
+    Main headings and subdivision vocabulary, stored separately
+
+    ``main_keys`` is the sorted pool of folded headings that stand alone (no
+    "--"), with ``main_rows`` pointing at their rows in the heading table.
+    ``subdivision_keys`` is the sorted pool of every segment that follows a
+    "--" in an authorized heading, with its display form in
+    ``subdivision_labels``.
+
+    A compound heading is valid when its first segment is a main heading and
+    every following segment is a subdivision, or when a prefix of it is an
+    established heading in its own right. Validity is decided prefix by
+    prefix, and each prefix's result is cached, so "Motion pictures--Japan"
+    is checked once for every heading that extends it. A heading of ``n``
+    segments costs at most ``n`` binary searches per pool.
+    """
+    def __init__(self, directory: str, table: HeadingTable, cache_size: int = 65536):
+        """
+        Open an index written with ``CompoundIndex.build``
+
+        Args:
+            directory: Index directory
+            table: Heading table the index was built from
+            cache_size: Maximum number of prefixes whose validity is cached
+        """
+        self.table = table
+        self.main_keys = StringPool.open(os.path.join(directory, "main_keys"))
+        self.main_rows = np.load(os.path.join(directory, "main_rows.npy"), mmap_mode="r")
+        self.subdivision_keys = StringPool.open(os.path.join(directory, "subdivision_keys"))
+        self.subdivision_labels = StringPool.open(os.path.join(directory, "subdivision_labels"))
+        self._prefix = lru_cache(maxsize=cache_size)(self._check_prefix)
+
+    @staticmethod
+    def build(table: HeadingTable, directory: str) -> Dict[str, Any]:
+        """
+        Write the main heading and subdivision pools for a heading table
+
+        Args:
+            table: Heading table to split
+            directory: Index directory to write
+
+        Returns:
+            Dictionary with the number of main headings and subdivisions
+        """
+        main: List[Tuple[str, int]] = []
+        subdivisions: Dict[str, str] = {}
+        for row in range(len(table)):
+            key = table.keys[row]
+            if not table.flags[row] & FLAG_COMPOUND:
+                main.append((key, row))
+                continue
+            keys = split_heading(key)
+            labels = split_heading(table.label(row))
+            if len(labels) != len(keys):
+                labels = keys
+            for segment_key, segment_label in zip(keys[1:], labels[1:]):
+                if segment_key:
+                    subdivisions.setdefault(segment_key, segment_label)
+
+        # Table rows are already sorted by key
+        subdivision_items = sorted(subdivisions.items())
+        StringPool.write((key for key, _ in main), os.path.join(directory, "main_keys"))
+        np.save(os.path.join(directory, "main_rows.npy"), np.asarray([row for _, row in main], dtype=np.uint32))
+        StringPool.write((key for key, _ in subdivision_items), os.path.join(directory, "subdivision_keys"))
+        StringPool.write((label for _, label in subdivision_items), os.path.join(directory, "subdivision_labels"))
+        return {"main_headings": len(main), "subdivisions": len(subdivision_items)}
+
+    def main_heading(self, segment_key: str) -> int:
+        """
+        Find a folded segment among the main headings
+
+        Returns:
+            Row of the heading in the table, or -1
+        """
+        index = self.main_keys.find(segment_key)
+        return int(self.main_rows[index]) if index >= 0 else -1
+
+    def subdivision(self, segment_key: str) -> str:
+        """
+        Find a folded segment in the subdivision vocabulary
+
+        Returns:
+            Display form of the subdivision, or an empty string
+        """
+        index = self.subdivision_keys.find(segment_key)
+        if index >= 0:
+            return self.subdivision_labels[index]
+        if is_chronological(segment_key):
+            return segment_key[:1].upper() + segment_key[1:]
+        return ""
+
+    def _check_prefix(self, prefix_key: str) -> Tuple[int, int, Tuple[str, ...]]:
+        """
+        Validate a folded prefix, reusing the cached result for its parent
+
+        Returns:
+            Tuple of (number of leading segments that are valid, row of the
+            longest established prefix or -1, display forms of the valid
+            segments after it). The prefix is valid when the first number
+            equals its segment count.
+        """
+        segments = prefix_key.count(SEPARATOR) + 1
+        if segments == 1:
+            row = self.main_heading(prefix_key)
+            return (1, row, ()) if row >= 0 else (0, -1, ())
+        row = self.table.keys.find(prefix_key)
+        if row >= 0:
+            return segments, row, ()
+
+        parent, segment = prefix_key.rsplit(SEPARATOR, 1)
+        valid, row, tail = self._prefix(parent)
+        if valid < segments - 1:
+            return valid, row, tail
+        label = self.subdivision(segment.strip())
+        if not label:
+            return valid, row, tail
+        return segments, row, tail + (label,)
+
+    def check(self, heading: str) -> Dict[str, Any]:
+        """
+        Validate a compound heading segment by segment
+
+        Args:
+            heading: Heading as written, e.g. "Motion pictures--Japan--History"
+
+        Returns:
+            Dictionary with ``valid``, the folded ``segments``, the index of
+            the first ``invalid_segment`` (None when valid), the table ``row``
+            of the longest established prefix (-1 if none) and the display
+            ``label`` of the heading when valid
+        """
+        segments = split_heading(heading_key(heading))
+        if not all(segments):
+            return {"valid": False, "segments": segments, "invalid_segment": segments.index(""),
+                    "row": -1, "label": ""}
+
+        valid, row, tail = self._prefix(SEPARATOR.join(segments))
+        if valid < len(segments):
+            return {"valid": False, "segments": segments, "invalid_segment": valid, "row": row, "label": ""}
+        return {
+            "valid": True,
+            "segments": segments,
+            "invalid_segment": None,
+            "row": row,
+            "label": SEPARATOR.join([self.table.label(row), *tail]),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        info = self._prefix.cache_info()
+        return {
+            "main_headings": len(self.main_keys),
+            "subdivisions": len(self.subdivision_keys),
+            "prefix_cache_hits": info.hits,
+            "prefix_cache_misses": info.misses,
+            "prefix_cache_size": info.currsize,
+        }
@@ -0,0 +1,266 @@
+"""
+Relation Graph Module - Broader, narrower and related links between headings in CSR form
+"""
+import os
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from app.authority.heading_table import HeadingTable
+from app.authority.records import AuthorityRecord
+
+BROADER = "broader"
+NARROWER = "narrower"
+RELATED = "related"
+RELATIONS = (BROADER, NARROWER, RELATED)
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+# Frontiers up to this size are walked without NumPy, whose per-call overhead dominates
+SMALL_FRONTIER = 32
+
+def _csr(sources: np.ndarray, targets: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turn an edge list into CSR offsets and targets, dropping duplicate edges
+    """
+    codes = np.unique(sources.astype(np.int64) * count + targets.astype(np.int64))
+    sources, targets = codes // count, codes % count
+    offsets = np.zeros(count + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(sources, minlength=count), out=offsets[1:])
+    return offsets, targets.astype(np.uint32)
+
+
+class RelationGraph:
+    """
+    BT/NT/RT links between heading table rows as compressed sparse rows
+
+    Each relation is a pair of memory-mapped arrays: ``{relation}_offsets``
+    (one entry per row plus one) and ``{relation}_targets``, the sorted rows
+    it links to. The broader and narrower links are made inverse of each
+    other at build time and related links symmetric, whichever side of a
+    link the authority data recorded.
+
+    Traversals work a whole frontier at a time. Large frontiers gather the
+    neighbours of every row with one vectorized slice of the targets array,
+    so no Python object is created per node; small ones read the arrays
+    through memoryviews, which avoids NumPy's per-call overhead.
+    """
+    def __init__(self, directory: str, table: HeadingTable):
+        """
+        Open a graph written with ``RelationGraph.build``
+
+        Args:
+            directory: Index directory
+            table: Heading table the graph was built from
+        """
+        self.table = table
+        self.offsets: Dict[str, np.ndarray] = {}
+        self.targets: Dict[str, np.ndarray] = {}
+        for relation in RELATIONS:
+            self.offsets[relation] = np.load(os.path.join(directory, f"graph_{relation}_offsets.npy"), mmap_mode="r")
+            self.targets[relation] = np.load(os.path.join(directory, f"graph_{relation}_targets.npy"), mmap_mode="r")
+        self.nodes = len(table)
+        # A memoryview reads single items far faster than NumPy scalar indexing
+        self._offset_views = {relation: memoryview(offsets) for relation, offsets in self.offsets.items()}
+        self._target_views = {relation: memoryview(targets) if len(targets) else memoryview(b"").cast("I")
+                              for relation, targets in self.targets.items()}
+
+    @staticmethod
+    def build(records: Iterable[AuthorityRecord], table: HeadingTable, directory: str) -> Dict[str, Any]:
+        """
+        Write the graph for the records of a heading table
+
+        Links to records that are not in the table are dropped.
+
+        Args:
+            records: Authority records the table was built from
+            table: Heading table to link
+            directory: Index directory to write
+
+        Returns:
+            Dictionary with the number of links of each relation
+        """
+        count = len(table)
+        rows = {table.uri(row): row for row in range(count)}
+        broader: List[Tuple[int, int]] = []
+        related: List[Tuple[int, int]] = []
+        for record in records:
+            row = rows.get(record.uri)
+            if row is None:
+                continue
+            broader.extend((row, rows[uri]) for uri in record.broader if uri in rows)
+            broader.extend((rows[uri], row) for uri in record.narrower if uri in rows)
+            related.extend((row, rows[uri]) for uri in record.related if uri in rows)
+
+        broader_edges = np.asarray(broader, dtype=np.int64).reshape(-1, 2)
+        related_edges = np.asarray(related, dtype=np.int64).reshape(-1, 2)
+        edges = {
+            BROADER: (broader_edges[:, 0], broader_edges[:, 1]),
+            NARROWER: (broader_edges[:, 1], broader_edges[:, 0]),
+            RELATED: (np.concatenate([related_edges[:, 0], related_edges[:, 1]]),
+                      np.concatenate([related_edges[:, 1], related_edges[:, 0]])),
+        }
+        stats = {}
+        for relation, (sources, targets) in edges.items():
+            offsets, targets = _csr(sources, targets, count)
+            np.save(os.path.join(directory, f"graph_{relation}_offsets.npy"), offsets)
+            np.save(os.path.join(directory, f"graph_{relation}_targets.npy"), targets)
+            stats[relation] = len(targets)
+        return stats
+
+    def neighbors(self, rows, relation: str) -> np.ndarray:
+        """
+        Get the rows linked from any of ``rows`` by a relation
+
+        Args:
+            rows: A row or an array of rows
+            relation: One of "broader", "narrower" or "related"
+
+        Returns:
+            Array of linked rows, possibly with repeats
+        """
+        neighbors, _ = self._gather(np.atleast_1d(np.asarray(rows, dtype=np.int64)), relation)
+        return neighbors
+
+    def _gather(self, rows: np.ndarray, relation: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gather the neighbours of a frontier
+
+        Returns:
+            Tuple of (neighbour rows, index into ``rows`` of the row each
+            neighbour was reached from)
+        """
+        if relation not in self.offsets:
+            raise ValueError(f"Unknown relation {relation!r}; expected one of {', '.join(RELATIONS)}")
+        offsets = self.offsets[relation]
+        starts = offsets[rows].astype(np.int64)
+        lengths = offsets[rows + 1].astype(np.int64) - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return _EMPTY, _EMPTY
+        # Flat positions of every neighbour of every row, without a Python loop
+        flat = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        return self.targets[relation][flat].astype(np.int64), np.repeat(np.arange(len(rows)), lengths)
+
+    def _levels(self, source: int, relations: Tuple[str, ...], max_hops: Optional[int]) -> Iterator[tuple]:
+        """
+        Walk outward from a row one breadth-first level at a time
+
+        Small frontiers, such as the chain of broader headings above a row,
+        are walked directly over memoryviews of the arrays. Once a frontier
+        grows past ``SMALL_FRONTIER`` rows the walk switches to vectorized
+        gathers and a visited mask for the rest of the traversal.
+
+        Yields:
+            Per level, a tuple of (rows first reached at this level, index of
+            each row's parent in the previous level, index into ``relations``
+            of the link used)
+        """
+        for relation in relations:
+            if relation not in self.offsets:
+                raise ValueError(f"Unknown relation {relation!r}; expected one of {', '.join(RELATIONS)}")
+        seen = {source}
+        visited = None
+        frontier = [source]
+        depth = 0
+        while len(frontier) and (max_hops is None or depth < max_hops):
+            depth += 1
+            if visited is None and len(frontier) <= SMALL_FRONTIER:
+                rows, parents, kinds = [], [], []
+                for index, row in enumerate(frontier):
+                    for kind, relation in enumerate(relations):
+                        offsets = self._offset_views[relation]
+                        for neighbor in self._target_views[relation][offsets[row]:offsets[row + 1]]:
+                            if neighbor not in seen:
+                                seen.add(neighbor)
+                                rows.append(neighbor)
+                                parents.append(index)
+                                kinds.append(kind)
+            else:
+                if visited is None:
+                    visited = np.zeros(self.nodes, dtype=bool)
+                    visited[np.fromiter(seen, dtype=np.int64, count=len(seen))] = True
+                frontier = np.asarray(frontier, dtype=np.int64)
+                gathered = [self._gather(frontier, relation) for relation in relations]
+                neighbors = np.concatenate([found for found, _ in gathered])
+                parents = np.concatenate([parents for _, parents in gathered])
+                kinds = np.repeat(np.arange(len(relations)), [len(found) for found, _ in gathered])
+                fresh = ~visited[neighbors]
+                rows, first = np.unique(neighbors[fresh], return_index=True)
+                parents, kinds = parents[fresh][first], kinds[fresh][first]
+                visited[rows] = True
+            if not len(rows):
+                return
+            yield rows, parents, kinds
+            frontier = rows
+
+    def expand(self, row: int, relation: str = NARROWER, hops: Optional[int] = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find every row within a number of hops along one relation
+
+        Args:
+            row: Starting row
+            relation: Relation to follow
+            hops: Maximum number of hops, None to follow the relation to the end
+
+        Returns:
+            Tuple of (rows reached, hop count of each), nearest first; the
+            starting row is not included
+        """
+        # Levels walked without NumPy come first and are converted in one go
+        small_rows: List[int] = []
+        small_depths: List[int] = []
+        reached, depths = [], []
+        for depth, (rows, _, _) in enumerate(self._levels(row, (relation,), hops), 1):
+            if isinstance(rows, list):
+                small_rows.extend(rows)
+                small_depths.extend([depth] * len(rows))
+            else:
+                reached.append(rows)
+                depths.append(np.full(len(rows), depth, dtype=np.int64))
+        reached.insert(0, np.asarray(small_rows, dtype=np.int64))
+        depths.insert(0, np.asarray(small_depths, dtype=np.int64))
+        return np.concatenate(reached), np.concatenate(depths)
+
+    def ancestors(self, row: int) -> np.ndarray:
+        """
+        Get every heading above a row in the hierarchy, nearest first
+        """
+        rows, _ = self.expand(row, BROADER, hops=None)
+        return rows
+
+    def shortest_relation(self, source: int, target: int, max_hops: int = 4) -> Optional[List[Tuple[str, int]]]:
+        """
+        Find the shortest chain of links from one heading to another
+
+        Breadth-first over all three relations at once.
+
+        Args:
+            source: Starting row
+            target: Row to reach
+            max_hops: Longest chain to look for
+
+        Returns:
+            List of (relation, row) steps ending at ``target``, empty when
+            both rows are the same, or None when no chain of at most
+            ``max_hops`` links exists
+        """
+        if source == target:
+            return []
+        levels = []
+        for level in self._levels(source, RELATIONS, max_hops):
+            levels.append(level)
+            if target in level[0]:
+                break
+        else:
+            return None
+
+        path: List[Tuple[str, int]] = []
+        index = int(np.flatnonzero(np.asarray(levels[-1][0]) == target)[0])
+        for rows, parents, kinds in reversed(levels):
+            path.append((RELATIONS[kinds[index]], int(rows[index])))
+            index = int(parents[index])
+        path.reverse()
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        return {relation: len(targets) for relation, targets in self.targets.items()}
@@ -0,0 +1,258 @@
+"""
+Heading Table Module - Memory-mapped, array-backed store of authorized headings
+"""
+import json
+import mmap
+import os
+import re
+from bisect import bisect_left
+from typing import List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+
+from app.authority.ingest import uri_scheme
+from app.authority.records import AuthorityRecord
+from app.normalize import heading_key
+
+FORMAT_VERSION = 1
+
+# Bits of the per-heading flags array
+FLAG_HAS_VARIANTS = 1
+FLAG_COMPOUND = 2
+
+_ID_PARTS = re.compile(r"^([A-Za-z]*)(\d+)$")
+
+class StringPool:
+    """
+    Strings stored back to back in one UTF-8 buffer plus an offsets array
+
+    Opened from disk with ``mmap``, so a pool costs no Python objects and no
+    load time; pages are read on demand and shared between processes through
+    the OS page cache.
+    """
+    def __init__(self, data, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def bisect(self, value: str) -> int:
+        """
+        Find the insertion point of ``value`` in a pool written in sorted order
+        """
+        return bisect_left(self, value)
+
+    def find(self, value: str) -> int:
+        """
+        Find ``value`` in a pool written in sorted order
+
+        Returns:
+            Its index, or -1 when it is not in the pool
+        """
+        index = self.bisect(value)
+        if index < len(self) and self[index] == value:
+            return index
+        return -1
+
+    @staticmethod
+    def write(strings: Iterable[str], path: str) -> None:
+        """
+        Write strings as ``path``.bin and ``path``.offsets.npy
+        """
+        offsets = [0]
+        with open(path + ".bin", "wb") as data:
+            for string in strings:
+                encoded = string.encode("utf-8")
+                data.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        np.save(path + ".offsets.npy", np.asarray(offsets, dtype=np.uint64))
+
+    @classmethod
+    def open(cls, path: str) -> "StringPool":
+        """
+        Memory-map a pool written with ``write``
+        """
+        offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        with open(path + ".bin", "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                data = b""
+            else:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, offsets)
+
+
+class HeadingTable:
+    """
+    Authorized headings in parallel arrays, sorted by folded label
+
+    Row ``i`` has its label in the ``labels`` pool, its folded lookup key in
+    the ``keys`` pool, its scope note in the ``notes`` pool, and its id,
+    flags and MARC subject field in NumPy arrays. Ids are stored as a prefix code plus a number ("sh" +
+    85024107), and URIs are rebuilt from a small table of bases, which also
+    gives each row its vocabulary. Headings of several vocabularies can
+    share a table and even a label. Variant (see-from) labels are kept as a
+    sorted key pool pointing at rows. Every file is memory-mapped, so opening
+    a table takes milliseconds regardless of its size.
+    """
+    def __init__(self, directory: str):
+        """
+        Open a table written with ``HeadingTable.build``
+
+        Args:
+            directory: Index directory
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported heading table format in {directory}")
+
+        self.labels = StringPool.open(os.path.join(directory, "labels"))
+        self.keys = StringPool.open(os.path.join(directory, "keys"))
+        self.variant_keys = StringPool.open(os.path.join(directory, "variant_keys"))
+        self.variant_rows = np.load(os.path.join(directory, "variant_rows.npy"), mmap_mode="r")
+        self.id_prefix = np.load(os.path.join(directory, "id_prefix.npy"), mmap_mode="r")
+        self.id_number = np.load(os.path.join(directory, "id_number.npy"), mmap_mode="r")
+        self.id_width = np.load(os.path.join(directory, "id_width.npy"), mmap_mode="r")
+        self.uri_base = np.load(os.path.join(directory, "uri_base.npy"), mmap_mode="r")
+        self.flags = np.load(os.path.join(directory, "flags.npy"), mmap_mode="r")
+        # Tables built before headings were tagged have no tags; every row is then untagged
+        tags_path = os.path.join(directory, "tags.npy")
+        self.tags = np.load(tags_path, mmap_mode="r") if os.path.exists(tags_path) else None
+        # Likewise for scope notes
+        notes_path = os.path.join(directory, "notes")
+        self.notes = StringPool.open(notes_path) if os.path.exists(notes_path + ".bin") else None
+        self.schemes = [uri_scheme(base) for base in self.meta["uri_bases"]]
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def label(self, row: int) -> str:
+        return self.labels[row]
+
+    def note(self, row: int) -> str:
+        """
+        Get the scope note of a heading, or "" when it has none
+        """
+        return self.notes[row] if self.notes is not None else ""
+
+    def id(self, row: int) -> str:
+        prefix = self.meta["id_prefixes"][self.id_prefix[row]]
+        width = int(self.id_width[row])
+        return prefix + str(int(self.id_number[row])).zfill(width) if width else prefix
+
+    def uri(self, row: int) -> str:
+        return self.meta["uri_bases"][self.uri_base[row]] + self.id(row)
+
+    def tag(self, row: int) -> int:
+        """
+        Get the MARC subject field of a heading, e.g. 650, or 0 when unknown
+        """
+        return int(self.tags[row]) if self.tags is not None else 0
+
+    def scheme(self, row: int) -> str:
+        """
+        Get the vocabulary of a heading, e.g. "lcsh" or "lcnaf"
+        """
+        return self.schemes[self.uri_base[row]]
+
+    def find(self, term: str) -> int:
+        """
+        Find the heading whose authorized label matches a term
+
+        Returns:
+            Row of the heading, or -1
+        """
+        return self.keys.find(heading_key(term))
+
+    def find_variant(self, term: str) -> int:
+        """
+        Find the heading that has a term as a variant (see-from) label
+
+        Returns:
+            Row of the authorized heading, or -1
+        """
+        index = self.variant_keys.find(heading_key(term))
+        return int(self.variant_rows[index]) if index >= 0 else -1
+
+    @staticmethod
+    def build(records: Iterable[AuthorityRecord], directory: str) -> Dict[str, Any]:
+        """
+        Write the table for a set of records
+
+        Args:
+            records: Authority records, in any order; they are sorted by
+                folded label here. Records sharing a URI, e.g. parts of one
+                record found apart in a dump, are merged into one heading
+            directory: Index directory to write
+
+        Returns:
+            Dictionary with the number of headings and variants written
+        """
+        os.makedirs(directory, exist_ok=True)
+        by_uri: Dict[str, AuthorityRecord] = {}
+        for record in records:
+            merged = by_uri.setdefault(record.uri, record)
+            if merged is not record:
+                merged.merge(record)
+        rows: List[Tuple[str, str, AuthorityRecord]] = sorted(
+            ((heading_key(record.label), record.uri, record) for record in by_uri.values()),
+            key=lambda item: (item[0], item[1])
+        )
+
+        id_prefixes: Dict[str, int] = {}
+        uri_bases: Dict[str, int] = {}
+        count = len(rows)
+        id_prefix = np.zeros(count, dtype=np.uint16)
+        id_number = np.zeros(count, dtype=np.uint64)
+        id_width = np.zeros(count, dtype=np.uint8)
+        uri_base = np.zeros(count, dtype=np.uint16)
+        flags = np.zeros(count, dtype=np.uint8)
+        tags = np.zeros(count, dtype=np.uint16)
+        variants: Dict[str, int] = {}
+        authorized = set()
+
+        for row, (key, uri, record) in enumerate(rows):
+            record_id = record.id
+            match = _ID_PARTS.match(record_id)
+            prefix, digits = (match.group(1), match.group(2)) if match else (record_id, "")
+            id_prefix[row] = id_prefixes.setdefault(prefix, len(id_prefixes))
+            id_number[row] = int(digits) if digits else 0
+            id_width[row] = len(digits)
+            uri_base[row] = uri_bases.setdefault(uri[:len(uri) - len(record_id)], len(uri_bases))
+            flags[row] = (FLAG_HAS_VARIANTS if record.variants else 0) | (FLAG_COMPOUND if "--" in key else 0)
+            tags[row] = record.tag
+            authorized.add(key)
+            for variant in record.variants:
+                variants.setdefault(heading_key(variant), row)
+
+        # A variant that is also some heading's authorized form resolves to that heading
+        variant_items = sorted((key, row) for key, row in variants.items() if key not in authorized)
+
+        StringPool.write((record.label for _, _, record in rows), os.path.join(directory, "labels"))
+        StringPool.write((key for key, _, _ in rows), os.path.join(directory, "keys"))
+        StringPool.write((record.note for _, _, record in rows), os.path.join(directory, "notes"))
+        StringPool.write((key for key, _ in variant_items), os.path.join(directory, "variant_keys"))
+        np.save(os.path.join(directory, "variant_rows.npy"),
+                np.asarray([row for _, row in variant_items], dtype=np.uint32))
+        np.save(os.path.join(directory, "id_prefix.npy"), id_prefix)
+        np.save(os.path.join(directory, "id_number.npy"), id_number)
+        np.save(os.path.join(directory, "id_width.npy"), id_width)
+        np.save(os.path.join(directory, "uri_base.npy"), uri_base)
+        np.save(os.path.join(directory, "flags.npy"), flags)
+        np.save(os.path.join(directory, "tags.npy"), tags)
+
+        meta = {
+            "format": FORMAT_VERSION,
+            "headings": count,
+            "variants": len(variant_items),
+            "id_prefixes": list(id_prefixes),
+            "uri_bases": list(uri_bases),
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file, indent=2)
+        return {"headings": count, "variants": len(variant_items)}
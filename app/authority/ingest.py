@@ -0,0 +1,186 @@
+"""
+Authority Ingest Module - Streams LC dumps into a compact headings file
+"""
+import gzip
+import sys
+import time
+from typing import List, Dict, Any, Optional, IO, Iterable, Iterator, Callable
+
+from app.authority.records import AuthorityRecord, iter_dump_records
+
+# Well-known URI prefixes, stored as short tokens in the headings file
+URI_PREFIXES = {
+    "lcsh:": "http://id.loc.gov/authorities/subjects/",
+    "lcnaf:": "http://id.loc.gov/authorities/names/",
+    "lcgft:": "http://id.loc.gov/authorities/genreForms/",
+    "fast:": "http://id.worldcat.org/fast/",
+}
+
+COLUMNS = ["uri", "label", "variants", "broader", "narrower", "related", "tag", "note"]
+LIST_COLUMNS = {"variants", "broader", "narrower", "related"}
+# Separates the items of a list column
+ITEM_SEPARATOR = "\x1f"
+
+def compact_uri(uri: str) -> str:
+    for token, prefix in URI_PREFIXES.items():
+        if uri.startswith(prefix):
+            return token + uri[len(prefix):]
+    return uri
+
+def uri_scheme(uri: str) -> str:
+    """
+    Get the vocabulary of a URI, e.g. "lcsh" or "lcnaf", or "" when it is not a known one
+    """
+    for token, prefix in URI_PREFIXES.items():
+        if uri.startswith(prefix):
+            return token[:-1]
+    return ""
+
+def expand_uri(uri: str) -> str:
+    token, _, rest = uri.partition(":")
+    prefix = URI_PREFIXES.get(token + ":")
+    return prefix + rest if prefix else uri
+
+def _clean(text: str) -> str:
+    # Tabs, newlines and the item separator are structural in the headings file
+    return text.replace("\t", " ").replace("\n", " ").replace("\r", " ").replace(ITEM_SEPARATOR, " ")
+
+def format_record(record: AuthorityRecord) -> str:
+    """
+    Serialize a record as one line of the headings file
+    """
+    fields = [
+        compact_uri(record.uri),
+        _clean(record.label),
+        ITEM_SEPARATOR.join(_clean(variant) for variant in record.variants),
+        ITEM_SEPARATOR.join(compact_uri(uri) for uri in record.broader),
+        ITEM_SEPARATOR.join(compact_uri(uri) for uri in record.narrower),
+        ITEM_SEPARATOR.join(compact_uri(uri) for uri in record.related),
+        str(record.tag) if record.tag else "",
+        _clean(record.note),
+    ]
+    return "\t".join(fields) + "\n"
+
+def parse_record(line: str, columns: List[str] = COLUMNS) -> AuthorityRecord:
+    """
+    Parse one line of the headings file
+
+    Args:
+        line: Line without its header
+        columns: Column names from the file header
+
+    Returns:
+        The record
+    """
+    values = dict(zip(columns, line.rstrip("\n").split("\t")))
+    record = AuthorityRecord(uri=expand_uri(values["uri"]), label=values.get("label", ""))
+    for column in LIST_COLUMNS:
+        items = values.get(column, "")
+        items = items.split(ITEM_SEPARATOR) if items else []
+        if column != "variants":
+            items = [expand_uri(item) for item in items]
+        setattr(record, column, items)
+    tag = values.get("tag", "")
+    record.tag = int(tag) if tag else 0
+    record.note = values.get("note", "")
+    return record
+
+def open_headings(path: str, mode: str = "r") -> IO[str]:
+    """
+    Open a headings file as text, gzipped when the path ends in .gz
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def write_headings(records: Iterable[AuthorityRecord], output: IO[str]) -> int:
+    """
+    Write records to an open headings file
+
+    Args:
+        records: Records to write
+        output: Text file opened for writing
+
+    Returns:
+        Number of records written
+    """
+    output.write("#" + "\t".join(COLUMNS) + "\n")
+    count = 0
+    for record in records:
+        output.write(format_record(record))
+        count += 1
+    return count
+
+def read_headings(path: str) -> Iterator[AuthorityRecord]:
+    """
+    Stream the records of a headings file
+
+    Args:
+        path: Path of the headings file
+
+    Yields:
+        Records in file order
+    """
+    with open_headings(path) as headings:
+        columns = COLUMNS
+        for line in headings:
+            if line.startswith("#"):
+                columns = line[1:].rstrip("\n").split("\t")
+                continue
+            if line.strip():
+                yield parse_record(line, columns)
+
+def ingest(dumps: List[str],
+           output_path: str,
+           progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+           progress_every: float = 5.0) -> Dict[str, Any]:
+    """
+    Stream LC dump files into a compact headings file
+
+    Records flow through a generator pipeline (read line, parse triple,
+    assemble record, write line), so peak memory stays constant no matter
+    how large the dumps are.
+
+    Args:
+        dumps: N-Triples or JSON-LD dump files, optionally gzipped
+        output_path: Path of the headings file to write (.gz to compress)
+        progress: Called with the running stats every ``progress_every`` seconds
+        progress_every: Seconds between progress reports
+
+    Returns:
+        Dictionary with triples and records processed, elapsed seconds and
+        throughput in triples per second
+    """
+    stats = {"triples": 0, "records": 0}
+    started = time.perf_counter()
+    last_report = started
+
+    def records() -> Iterator[AuthorityRecord]:
+        nonlocal last_report
+        for path in dumps:
+            for record in iter_dump_records(path, stats):
+                stats["records"] += 1
+                yield record
+                now = time.perf_counter()
+                if progress is not None and now - last_report >= progress_every:
+                    last_report = now
+                    progress(_with_rate(stats, now - started))
+
+    with open_headings(output_path, "w") as output:
+        write_headings(records(), output)
+    return _with_rate(stats, time.perf_counter() - started)
+
+def _with_rate(stats: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    return {
+        "triples": stats["triples"],
+        "records": stats["records"],
+        "seconds": elapsed,
+        "triples_per_second": stats["triples"] / elapsed if elapsed > 0 else 0.0,
+    }
+
+def print_progress(stats: Dict[str, Any]) -> None:
+    """
+    Report ingest progress on stderr
+    """
+    print(f"  {stats['triples']:,} triples, {stats['records']:,} records, "
+          f"{stats['triples_per_second']:,.0f} triples/sec", file=sys.stderr)
@@ -0,0 +1,247 @@
+"""
+Membership Module - Bloom filter and minimal perfect hash over authorized headings
+"""
+import json
+import os
+from hashlib import blake2b
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+from app.authority.heading_table import HeadingTable
+from app.normalize import heading_key
+
+MASK64 = (1 << 64) - 1
+# Displacement values with this bit set store a singleton bucket's slot directly
+DIRECT = 1 << 31
+
+def mix64(value):
+    """
+    SplitMix64 finalizer; works on Python ints and uint64 arrays alike
+    """
+    if isinstance(value, np.ndarray):
+        value = value ^ (value >> np.uint64(30))
+        value = value * np.uint64(0xBF58476D1CE4E5B9)
+        value = value ^ (value >> np.uint64(27))
+        value = value * np.uint64(0x94D049BB133111EB)
+        return value ^ (value >> np.uint64(31))
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+def key_hashes(key: str) -> Tuple[int, int]:
+    """
+    Hash a folded key into two independent 64-bit values
+    """
+    digest = blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+    """
+    Bit array answering "definitely not present" for most non-members
+
+    Positions come from double hashing, ``h1 + i * h2`` for ``i < k``.
+    """
+    def __init__(self, bits: np.ndarray, hash_count: int):
+        # A memoryview reads single bytes far faster than NumPy scalar indexing
+        self.bits = memoryview(bits) if len(bits) else b""
+        self.size = len(bits) * 8
+        self.hash_count = hash_count
+
+    def __contains__(self, hashes: Tuple[int, int]) -> bool:
+        h1, h2 = hashes
+        bits = self.bits
+        for i in range(self.hash_count):
+            position = ((h1 + i * h2) & MASK64) % self.size
+            if not bits[position >> 3] >> (position & 7) & 1:
+                return False
+        return True
+
+    @staticmethod
+    def build(h1: np.ndarray, h2: np.ndarray, bits_per_key: int = 10) -> Tuple[np.ndarray, int]:
+        """
+        Set the bits for every key
+
+        Args:
+            h1, h2: Hashes of the keys, see ``key_hashes``
+            bits_per_key: Filter size; 10 bits per key gives about 1% false positives
+
+        Returns:
+            Tuple of (packed bit array, number of hash functions)
+        """
+        size = max(64, len(h1) * bits_per_key)
+        size += -size % 8
+        hash_count = max(1, round(bits_per_key * 0.693))
+        flags = np.zeros(size, dtype=bool)
+        for i in range(hash_count):
+            flags[(h1 + np.uint64(i) * h2) % np.uint64(size)] = True
+        return np.packbits(flags, bitorder="little"), hash_count
+
+
+class PerfectHash:
+    """
+    Minimal perfect hash built with hash-and-displace
+
+    Keys are spread over buckets by ``h1``. Each bucket stores one
+    displacement ``d`` that sends all of its keys to free slots
+    ``mix64(h2 ^ d * MIX) % slots``. Buckets are placed largest first while the
+    table is still empty, and single-key buckets are placed last by storing
+    their free slot directly, so there are exactly as many slots as keys.
+    """
+    # Odd 64-bit constant (golden ratio) that spreads consecutive displacements
+    MIX = 0x9E3779B97F4A7C15
+    # Displacements tried at once per bucket while building
+    TRIES = 64
+
+    def __init__(self, displacements: np.ndarray, slots: int):
+        self.displacements = memoryview(displacements) if len(displacements) else []
+        self.slots = slots
+
+    def slot(self, hashes: Tuple[int, int]) -> int:
+        h1, h2 = hashes
+        displacement = self.displacements[h1 % len(self.displacements)]
+        if displacement & DIRECT:
+            return displacement & ~DIRECT
+        return mix64(h2 ^ ((displacement * self.MIX) & MASK64)) % self.slots
+
+    @classmethod
+    def build(cls, h1: np.ndarray, h2: np.ndarray, bucket_size: float = 3.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find a displacement per bucket
+
+        Args:
+            h1, h2: Hashes of the keys as uint64 arrays, see ``key_hashes``
+            bucket_size: Average number of keys per bucket
+
+        Returns:
+            Tuple of (displacement per bucket, slot assigned to each key)
+        """
+        count = len(h1)
+        if len(np.unique(np.stack([h1, h2], axis=1), axis=0)) < count:
+            raise ValueError("Keys must be distinct to build a perfect hash")
+        bucket_count = max(1, int(count / bucket_size))
+        bucket_of = (h1 % np.uint64(bucket_count)).astype(np.int64)
+        by_bucket = np.argsort(bucket_of, kind="stable")
+        starts = np.searchsorted(bucket_of[by_bucket], np.arange(bucket_count + 1))
+        sizes = np.diff(starts)
+
+        displacements = np.zeros(bucket_count, dtype=np.uint32)
+        assigned = np.zeros(count, dtype=np.int64)
+        taken = np.zeros(count, dtype=bool)
+        slots_count = np.uint64(count)
+
+        # Largest buckets first; singletons are handled below
+        for bucket in np.argsort(-sizes, kind="stable"):
+            if sizes[bucket] < 2:
+                break
+            keys = by_bucket[starts[bucket]:starts[bucket + 1]]
+            base = 0
+            while True:
+                # Candidate slots for TRIES displacements at once: one row per displacement
+                mix = np.arange(base, base + cls.TRIES, dtype=np.uint64) * np.uint64(cls.MIX)
+                candidates = (mix64(h2[keys][None, :] ^ mix[:, None]) % slots_count).astype(np.int64)
+                ordered = np.sort(candidates, axis=1)
+                distinct = (ordered[:, 1:] != ordered[:, :-1]).all(axis=1)
+                usable = np.flatnonzero(distinct & ~taken[candidates].any(axis=1))
+                if len(usable):
+                    break
+                base += cls.TRIES
+                if base >= DIRECT:
+                    raise ValueError("Could not build a perfect hash")
+            choice = usable[0]
+            displacements[bucket] = base + choice
+            taken[candidates[choice]] = True
+            assigned[keys] = candidates[choice]
+
+        singles = np.flatnonzero(sizes == 1)
+        free = np.flatnonzero(~taken)[:len(singles)]
+        displacements[singles] = np.uint32(DIRECT) | free.astype(np.uint32)
+        assigned[by_bucket[starts[singles]]] = free
+        return displacements, assigned
+
+
+class HeadingMembership:
+    """
+    Exact-membership check for folded authorized headings
+
+    A Bloom filter turns most non-headings away after a few bit probes. Keys
+    that pass go through the minimal perfect hash to a single slot, whose
+    64-bit fingerprint confirms the match and whose row points into the
+    heading table. Everything is a memory-mapped array; for 450,000 headings
+    the files take about 6 MB.
+    """
+    def __init__(self, directory: str):
+        """
+        Open a structure written with ``HeadingMembership.build``
+
+        Args:
+            directory: Index directory
+        """
+        with open(os.path.join(directory, "membership.json"), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        self.bloom = BloomFilter(np.load(os.path.join(directory, "membership_bloom.npy"), mmap_mode="r"),
+                                 meta["hash_count"])
+        self.perfect_hash = PerfectHash(np.load(os.path.join(directory, "membership_displacements.npy"),
+                                                mmap_mode="r"), meta["slots"])
+        self.fingerprints = np.load(os.path.join(directory, "membership_fingerprints.npy"), mmap_mode="r")
+        self.rows = np.load(os.path.join(directory, "membership_rows.npy"), mmap_mode="r")
+        if len(self.rows):
+            self.fingerprints = memoryview(self.fingerprints)
+            self.rows = memoryview(self.rows)
+
+    def __len__(self) -> int:
+        return self.perfect_hash.slots
+
+    @staticmethod
+    def build(table: HeadingTable, directory: str) -> Dict[str, Any]:
+        """
+        Write the Bloom filter and perfect hash for every authorized heading
+
+        Args:
+            table: Heading table to index
+            directory: Index directory to write
+
+        Returns:
+            Dictionary with the number of keys and the bytes written
+        """
+        keys = {table.keys[row]: row for row in reversed(range(len(table)))}
+        hashes = [key_hashes(key) for key in keys]
+        h1 = np.fromiter((hash1 for hash1, _ in hashes), dtype=np.uint64, count=len(hashes))
+        h2 = np.fromiter((hash2 for _, hash2 in hashes), dtype=np.uint64, count=len(hashes))
+
+        bloom, hash_count = BloomFilter.build(h1, h2)
+        displacements, assigned = PerfectHash.build(h1, h2)
+        fingerprints = np.zeros(len(keys), dtype=np.uint64)
+        rows = np.zeros(len(keys), dtype=np.uint32)
+        fingerprints[assigned] = h1
+        rows[assigned] = np.fromiter(keys.values(), dtype=np.uint32, count=len(keys))
+
+        arrays = {
+            "bloom": bloom,
+            "displacements": displacements,
+            "fingerprints": fingerprints,
+            "rows": rows,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"membership_{name}.npy"), array)
+        with open(os.path.join(directory, "membership.json"), "w", encoding="utf-8") as file:
+            json.dump({"hash_count": hash_count, "slots": len(keys)}, file, indent=2)
+        return {"keys": len(keys), "bytes": sum(array.nbytes for array in arrays.values())}
+
+    def find(self, term: str) -> int:
+        """
+        Find the heading whose authorized label matches a term
+
+        Returns:
+            Row of the heading in the table, or -1
+        """
+        if not self.perfect_hash.slots:
+            return -1
+        hashes = key_hashes(heading_key(term))
+        if hashes not in self.bloom:
+            return -1
+        slot = self.perfect_hash.slot(hashes)
+        if self.fingerprints[slot] != hashes[0]:
+            return -1
+        return self.rows[slot]
@@ -0,0 +1,492 @@
+"""
+Personal Names Module - Surname-keyed index of personal name headings with date-aware matching
+"""
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.authority.heading_table import HeadingTable
+from app.authority.membership import key_hashes
+from app.normalize import heading_key, fold_romanization
+
+# MARC subject field of personal and family names
+PERSONAL_NAME_TAG = 600
+
+# Bounds of a date that is not known; they overlap every year
+NO_YEAR_LO = -32768
+NO_YEAR_HI = 32767
+NO_DATES = (NO_YEAR_LO, NO_YEAR_HI, NO_YEAR_LO, NO_YEAR_HI)
+# Years either side of "ca. 1450" / "approximately 1450", and of "1450?"
+APPROXIMATE_YEARS = 10
+UNCERTAIN_YEARS = 1
+# Longest span assumed between birth and an active period, or an active period and death
+LIFESPAN = 90
+
+# A comma-separated part of a name that holds its dates, in AACR2 and RDA wording
+_DATE_PART = re.compile(r"^(?:(?:b|d|fl|ca|approx)\.|born|died|active|flourished|approximately|circa|-)?\s*\d")
+_BORN = re.compile(r"^(?:b\.|born)\s*")
+_DIED = re.compile(r"^(?:d\.|died)\s*")
+_ACTIVE = re.compile(r"^(?:fl\.|active|flourished)\s*")
+_APPROXIMATE = re.compile(r"^(?:ca\.|circa|approx\.|approximately)\s*")
+_BEFORE_CHRIST = re.compile(r"\s*\b(?:b\.\s?c\.?(?:e\.?)?|bce?)$")
+_CENTURY = re.compile(r"^(\d{1,2})(?:st|nd|rd|th)\s+cent(?:\.|ury)?$")
+_DECADE = re.compile(r"^(\d{1,3})0s$")
+_YEAR = re.compile(r"^(\d{1,4})(\?)?(?:\s+or\s+(\d{1,4})(\?)?)?$")
+# The dates of most names, "1892-1973" or "1950-", parsed without the general rules
+_PLAIN_YEARS = re.compile(r"^(\d{1,4})-(\d{1,4})?$")
+_YEAR_DASH = re.compile(r"(?<=[\d?.])--(?=[\d\s]|$)")
+# Text after the dates, as in the name-title heading "shakespeare, william, 1564-1616. hamlet"
+_TITLE_AFTER_DATES = re.compile(r"[\d?]\.\s+[^\W\d_]")
+# A title in a name without dates, as in "homer. iliad"; "st. john" and initials are not titles
+_TITLE_IN_NAME = re.compile(r"\w{3,}\.\s+\w{2,}")
+_FULLER_FORM = re.compile(r"\s*\(([^)]*)\)")
+_NAME_TOKENS = re.compile(r"[^\W\d_]+")
+# En and em dashes, which ``heading_key`` turns into subdivision separators
+_DATE_DASHES = re.compile(r"\s*(?:--|[–—‐-])\s*")
+
+@dataclass
+class PersonalName:
+    """
+    A personal name split into the parts the name index matches on
+
+    ``surname`` is the entry element, e.g. "tolkien" (or the whole name when
+    it has no forename, e.g. "murasaki shikibu"), ``given`` the forenames
+    ("j. r. r."), ``fuller`` the fuller form in parentheses ("john ronald
+    reuel") and ``dates`` the birth and death year ranges, see
+    ``parse_dates``. Parts are folded with ``heading_key``.
+    """
+    surname: str
+    given: str = ""
+    fuller: str = ""
+    dates: Tuple[int, int, int, int] = NO_DATES
+
+    @property
+    def has_dates(self) -> bool:
+        return self.dates != NO_DATES
+
+
+def _year_range(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Parse one end of a date range into the (lowest, highest) year it allows
+
+    Accepts "1868", "1868?", "1868 or 1869", "ca. 1450", "approximately
+    1450", "12th cent." / "12th century", "1950s" and years or centuries
+    "B.C.".
+    """
+    text = text.strip(" .,")
+    approximate = bool(_APPROXIMATE.match(text))
+    text = _APPROXIMATE.sub("", text)
+    before_christ = bool(_BEFORE_CHRIST.search(text))
+    text = _BEFORE_CHRIST.sub("", text).strip(" .,")
+
+    match = _CENTURY.match(text)
+    if match:
+        century = int(match.group(1))
+        low, high = (century - 1) * 100 + 1, century * 100
+    elif _DECADE.match(text):
+        low = int(_DECADE.match(text).group(1)) * 10
+        high = low + 9
+    else:
+        match = _YEAR.match(text)
+        if not match:
+            return None
+        low = int(match.group(1))
+        high = int(match.group(3)) if match.group(3) else low
+        if match.group(2) or match.group(4):
+            low, high = low - UNCERTAIN_YEARS, high + UNCERTAIN_YEARS
+    if approximate:
+        low, high = low - APPROXIMATE_YEARS, high + APPROXIMATE_YEARS
+    if before_christ:
+        low, high = -high, -low
+    return low, high
+
+def parse_dates(text: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Parse the dates of a personal name into birth and death year ranges
+
+    Handles the AACR2 and RDA forms LC headings use: "1868-1912",
+    "1950-", "-1912", "b. 1950" / "born 1950", "d. 1616" / "died 1616",
+    "fl. 12th cent." / "active 12th century", "ca. 1450-1500", "1868 or
+    1869-1912" and "551-479 B.C.". An active period becomes the widest
+    birth and death ranges consistent with it, see ``LIFESPAN``.
+
+    Args:
+        text: Dates part of a name, e.g. "1892-1973"
+
+    Returns:
+        Tuple of (birth low, birth high, death low, death high) years,
+        unknown ends spanning ``NO_YEAR_LO`` to ``NO_YEAR_HI``; None when
+        the text is not a date
+    """
+    return _parse_folded_dates(unicodedata.normalize("NFKC", text).casefold())
+
+def _parse_folded_dates(text: str) -> Optional[Tuple[int, int, int, int]]:
+    text = text.strip(" .,")
+    plain = _PLAIN_YEARS.match(text)
+    if plain:
+        birth, death = int(plain.group(1)), plain.group(2)
+        return (birth, birth) + ((int(death), int(death)) if death else NO_DATES[2:])
+    if _BORN.match(text):
+        birth = _year_range(_BORN.sub("", text))
+        return (birth + NO_DATES[2:]) if birth else None
+    if _DIED.match(text):
+        death = _year_range(_DIED.sub("", text))
+        return (NO_DATES[:2] + death) if death else None
+
+    active = bool(_ACTIVE.match(text))
+    text = _ACTIVE.sub("", text)
+    start, dash, end = _DATE_DASHES.sub("-", text).partition("-")
+    first = _year_range(start) if start.strip() else None
+    last = _year_range(end) if end.strip() else None
+    if (start.strip() and first is None) or (end.strip() and last is None) or (first is None and last is None):
+        return None
+    # "551-479 B.C." dates both ends before Christ
+    if first is not None and last is not None and last[1] <= 0 < first[0] and not _BEFORE_CHRIST.search(start):
+        first = (-first[1], -first[0])
+
+    if active:
+        first, last = first or last, last or first
+        return first[0] - LIFESPAN, first[1], last[0], last[1] + LIFESPAN
+    if not dash:
+        # A lone year is read as a birth date with the hyphen left out
+        return first + NO_DATES[2:]
+    return (first or NO_DATES[:2]) + (last or NO_DATES[2:])
+
+def parse_personal_name(term: str) -> Optional[PersonalName]:
+    """
+    Split a personal name heading or term into surname, forenames and dates
+
+    Titles and other parts between the forenames and the dates ("Saint",
+    "Pope", "Jr.") are left out, since the dates already tell people of the
+    same name apart.
+
+    Args:
+        term: Name as written, e.g. "Tolkien, J. R. R. (John Ronald
+            Reuel), 1892-1973", or its ``heading_key``
+
+    Returns:
+        The parsed name, or None for name-title headings, subdivided
+        headings and empty terms
+    """
+    return _parse_folded_name(heading_key(term))
+
+def _parse_folded_name(key: str) -> Optional[PersonalName]:
+    # Keep a dash between years; any other "--" separates subdivisions
+    if "--" in key:
+        key = _YEAR_DASH.sub("-", key)
+    if not key or "--" in key:
+        return None
+
+    fuller = ""
+    match = _FULLER_FORM.search(key)
+    if match:
+        fuller = match.group(1).strip()
+        key = key[:match.start()] + key[match.end():]
+
+    parts = [part.strip() for part in key.split(",")]
+    dates = NO_DATES
+    for i in range(len(parts) - 1, 0, -1):
+        if not _DATE_PART.match(parts[i]):
+            continue
+        if _TITLE_AFTER_DATES.search(parts[i]):
+            return None
+        parsed = _parse_folded_dates(", ".join(parts[i:]))
+        if parsed is None:
+            continue
+        dates = parsed
+        parts = parts[:i]
+        break
+
+    surname = parts[0]
+    if not surname or _TITLE_IN_NAME.search(surname):
+        return None
+    given = parts[1] if len(parts) > 1 else ""
+    return PersonalName(surname, given, fuller, dates)
+
+def name_alternatives(term: str) -> List[PersonalName]:
+    """
+    Get the ways a term may split into surname and forenames
+
+    A name in inverted order has one. A name without a comma may be a
+    single entry element ("Murasaki Shikibu"), surname first as in
+    East Asian usage ("Mao Zedong") or forenames first ("John Smith").
+
+    Returns:
+        Parsed alternatives, most likely first; empty when the term does
+        not parse as a name
+    """
+    name = parse_personal_name(term)
+    if name is None:
+        return []
+    if name.given or " " not in name.surname:
+        return [name]
+    words = name.surname.split()
+    return [name,
+            PersonalName(words[0], " ".join(words[1:]), name.fuller, name.dates),
+            PersonalName(words[-1], " ".join(words[:-1]), name.fuller, name.dates)]
+
+def looks_like_personal_name(term: str) -> bool:
+    """
+    Check whether a term without a MARC field reads as a personal name
+
+    Only inverted names with forenames and something topical headings lack
+    are accepted: dates, a fuller form in parentheses or forenames given as
+    initials. "World War, 1939-1945" and "Mercury (Planet)" have no
+    forenames and are left to the other lookups.
+    """
+    name = parse_personal_name(term)
+    tokens = _NAME_TOKENS.findall(name.given) if name is not None else []
+    if not tokens:
+        return False
+    return name.has_dates or bool(name.fuller) or all(len(token) == 1 for token in tokens)
+
+@lru_cache(maxsize=1 << 16)
+def _name_hash(part: str) -> int:
+    """
+    Hash a folded name part across spellings and word division; 0 when empty
+
+    Forenames and common surnames recur across millions of names, so
+    hashes are cached.
+    """
+    key = fold_romanization(part)
+    return (key_hashes(key)[0] or 1) if key else 0
+
+def _name_features(name: PersonalName) -> Tuple[int, int, int, int, int, int]:
+    """
+    Get the hashed and packed parts of a name that the index compares
+
+    Returns:
+        Tuple of (surname hash, forenames hash, fuller form hash, first
+        spelled-out forename hash or 0 when it is an initial, packed
+        initials, number of initials)
+    """
+    given = _NAME_TOKENS.findall(name.given)
+    fuller = _NAME_TOKENS.findall(name.fuller)
+    first = (fuller or given or [""])[0]
+    initials = 0
+    for i, token in enumerate(given[:NameIndex.INITIALS]):
+        initials |= (ord(token[0]) % 255 + 1) << (8 * i)
+    return (_name_hash(name.surname), _name_hash(name.given), _name_hash(name.fuller),
+            _name_hash(first) if len(first) > 1 else 0, initials, min(len(given), NameIndex.INITIALS))
+
+# Mask over the packed initials two names share, by their number
+_INITIAL_MASKS = np.asarray([0, 0xFF, 0xFFFF, 0xFFFFFF, 0xFFFFFFFF], dtype=np.uint32)
+
+
+class NameIndex:
+    """
+    Personal name headings grouped by surname, scored a surname at a time
+
+    Every authorized and variant label of a heading used in field 600 is
+    parsed into surname, forenames, fuller form and dates. Entries are
+    sorted by the hash of their folded surname; ``surnames`` holds the
+    distinct hashes and ``offsets`` where each surname's entries start, so
+    a lookup is one binary search. The entries of a surname are then
+    scored together with array operations, first on their forename hashes
+    and packed initials and then, for the entries whose forenames agree, on
+    their birth and death year ranges, so even the tens of thousands of
+    entries under "Smith" are scored in well under a millisecond. Every
+    array is memory-mapped.
+    """
+    FILES = ("surnames", "offsets", "rows", "hashes", "initials", "initial_masks", "dates")
+    # Forenames whose initials are packed into one uint32
+    INITIALS = 4
+
+    # Score of a heading that matches in every part, below the 1.0 of an exact match
+    MATCH_SCORE = 0.95
+    # Factors of the score for how well forenames and dates agree, see ``_score``
+    SAME_FORENAMES = 1.0
+    COMPATIBLE_INITIALS = 0.9
+    FEWER_INITIALS = 0.85
+    NO_FORENAMES = 0.85
+    SAME_DATES = 1.0
+    OVERLAPPING_DATES = 0.95
+    ONE_SIDED_DATES = 0.97
+    UNDATED_HEADING = 0.9
+
+    def __init__(self, directory: str, table: HeadingTable):
+        """
+        Open an index written with ``NameIndex.build``
+
+        Args:
+            directory: Index directory
+            table: Heading table the index was built from
+        """
+        self.table = table
+        with open(os.path.join(directory, "names.json"), "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        for name in self.FILES:
+            # Plain array views of the maps; slicing a np.memmap costs more than scoring a small surname
+            array = np.load(os.path.join(directory, f"names_{name}.npy"), mmap_mode="r")
+            setattr(self, name, np.asarray(array))
+
+    def __len__(self) -> int:
+        return self.meta["names"]
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "names.json"))
+
+    @classmethod
+    def build(cls, table: HeadingTable, directory: str) -> Dict[str, Any]:
+        """
+        Write the name index for the personal name headings of a table
+
+        Args:
+            table: Heading table to index; only rows tagged 600 are read, so
+                a table built before headings were tagged gets an empty index
+            directory: Index directory to write
+
+        Returns:
+            Dictionary with the number of names and distinct surnames
+            indexed and the bytes written
+        """
+        people = np.zeros(len(table), dtype=bool)
+        if table.tags is not None:
+            people = np.asarray(table.tags) == PERSONAL_NAME_TAG
+        # Variant labels carry earlier forms and other romanizations ("mao, tse-tung, 1893-1976")
+        variant_rows = np.asarray(table.variant_rows, dtype=np.int64)
+        sources = [(table.keys, np.flatnonzero(people), None),
+                   (table.variant_keys, np.flatnonzero(people[variant_rows]), variant_rows)]
+
+        # Filled in place, as millions of Python tuples would take gigabytes
+        capacity = sum(len(indices) for _, indices, _ in sources)
+        rows = np.zeros(capacity, dtype=np.uint32)
+        columns = np.zeros((capacity, 6), dtype=np.uint64)
+        dates = np.zeros((capacity, 4), dtype=np.int16)
+        count = 0
+        for keys, indices, targets in sources:
+            for index in indices.tolist():
+                name = _parse_folded_name(keys[index])
+                if name is None:
+                    continue
+                rows[count] = index if targets is None else targets[index]
+                columns[count] = _name_features(name)
+                dates[count] = name.dates
+                count += 1
+
+        surname_hashes = columns[:count, 0]
+        order = np.lexsort((rows[:count], surname_hashes))
+        surnames, starts = np.unique(surname_hashes[order], return_index=True)
+        arrays = {
+            "surnames": surnames,
+            "offsets": np.append(starts, count).astype(np.uint64),
+            "rows": rows[order],
+            # Forenames, fuller form and first spelled-out forename, one contiguous row each
+            "hashes": np.ascontiguousarray(columns[order, 1:4].T),
+            "initials": columns[order, 4].astype(np.uint32),
+            # Covers the entry's initials; ANDed with the query's, it covers those both have
+            "initial_masks": _INITIAL_MASKS[columns[order, 5].astype(np.intp)],
+            "dates": dates[order],
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"names_{name}.npy"), array)
+        with open(os.path.join(directory, "names.json"), "w", encoding="utf-8") as file:
+            json.dump({"names": count, "surnames": len(surnames)}, file, indent=2)
+        return {"names": count, "surnames": len(surnames), "bytes": sum(array.nbytes for array in arrays.values())}
+
+    def _candidates(self, surname: int) -> Tuple[int, int]:
+        """
+        Get the range of entries under a surname hash, empty when there are none
+        """
+        index = int(self.surnames.searchsorted(np.uint64(surname)))
+        if index == len(self.surnames) or int(self.surnames[index]) != surname:
+            return 0, 0
+        return int(self.offsets[index]), int(self.offsets[index + 1])
+
+    def _score(self, name: PersonalName, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score a name against every entry of its surname at once
+
+        Forenames count in full when their folded spelling matches the
+        entry's forenames or fuller form, and in part when their initials
+        agree with the entry's as far as both go and the first forename,
+        where both spell it out, is the same; any other forenames rule the
+        entry out. Dates rule out entries whose known birth or death range
+        does not overlap the name's, and lower entries that only overlap or
+        that one side leaves undated.
+
+        Returns:
+            Tuple of (entries not ruled out, their scores as a fraction of
+            ``MATCH_SCORE``)
+        """
+        _, given, fuller, first, initials, initial_count = _name_features(name)
+        entry_given, entry_fuller, entry_first = self.hashes[:, start:stop]
+
+        if not given and not fuller:
+            forenames = np.where(entry_given == 0, self.SAME_FORENAMES, self.NO_FORENAMES)
+        else:
+            same = np.zeros(stop - start, dtype=bool)
+            for value in (given, fuller):
+                if value:
+                    same |= (entry_given == np.uint64(value)) | (entry_fuller == np.uint64(value))
+            entry_masks = self.initial_masks[start:stop]
+            query_mask = _INITIAL_MASKS[initial_count]
+            shared = entry_masks & query_mask
+            agree = (((self.initials[start:stop] ^ np.uint32(initials)) & shared) == 0) & (shared != 0)
+            if first:
+                agree &= (entry_first == 0) | (entry_first == np.uint64(first))
+            forenames = np.where(same, self.SAME_FORENAMES,
+                                 np.where(agree, np.where(entry_masks == query_mask,
+                                                          self.COMPATIBLE_INITIALS, self.FEWER_INITIALS), 0.0))
+
+        entries = np.flatnonzero(forenames)
+        scores = forenames[entries]
+        if not name.has_dates or not len(entries):
+            return entries + start, scores
+
+        # Birth and death side by side: columns 0 and 1 of the lows and highs
+        entry_dates = self.dates[start:stop][entries].astype(np.int32)
+        lows, highs = entry_dates[:, 0::2], entry_dates[:, 1::2]
+        query_lows, query_highs = np.asarray(name.dates[0::2]), np.asarray(name.dates[1::2])
+        entry_known = lows > NO_YEAR_LO
+        query_known = query_lows > NO_YEAR_LO
+        # An end neither side knows compares as exact
+        exact = (lows == query_lows) & (highs == query_highs)
+        overlap = (lows <= query_highs) & (query_lows <= highs)
+        dated = np.where(entry_known != query_known, self.ONE_SIDED_DATES,
+                         np.where(exact, self.SAME_DATES, self.OVERLAPPING_DATES * overlap)).prod(axis=1)
+        scores = scores * np.where(entry_known.any(axis=1), dated, self.UNDATED_HEADING)
+        kept = scores > 0
+        return entries[kept] + start, scores[kept]
+
+    def match(self, term: str, limit: int = 1, cutoff: float = 0.5) -> List[Tuple[int, float]]:
+        """
+        Find the personal name headings that best match a term
+
+        Each way the term splits into surname and forenames (see
+        ``name_alternatives``) costs one binary search and one vectorized
+        pass over the entries of that surname. A heading's best label wins.
+
+        Args:
+            term: Name as written, with or without dates
+            limit: Number of headings to return
+            cutoff: Minimum score, as a fraction of ``MATCH_SCORE``
+
+        Returns:
+            List of (row, score) pairs, best first
+        """
+        best: Dict[int, float] = {}
+        for name in name_alternatives(term):
+            start, stop = self._candidates(_name_hash(name.surname))
+            if start == stop:
+                continue
+            entries, scores = self._score(name, start, stop)
+            # The best ``limit`` headings of each alternative include the best overall
+            seen = set()
+            for i in np.argsort(-scores, kind="stable").tolist():
+                score = float(scores[i])
+                if score < cutoff or len(seen) >= limit:
+                    break
+                row = int(self.rows[entries[i]])
+                if row not in seen:
+                    seen.add(row)
+                    best[row] = max(score, best.get(row, 0.0))
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(row, score * self.MATCH_SCORE) for row, score in ranked]
@@ -0,0 +1,385 @@
+"""
+Authority Records Module - Reads LC authority bulk downloads into records
+"""
+import gzip
+import json
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, IO, Iterable, Iterator
+
+SKOS = "http://www.w3.org/2004/02/skos/core#"
+MADS = "http://www.loc.gov/mads/rdf/v1#"
+
+# Predicates carrying each part of a record, in SKOS and MADS/RDF flavours
+AUTHORIZED_LABEL = {SKOS + "prefLabel", MADS + "authoritativeLabel"}
+VARIANT_LABEL = {SKOS + "altLabel", MADS + "variantLabel"}
+HAS_VARIANT = {MADS + "hasVariant"}
+BROADER = {SKOS + "broader", MADS + "hasBroaderAuthority"}
+NARROWER = {SKOS + "narrower", MADS + "hasNarrowerAuthority"}
+RELATED = {SKOS + "related", MADS + "hasReciprocalAuthority"}
+# LC writes the scope note (MARC 680) as skos:scopeNote, or madsrdf:note in MADS/RDF
+SCOPE_NOTE = {SKOS + "scopeNote", MADS + "note"}
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+# MARC bibliographic subject field (6XX) for headings of each MADS/RDF type
+MADS_TAGS = {
+    MADS + "PersonalName": 600,
+    MADS + "FamilyName": 600,
+    MADS + "NameTitle": 600,
+    MADS + "CorporateName": 610,
+    MADS + "ConferenceName": 611,
+    MADS + "Title": 630,
+    MADS + "Temporal": 648,
+    MADS + "Topic": 650,
+    MADS + "Geographic": 651,
+    MADS + "GenreForm": 655,
+}
+# Authority heading fields (1XX) and the subject fields (6XX) they become
+_HEADING_TAGS = {100: 600, 110: 610, 111: 611, 130: 630, 148: 648, 150: 650, 151: 651, 155: 655}
+SUBJECT_TAGS = frozenset(MADS_TAGS.values())
+
+def subject_tag(tag) -> int:
+    """
+    Turn a MARC field tag into the subject field it routes to
+
+    Authority heading tags map to their subject field ("151" to 651), and
+    tags that carry no routing information, such as "653" or "6XX", to 0.
+
+    Args:
+        tag: Tag as a string or number
+
+    Returns:
+        One of ``SUBJECT_TAGS``, or 0
+    """
+    try:
+        tag = int(str(tag).strip())
+    except ValueError:
+        return 0
+    tag = _HEADING_TAGS.get(tag, tag)
+    return tag if tag in SUBJECT_TAGS else 0
+
+@dataclass
+class AuthorityRecord:
+    """
+    One authority record: an authorized heading and what it links to
+    """
+    uri: str
+    label: str = ""
+    variants: List[str] = field(default_factory=list)
+    broader: List[str] = field(default_factory=list)
+    narrower: List[str] = field(default_factory=list)
+    related: List[str] = field(default_factory=list)
+    # MARC subject field the heading is used in, see ``MADS_TAGS``; 0 when unknown
+    tag: int = 0
+    # Scope note: what the heading is used for, e.g. "Here are entered works on ..."
+    note: str = ""
+
+    @property
+    def id(self) -> str:
+        """Record identifier, e.g. "sh85024107" """
+        return self.uri.rstrip("/").rsplit("/", 1)[-1]
+
+    def merge(self, other: "AuthorityRecord") -> None:
+        """
+        Add what another record of the same URI says, e.g. a part of it
+        written elsewhere in a dump; the first label, tag and note win
+        """
+        self.label = self.label or other.label
+        self.tag = self.tag or other.tag
+        self.note = self.note or other.note
+        for mine, theirs in ((self.variants, other.variants), (self.broader, other.broader),
+                             (self.narrower, other.narrower), (self.related, other.related)):
+            mine.extend(value for value in theirs if value not in mine)
+
+
+def open_dump(path: str) -> IO[str]:
+    """
+    Open a dump file as text, transparently decompressing .gz files
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def is_jsonld_path(path: str) -> bool:
+    """
+    Check whether a dump file is JSON-LD (as opposed to N-Triples)
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    return name.endswith((".jsonld", ".json", ".ndjson"))
+
+
+# subject, predicate, object; objects are IRIs, blank nodes or literals
+_TRIPLE = re.compile(
+    r'^(<[^>]*>|_:\S+)\s+<([^>]*)>\s+'
+    r'(<[^>]*>|_:\S+|"(?:[^"\\]|\\.)*"(?:@[A-Za-z0-9-]+|\^\^<[^>]*>)?)\s*\.\s*$'
+)
+_ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+_SIMPLE_ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+def _unescape(match: "re.Match") -> str:
+    code = match.group(1) or match.group(2)
+    if code:
+        return chr(int(code, 16))
+    return _SIMPLE_ESCAPES.get(match.group(3), match.group(3))
+
+def parse_ntriple(line: str) -> Optional[tuple]:
+    """
+    Parse one N-Triples line
+
+    Args:
+        line: Line of an N-Triples file
+
+    Returns:
+        Tuple of (subject, predicate, object, is_literal), or None for blank
+        lines, comments and lines that are not a triple. IRIs are returned
+        without angle brackets and literals without quotes or tags.
+    """
+    match = _TRIPLE.match(line.strip())
+    if match is None:
+        return None
+    subject, predicate, obj = match.groups()
+    if subject.startswith("<"):
+        subject = subject[1:-1]
+    if obj.startswith('"'):
+        literal = obj[1:obj.rindex('"')]
+        return subject, predicate, _ESCAPE.sub(_unescape, literal), True
+    if obj.startswith("<"):
+        obj = obj[1:-1]
+    return subject, predicate, obj, False
+
+def iter_ntriples_records(lines: Iterable[str], stats: Optional[Dict[str, int]] = None,
+                          window: int = 64) -> Iterator[AuthorityRecord]:
+    """
+    Stream authority records out of N-Triples lines
+
+    LC dumps write the triples of a record together, with the blank nodes
+    that carry MADS variant labels right next to it, but a record's block
+    also holds triples about the authorities it links to, such as a broader
+    heading's label. The last ``window`` subjects are therefore kept open,
+    and triples of a subject still open are merged into its record, so
+    such a detour neither splits the record nor loses its variants. A
+    record is yielded once it drops out of the window, together with the
+    labels of blank nodes read in its block that nothing linked to, so
+    memory use does not grow with the size of the dump. The same URI may
+    still be yielded more than once, e.g. a linked heading's label far from
+    its own record; ``HeadingTable.build`` merges those.
+
+    Args:
+        lines: Lines of an N-Triples file
+        stats: Optional dictionary whose "triples" count is incremented
+        window: Number of subjects kept open
+
+    Yields:
+        Records that have an authorized label
+    """
+    records: "OrderedDict[str, AuthorityRecord]" = OrderedDict()
+    # Blank nodes linked by an open record, and the nodes each record links
+    linked_by: Dict[str, str] = {}
+    blank_links: Dict[str, List[str]] = {}
+    # Labels of blank nodes not linked yet, and the nodes read in each subject's block
+    blank_labels: Dict[str, List[str]] = {}
+    blank_nodes: Dict[Optional[str], List[str]] = {}
+    current = None
+    triples = 0
+
+    def finish(record: AuthorityRecord) -> Optional[AuthorityRecord]:
+        for node in blank_links.pop(record.uri, []):
+            linked_by.pop(node, None)
+        # Nothing links the blank nodes of a closed block, e.g. MADS
+        # component lists, so drop them with it
+        for node in blank_nodes.pop(record.uri, []):
+            blank_labels.pop(node, None)
+        return record if record.label else None
+
+    for line in lines:
+        triple = parse_ntriple(line)
+        if triple is None:
+            continue
+        triples += 1
+        if stats is not None and triples >= 10000:
+            stats["triples"] = stats.get("triples", 0) + triples
+            triples = 0
+        subject, predicate, obj, is_literal = triple
+
+        # Blank nodes belong to the record that links to them
+        if subject.startswith("_:"):
+            if predicate in VARIANT_LABEL | AUTHORIZED_LABEL and is_literal:
+                if subject in linked_by:
+                    records[linked_by[subject]].variants.append(obj)
+                else:
+                    if subject not in blank_labels:
+                        blank_nodes.setdefault(current, []).append(subject)
+                    blank_labels.setdefault(subject, []).append(obj)
+            continue
+
+        record = records.get(subject)
+        if record is None:
+            record = records[subject] = AuthorityRecord(uri=subject)
+            if len(records) > window:
+                finished = finish(records.popitem(last=False)[1])
+                if finished is not None:
+                    yield finished
+        else:
+            records.move_to_end(subject)
+        current = subject
+
+        if predicate in AUTHORIZED_LABEL and is_literal:
+            if not record.label:
+                record.label = obj
+        elif predicate in VARIANT_LABEL and is_literal:
+            record.variants.append(obj)
+        elif predicate in HAS_VARIANT:
+            if obj in blank_labels:
+                record.variants.extend(blank_labels.pop(obj))
+            elif obj not in linked_by:
+                linked_by[obj] = subject
+                blank_links.setdefault(subject, []).append(obj)
+        elif predicate in BROADER and not is_literal:
+            record.broader.append(obj)
+        elif predicate in NARROWER and not is_literal:
+            record.narrower.append(obj)
+        elif predicate in RELATED and not is_literal:
+            record.related.append(obj)
+        elif predicate in SCOPE_NOTE and is_literal:
+            record.note = f"{record.note} {obj}" if record.note else obj
+        elif predicate == RDF_TYPE and not record.tag:
+            record.tag = MADS_TAGS.get(obj, 0)
+
+    if stats is not None:
+        stats["triples"] = stats.get("triples", 0) + triples
+    for record in records.values():
+        finished = finish(record)
+        if finished is not None:
+            yield finished
+
+
+def _values(node: Dict[str, Any], predicates: set) -> List[Any]:
+    """
+    Get the values of a JSON-LD node for any of the given predicate IRIs
+    """
+    values = []
+    for key, value in node.items():
+        if key in predicates or _expand_curie(key) in predicates:
+            values.extend(value if isinstance(value, list) else [value])
+    return values
+
+def _expand_curie(key: str) -> str:
+    prefix, _, local = key.partition(":")
+    return {"skos": SKOS, "madsrdf": MADS}.get(prefix, prefix + ":") + local
+
+def _literal(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("@value")
+    return value if isinstance(value, str) else None
+
+def _reference(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("@id")
+    return value if isinstance(value, str) else None
+
+def records_from_jsonld(document: Any) -> List[AuthorityRecord]:
+    """
+    Extract authority records from a parsed JSON-LD document
+
+    Args:
+        document: A node, a list of nodes or an object with an ``@graph``
+
+    Returns:
+        Records that have an authorized label
+    """
+    if isinstance(document, dict) and "@graph" in document:
+        nodes = document["@graph"]
+    elif isinstance(document, list):
+        nodes = document
+    else:
+        nodes = [document]
+
+    by_id = {node.get("@id"): node for node in nodes if isinstance(node, dict)}
+    records = []
+    for node_id, node in by_id.items():
+        if not node_id or node_id.startswith("_:"):
+            continue
+        labels = [_literal(value) for value in _values(node, AUTHORIZED_LABEL)]
+        labels = [label for label in labels if label]
+        if not labels:
+            continue
+
+        record = AuthorityRecord(uri=node_id, label=labels[0])
+        record.variants = [label for label in map(_literal, _values(node, VARIANT_LABEL)) if label]
+        for variant in _values(node, HAS_VARIANT):
+            variant_node = by_id.get(_reference(variant), variant if isinstance(variant, dict) else {})
+            record.variants.extend(
+                label for label in map(_literal, _values(variant_node, VARIANT_LABEL)) if label
+            )
+        record.broader = [ref for ref in map(_reference, _values(node, BROADER)) if ref]
+        record.narrower = [ref for ref in map(_reference, _values(node, NARROWER)) if ref]
+        record.related = [ref for ref in map(_reference, _values(node, RELATED)) if ref]
+        record.note = " ".join(note for note in map(_literal, _values(node, SCOPE_NOTE)) if note)
+        types = node.get("@type", [])
+        for kind in types if isinstance(types, list) else [types]:
+            if isinstance(kind, str) and _expand_curie(kind) in MADS_TAGS:
+                record.tag = MADS_TAGS[_expand_curie(kind)]
+                break
+        records.append(record)
+    return records
+
+def _count_statements(document: Any) -> int:
+    """
+    Count the property values in a JSON-LD document, i.e. its triples
+    """
+    if isinstance(document, list):
+        return sum(_count_statements(item) for item in document)
+    if not isinstance(document, dict):
+        return 1
+    count = 0
+    for key, value in document.items():
+        if key == "@graph":
+            count += _count_statements(value)
+        elif not key.startswith("@"):
+            count += len(value) if isinstance(value, list) else 1
+    return count
+
+def iter_jsonld_records(lines: Iterable[str], stats: Optional[Dict[str, int]] = None) -> Iterator[AuthorityRecord]:
+    """
+    Stream authority records out of line-delimited JSON-LD
+
+    LC publishes its JSON-LD bulk downloads with one record graph per line,
+    so only one line is ever parsed at a time.
+
+    Args:
+        lines: Lines of a JSON-LD file
+        stats: Optional dictionary whose "triples" count is incremented
+
+    Yields:
+        Records that have an authorized label
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            document = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number} is not a JSON-LD document; "
+                             "dumps must have one JSON document per line") from e
+        if stats is not None:
+            stats["triples"] = stats.get("triples", 0) + _count_statements(document)
+        yield from records_from_jsonld(document)
+
+def iter_dump_records(path: str, stats: Optional[Dict[str, int]] = None) -> Iterator[AuthorityRecord]:
+    """
+    Stream authority records out of an N-Triples or JSON-LD dump file
+
+    Args:
+        path: Path of the dump, optionally gzipped
+        stats: Optional dictionary whose "triples" count is incremented
+
+    Yields:
+        Records that have an authorized label
+    """
+    with open_dump(path) as dump:
+        if is_jsonld_path(path):
+            yield from iter_jsonld_records(dump, stats)
+        else:
+            yield from iter_ntriples_records(dump, stats)
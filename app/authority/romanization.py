@@ -0,0 +1,51 @@
+"""
+Romanization Module - One-probe lookup of East Asian headings under any romanization or original script
+"""
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from app.authority.heading_table import HeadingTable
+from app.authority.variants import VariantTable
+from app.normalize import is_east_asian, romanization_key
+
+class RomanizationTable(VariantTable):
+    """
+    Hash table from romanization keys to heading rows
+
+    Every authorized and variant label is folded with ``romanization_key``,
+    so Pinyin without tones, Hepburn with or without macrons and
+    McCune-Reischauer with or without breves all land on the heading's
+    slot. LC records carry original-script forms ("東京", "서울") as variant
+    labels, and those are folded too, which maps original script to the
+    romanized heading in the same probe. Labels whose keys collide keep the
+    first heading, authorized labels before variants.
+
+    The folds are far too loose for other headings ("Moon" would become
+    "mon"), so only East Asian headings are indexed: those whose
+    authorized label is romanized with LC's marks or which have a label in
+    original script, see ``is_east_asian``.
+    """
+    NAME = "romanized"
+
+    @staticmethod
+    def fold(term: str) -> str:
+        return romanization_key(term)
+
+    @classmethod
+    def entries(cls, table: HeadingTable) -> Tuple[List[str], np.ndarray]:
+        east_asian = np.fromiter((is_east_asian(table.label(row)) for row in range(len(table))),
+                                 dtype=bool, count=len(table))
+        # Variant keys keep their script, though not their diacritics
+        for i in range(len(table.variant_keys)):
+            if is_east_asian(table.variant_keys[i]):
+                east_asian[table.variant_rows[i]] = True
+
+        rows: Dict[str, int] = {}
+        for row in np.flatnonzero(east_asian):
+            rows.setdefault(romanization_key(table.keys[row]), int(row))
+        for i in range(len(table.variant_keys)):
+            row = int(table.variant_rows[i])
+            if east_asian[row]:
+                rows.setdefault(romanization_key(table.variant_keys[i]), row)
+        return list(rows), np.fromiter(rows.values(), dtype=np.uint32, count=len(rows))
@@ -0,0 +1,581 @@
+"""
+Semantic Index Module - Embedding vectors and an IVF nearest-neighbour search over headings
+"""
+import json
+import math
+import os
+import re
+import time
+import zlib
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from google import genai
+from google.genai import types
+
+from app.authority.heading_table import HeadingTable
+from app.normalize import heading_key
+
+# Rows embedded per block while building, to bound memory
+EMBED_BLOCK = 16384
+# k-means iterations and training sample size per list
+KMEANS_ITERATIONS = 12
+SAMPLE_PER_LIST = 64
+# Product quantization: centroids per subspace (one byte per code) and training sample size
+PQ_CENTROIDS = 256
+PQ_SAMPLE = 65536
+
+_WORD = re.compile(r"\w+")
+_STOP_WORDS = {"and", "of", "the", "in", "on", "for", "to", "a", "an", "by", "with"}
+# Opening words shared by most LC scope notes, "Here are entered works on ..."
+_NOTE_PREAMBLE = re.compile(r"^here (?:are|is) entered\b.*?\b(?:on|about)\s+", re.IGNORECASE)
+
+def scope_note_text(note: str) -> str:
+    """
+    Get the part of a scope note worth embedding, without its stock opening
+    """
+    return _NOTE_PREAMBLE.sub("", note.strip(), count=1)
+
+class HashingEmbedder:
+    """
+    Offline embedder: signed feature hashing of words and character trigrams
+
+    Needs no model and no network, and maps word order variants ("Cinema,
+    Japanese") and inflections ("Japan", "Japanese") close together. It is
+    purely lexical and does not know synonyms or paraphrases; build the
+    index with ``SentenceEmbedder``, or ``GeminiEmbedder``, for those.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def config(self) -> Dict[str, Any]:
+        return {"name": self.name, "dim": self.dim}
+
+    def features(self, text: str) -> List[Tuple[int, float]]:
+        """
+        Get the hashed (column, signed weight) features of a text
+        """
+        features = []
+        for word in _WORD.findall(heading_key(text)):
+            if word in _STOP_WORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            tokens = [(word, 1.0)]
+            padded = f"<{word}>"
+            tokens.extend((padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+            for token, weight in tokens:
+                hashed = zlib.crc32(token.encode("utf-8"))
+                features.append((hashed % self.dim, weight if hashed & 0x80000000 else -weight))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as L2-normalized float32 rows
+        """
+        columns, weights, lengths = [], [], []
+        for text in texts:
+            features = self.features(text)
+            columns.extend(column for column, _ in features)
+            weights.extend(weight for _, weight in features)
+            lengths.append(len(features))
+        flat = np.repeat(np.arange(len(texts)) * self.dim, lengths) + np.asarray(columns, dtype=np.int64)
+        matrix = np.bincount(flat, weights=weights, minlength=len(texts) * self.dim)
+        return _normalize(matrix.reshape(len(texts), self.dim).astype(np.float32))
+
+
+class SentenceEmbedder:
+    """
+    Offline embedder backed by a local sentence-transformers model
+
+    Runs on the CPU and, once the model has been downloaded, needs no
+    network. Unlike ``HashingEmbedder`` it places synonyms and paraphrases
+    ("Movies", "Motion pictures") close together. Needs the optional
+    sentence-transformers package: ``pip install "lcsh-chatbot[semantic]"``.
+    """
+    name = "sentence"
+    DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    # Texts per forward pass of the model
+    BATCH_SIZE = 256
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The sentence embedder needs the sentence-transformers package; "
+                              'install it with pip install "lcsh-chatbot[semantic]"') from e
+        self.model = model
+        self._model = SentenceTransformer(model, device="cpu")
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def config(self) -> Dict[str, Any]:
+        return {"name": self.name, "model": self.model, "dim": self.dim}
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as L2-normalized float32 rows
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        vectors = self._model.encode(texts, batch_size=self.BATCH_SIZE, convert_to_numpy=True,
+                                     normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class GeminiEmbedder:
+    """
+    Embedder backed by the Gemini embedding API
+
+    Captures synonyms and paraphrases that no string measure can, at the
+    cost of an API call per batch while building and per query batch.
+    """
+    name = "gemini"
+    # Texts per embedding request
+    BATCH_SIZE = 100
+
+    def __init__(self, api_key: str, model: str = "text-embedding-004", dim: int = 256):
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+        self.dim = dim
+
+    def config(self) -> Dict[str, Any]:
+        return {"name": self.name, "model": self.model, "dim": self.dim}
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as L2-normalized float32 rows
+        """
+        config = types.EmbedContentConfig(output_dimensionality=self.dim, task_type="SEMANTIC_SIMILARITY")
+        rows = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            response = self.client.models.embed_content(
+                model=self.model, contents=texts[start:start + self.BATCH_SIZE], config=config
+            )
+            rows.extend(embedding.values for embedding in response.embeddings)
+        return _normalize(np.asarray(rows, dtype=np.float32).reshape(len(texts), self.dim))
+
+
+def make_embedder(config: Dict[str, Any]):
+    """
+    Recreate the embedder an index was built with
+
+    Args:
+        config: The ``embedder`` entry of semantic.json
+
+    Returns:
+        The embedder; Gemini embedders read GEMINI_API_KEY
+    """
+    if config["name"] == HashingEmbedder.name:
+        return HashingEmbedder(config["dim"])
+    if config["name"] == SentenceEmbedder.name:
+        return SentenceEmbedder(config["model"])
+    if config["name"] == GeminiEmbedder.name:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY is required to query an index built with Gemini embeddings")
+        return GeminiEmbedder(api_key, config["model"], config["dim"])
+    raise ValueError(f"Unknown embedder {config['name']!r}")
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Store float32 rows as int8 with a scale per row, or as float16
+
+    Returns:
+        Tuple of (stored rows, per-row scales; all ones for float16)
+    """
+    if dtype == "float16":
+        return matrix.astype(np.float16), np.ones(len(matrix), dtype=np.float32)
+    if dtype != "int8":
+        raise ValueError(f"Unsupported vector type {dtype!r}; expected int8 or float16")
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def nearest_centroid(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Assign each row to its most similar centroid, a block of rows at a time
+    """
+    return np.concatenate([
+        np.argmax(np.asarray(matrix[start:start + EMBED_BLOCK], dtype=np.float32) @ centroids.T, axis=1)
+        for start in range(0, len(matrix), EMBED_BLOCK)
+    ]) if len(matrix) else np.zeros(0, dtype=np.int64)
+
+def _cluster_sums(rows: np.ndarray, assignment: np.ndarray, clusters: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sum the rows assigned to each cluster
+
+    Returns:
+        Tuple of (per-cluster sums, per-cluster sizes)
+    """
+    sizes = np.bincount(assignment, minlength=clusters)
+    sums = np.zeros((clusters, rows.shape[1]), dtype=np.float32)
+    filled = np.flatnonzero(sizes)
+    if len(filled):
+        # Contiguous runs after sorting by cluster are summed in one reduceat, much faster than np.add.at
+        starts = (np.cumsum(sizes) - sizes)[filled]
+        sums[filled] = np.add.reduceat(rows[np.argsort(assignment, kind="stable")], starts, axis=0)
+    return sums, sizes
+
+def kmeans(sample: np.ndarray, lists: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means over normalized rows
+
+    Returns:
+        Normalized centroids of shape (lists, dim)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(iterations):
+        sums, sizes = _cluster_sums(sample, nearest_centroid(sample, centroids), lists)
+        empty = sizes == 0
+        # Reseed empty lists with random rows so every list stays in use
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def train_product_quantizer(residuals: np.ndarray, subspaces: int,
+                            iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """
+    Train one k-means codebook per subspace of the residual vectors
+
+    Args:
+        residuals: Sample of vectors minus their IVF centroid
+        subspaces: Number of equal slices the dimensions are cut into
+
+    Returns:
+        Codebooks of shape (subspaces, PQ_CENTROIDS, dim / subspaces)
+    """
+    count, dim = residuals.shape
+    if dim % subspaces:
+        raise ValueError(f"{dim} dimensions cannot be split into {subspaces} subspaces")
+    rng = np.random.default_rng(seed)
+    parts = residuals.reshape(count, subspaces, dim // subspaces)
+    codebooks = np.zeros((subspaces, PQ_CENTROIDS, dim // subspaces), dtype=np.float32)
+    for j in range(subspaces):
+        part = parts[:, j]
+        centroids = part[rng.choice(count, size=PQ_CENTROIDS, replace=count < PQ_CENTROIDS)].copy()
+        for _ in range(iterations):
+            sums, sizes = _cluster_sums(part, _nearest_code(part, centroids), PQ_CENTROIDS)
+            empty = sizes == 0
+            centroids = sums / np.maximum(sizes, 1)[:, None]
+            centroids[empty] = part[rng.choice(count, size=int(empty.sum()))]
+        codebooks[j] = centroids
+    return codebooks
+
+def _nearest_code(part: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Euclidean nearest centroid, as the largest x.c - |c|^2 / 2
+    """
+    return np.argmax(part @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+
+def encode_product(residuals: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """
+    Encode residual vectors as one byte per subspace
+    """
+    subspaces = len(codebooks)
+    parts = residuals.reshape(len(residuals), subspaces, -1)
+    codes = np.zeros((len(residuals), subspaces), dtype=np.uint8)
+    for j in range(subspaces):
+        codes[:, j] = _nearest_code(parts[:, j], codebooks[j])
+    return codes
+
+
+class SemanticIndex:
+    """
+    Inverted-file (IVF) nearest-neighbour search over embedded labels
+
+    Every authorized and variant label, and every scope note, is embedded
+    once, offline, and stored as int8 (with a float32 scale per vector) or float16. Vectors are
+    clustered with k-means into about ``2 * sqrt(n)`` lists and written in
+    list order, so each list is one contiguous, memory-mapped slice. A query
+    is compared with the centroids, and only the ``nprobe`` closest lists are
+    scanned in place, with one matrix-vector product each. For the full LCSH
+    vocabulary at 256 dimensions the int8 vectors take about 150 MB.
+
+    In "pq" mode each vector's residual from its list centroid is also
+    product-quantized to one byte per subspace, and only those codes are
+    scanned: asymmetric distance computation adds up a per-query lookup
+    table of subspace scores, with no decoding. The best ``rerank``
+    candidates are then scored exactly against float16 vectors, which stay
+    on disk and are paged in only for those rows. With 32 subspaces the
+    scanned data is 32 bytes per vector, 32 times less than float32 at 256
+    dimensions.
+    """
+    def __init__(self, directory: str, table: HeadingTable, nprobe: int = 16, rerank: int = 100):
+        """
+        Open an index written with ``SemanticIndex.build``
+
+        Args:
+            directory: Index directory
+            table: Heading table the vectors point into
+            nprobe: Number of lists scanned per query
+            rerank: Candidates re-scored exactly per query in "pq" mode
+        """
+        self.table = table
+        self.nprobe = nprobe
+        self.rerank = rerank
+        with open(os.path.join(directory, "semantic.json"), "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.embedder = make_embedder(self.meta["embedder"])
+        self.centroids = np.load(os.path.join(directory, "semantic_centroids.npy"))
+        self.list_offsets = np.load(os.path.join(directory, "semantic_list_offsets.npy")).astype(np.int64)
+        # Plain arrays over the maps; slicing a np.memmap costs several microseconds more
+        self.vectors = np.asarray(np.load(os.path.join(directory, "semantic_vectors.npy"), mmap_mode="r"))
+        self.scales = np.asarray(np.load(os.path.join(directory, "semantic_scales.npy"), mmap_mode="r"))
+        self.entry_row = np.asarray(np.load(os.path.join(directory, "semantic_entry_row.npy"), mmap_mode="r"))
+        self.codebooks = self.codes = None
+        if self.meta["dtype"] == "pq":
+            self.codebooks = np.load(os.path.join(directory, "semantic_pq_codebooks.npy"))
+            self.codes = np.asarray(np.load(os.path.join(directory, "semantic_pq_codes.npy"), mmap_mode="r"))
+            # Offsets of each subspace's scores in a flattened lookup table
+            self._table_offsets = np.arange(len(self.codebooks), dtype=np.intp) * PQ_CENTROIDS
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "semantic.json"))
+
+    def __len__(self) -> int:
+        return len(self.entry_row)
+
+    @staticmethod
+    def build(table: HeadingTable, directory: str, embedder=None, dtype: str = "int8",
+              lists: Optional[int] = None, subspaces: int = 32) -> Dict[str, Any]:
+        """
+        Embed every label and scope note of a heading table and write the IVF index
+
+        Scope notes describe a heading in other words than its labels, so a
+        paraphrase of what it covers can find it; a note is an entry of its
+        own, and a heading ranks by its best entry. Entries are embedded and
+        quantized in blocks, and k-means is trained on a sample, so the full
+        float32 matrix is never held in memory.
+
+        Args:
+            table: Heading table to index
+            directory: Index directory to write
+            embedder: Embedder to use, by default ``HashingEmbedder()``
+            dtype: "int8", "float16", or "pq" for product-quantized codes
+                with float16 vectors kept for re-ranking
+            lists: Number of IVF lists, by default about 2 * sqrt(labels)
+            subspaces: Bytes per vector in "pq" mode
+
+        Returns:
+            Dictionary with the number of vectors, lists and bytes written
+        """
+        embedder = embedder or HashingEmbedder()
+        labels = [table.label(row) for row in range(len(table))]
+        labels += [table.variant_keys[i] for i in range(len(table.variant_keys))]
+        noted = [row for row in range(len(table)) if table.note(row)]
+        labels += [scope_note_text(table.note(row)) for row in noted]
+        entry_row = np.concatenate([
+            np.arange(len(table), dtype=np.uint32),
+            np.asarray(table.variant_rows, dtype=np.uint32),
+            np.asarray(noted, dtype=np.uint32),
+        ])
+        count = len(labels)
+        lists = max(1, min(lists or int(round(2 * math.sqrt(count))), count))
+
+        stored, scales = [], []
+        for start in range(0, count, EMBED_BLOCK):
+            block, block_scales = quantize(embedder.embed(labels[start:start + EMBED_BLOCK]),
+                                           "float16" if dtype == "pq" else dtype)
+            stored.append(block)
+            scales.append(block_scales)
+        vectors = np.concatenate(stored) if stored else np.zeros((0, embedder.dim), dtype=np.int8)
+        scales = np.concatenate(scales) if scales else np.zeros(0, dtype=np.float32)
+        del stored, labels
+
+        sample = np.sort(np.random.default_rng(0).choice(count, size=min(count, lists * SAMPLE_PER_LIST),
+                                                          replace=False))
+        centroids = kmeans(vectors[sample].astype(np.float32) * scales[sample, None], lists) if count else \
+            np.zeros((0, embedder.dim), dtype=np.float32)
+        # Scales are positive, so the nearest centroid of a quantized row is that of the row itself
+        assignment = nearest_centroid(vectors, centroids)
+
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(lists + 1, dtype=np.uint64)
+        np.cumsum(np.bincount(assignment, minlength=lists), out=list_offsets[1:])
+        # Vectors are written in list order block by block, never holding two copies in memory
+        ordered = np.lib.format.open_memmap(os.path.join(directory, "semantic_vectors.npy"), mode="w+",
+                                            dtype=vectors.dtype, shape=vectors.shape)
+        for start in range(0, count, EMBED_BLOCK):
+            ordered[start:start + EMBED_BLOCK] = vectors[order[start:start + EMBED_BLOCK]]
+        ordered.flush()
+        del vectors
+        vectors = ordered
+        scales = scales[order]
+        assignment = assignment[order]
+
+        arrays = {
+            "centroids": centroids.astype(np.float32),
+            "list_offsets": list_offsets,
+            "scales": scales,
+            "entry_row": entry_row[order],
+        }
+        if dtype == "pq":
+            def residuals(rows: np.ndarray) -> np.ndarray:
+                return vectors[rows].astype(np.float32) * scales[rows, None] - centroids[assignment[rows]]
+
+            sample = np.sort(np.random.default_rng(0).choice(count, size=min(count, PQ_SAMPLE), replace=False))
+            codebooks = train_product_quantizer(residuals(sample), subspaces)
+            arrays["pq_codebooks"] = codebooks
+            arrays["pq_codes"] = np.concatenate([
+                encode_product(residuals(np.arange(start, min(start + EMBED_BLOCK, count))), codebooks)
+                for start in range(0, count, EMBED_BLOCK)
+            ]) if count else np.zeros((0, subspaces), dtype=np.uint8)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"semantic_{name}.npy"), array)
+        meta = {"embedder": embedder.config(), "dtype": dtype, "lists": lists, "vectors": count,
+                "notes": len(noted)}
+        if dtype == "pq":
+            meta["subspaces"] = subspaces
+        with open(os.path.join(directory, "semantic.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file, indent=2)
+        return {"vectors": count, "notes": len(noted), "lists": lists,
+                "bytes": vectors.nbytes + sum(array.nbytes for array in arrays.values())}
+
+    def probe(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scan the closest lists for one embedded query
+
+        Returns:
+            Tuple of (entry numbers scanned, their cosine similarity)
+        """
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        closest = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        if self.codes is not None:
+            # Score of every code of every subspace, flattened for one gather per list
+            lookup = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(len(self.codebooks), -1)).ravel()
+        entries, scores = [], []
+        for probed in closest:
+            # Lists are contiguous, so each is scanned in place without gathering rows
+            start, end = self.list_offsets[probed], self.list_offsets[probed + 1]
+            entries.append(np.arange(start, end))
+            if self.codes is None:
+                scores.append((self.vectors[start:end] @ query) * self.scales[start:end])
+            else:
+                codes = self.codes[start:end] + self._table_offsets
+                scores.append(centroid_scores[probed] + lookup[codes].sum(axis=1))
+        # Quantization error can push a perfect match slightly past 1
+        return np.concatenate(entries), np.clip(np.concatenate(scores), -1.0, 1.0)
+
+    def exact_scores(self, entries: np.ndarray, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score entries against a query with their stored vectors
+
+        Returns:
+            Tuple of (entries in storage order, their cosine similarity)
+        """
+        entries = np.sort(entries)
+        return entries, (self.vectors[entries].astype(np.float32) @ query) * self.scales[entries]
+
+    def nearest_entries(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest label entries to one embedded query
+
+        Returns:
+            Tuple of (entry numbers, cosine similarities), best first
+        """
+        entries, scores = self.probe(query)
+        if self.codes is not None and len(entries):
+            # Re-rank the best approximate candidates exactly
+            keep = max(self.rerank, k)
+            if len(scores) > keep:
+                entries = entries[np.argpartition(-scores, keep - 1)[:keep]]
+            entries, scores = self.exact_scores(entries, query)
+            scores = np.clip(scores, -1.0, 1.0)
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return entries[top], scores[top]
+
+    def search(self, terms: List[str], k: int = 10) -> List[List[Tuple[int, float]]]:
+        """
+        Find the nearest authorized headings for a batch of terms
+
+        Args:
+            terms: Terms to look up; they are embedded in one batch
+            k: Maximum number of headings per term
+
+        Returns:
+            For each term, a list of (heading row, cosine similarity) pairs,
+            best first, one per heading
+        """
+        if not terms or not len(self):
+            return [[] for _ in terms]
+        results = []
+        for query in self.embedder.embed(terms):
+            # A heading can have several labels among the nearest entries; keep its best
+            entries, scores = self.nearest_entries(query, 4 * k)
+            rows, first = np.unique(self.entry_row[entries], return_index=True)
+            best = scores[first]
+            ranking = np.argsort(-best, kind="stable")[:k]
+            results.append([(int(rows[i]), float(best[i])) for i in ranking])
+        return results
+
+    def evaluate(self, queries: List[str], k: int = 10) -> Dict[str, Any]:
+        """
+        Measure recall@k and latency of the approximate search
+
+        The reference is an exhaustive scan of every stored vector, so in
+        "pq" mode recall covers both the IVF probing and the product
+        quantization, and in the other modes the IVF probing alone.
+
+        Args:
+            queries: Terms to search for
+            k: Number of nearest entries compared
+
+        Returns:
+            Dictionary with recall@k, latency percentiles in milliseconds,
+            and bytes scanned per vector against float32 storage
+        """
+        if not queries or not len(self):
+            raise ValueError("Evaluation needs queries and a non-empty index")
+        embedded = self.embedder.embed(queries)
+        k = min(k, len(self))
+        # Running exact top k per query, merged block by block
+        best_entries = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), EMBED_BLOCK):
+            end = min(start + EMBED_BLOCK, len(self))
+            block = self.vectors[start:end].astype(np.float32) * self.scales[start:end, None]
+            scores = np.concatenate([best_scores, embedded @ block.T], axis=1)
+            entries = np.concatenate([best_entries, np.broadcast_to(np.arange(start, end), (len(queries), end - start))],
+                                     axis=1)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_entries = np.take_along_axis(entries, top, axis=1)
+
+        found, latencies = 0, []
+        for query, truth in zip(embedded, best_entries):
+            started = time.perf_counter()
+            entries, _ = self.nearest_entries(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found += len(np.intersect1d(entries, truth))
+
+        dim = self.centroids.shape[1]
+        scanned = self.codes.shape[1] if self.codes is not None else self.vectors.dtype.itemsize * dim
+        return {
+            "queries": len(queries),
+            "recall": found / max(1, len(queries) * k),
+            "p50_ms": float(np.percentile(latencies, 50)) if latencies else 0.0,
+            "p99_ms": float(np.percentile(latencies, 99)) if latencies else 0.0,
+            "bytes_per_vector": scanned,
+            "compression": 4 * dim / scanned,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": len(self),
+            "lists": len(self.centroids),
+            "nprobe": self.nprobe,
+            "embedder": self.meta["embedder"]["name"],
+            "dtype": self.meta["dtype"],
+            "rerank": self.rerank if self.codes is not None else 0,
+        }
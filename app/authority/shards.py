@@ -0,0 +1,211 @@
+"""
+Authority Shards Module - Parallel, sharded ingest of LC dumps
+"""
+import heapq
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, IO, Iterator, Tuple
+
+from app.authority.ingest import open_headings, read_headings, write_headings
+from app.authority.records import (
+    AuthorityRecord, is_jsonld_path, iter_jsonld_records, iter_ntriples_records, open_dump
+)
+
+# Dumps are cut into shards of at most this many bytes
+MAX_SHARD_BYTES = 64 * 1024 * 1024
+
+def _subject(line: bytes) -> bytes:
+    return line.split(b" ", 1)[0] if line[:1] in (b"<", b"_") else b""
+
+def record_boundary(dump: IO[bytes], offset: int, jsonld: bool) -> int:
+    """
+    Find where the first record starting at or after ``offset`` begins
+
+    JSON-LD dumps hold one record per line, so any line start will do. In
+    N-Triples a record is a run of lines with the same subject plus the blank
+    nodes that follow it, so the boundary is the first line whose named
+    subject differs from the one before it. Neighbouring shards compute their
+    shared boundary with this same function, so every record lands in exactly
+    one shard.
+
+    Args:
+        dump: Dump file opened in binary mode
+        offset: Byte offset to start looking from
+        jsonld: Whether the dump is line-delimited JSON-LD
+
+    Returns:
+        Byte offset of the boundary, or the file size when there is none
+    """
+    if offset == 0:
+        return 0
+    dump.seek(offset)
+    dump.readline()
+    if jsonld:
+        return dump.tell()
+
+    previous = None
+    while True:
+        position = dump.tell()
+        line = dump.readline()
+        if not line:
+            return position
+        subject = _subject(line)
+        if not subject or subject.startswith(b"_:"):
+            continue
+        if previous is not None and subject != previous:
+            return position
+        previous = subject
+
+def plan_shards(path: str, shard_count: int) -> List[Tuple[str, int, int]]:
+    """
+    Split a dump file into byte ranges aligned on record boundaries
+
+    Gzipped dumps cannot be split and become a single shard.
+
+    Args:
+        path: Dump file
+        shard_count: Number of shards wanted
+
+    Returns:
+        List of (path, start offset, end offset); an end of -1 means end of file
+    """
+    if path.endswith(".gz"):
+        return [(path, 0, -1)]
+
+    size = os.path.getsize(path)
+    shard_count = max(1, shard_count, -(-size // MAX_SHARD_BYTES))
+    jsonld = is_jsonld_path(path)
+    with open(path, "rb") as dump:
+        boundaries = sorted({record_boundary(dump, size * i // shard_count, jsonld) for i in range(shard_count)})
+    boundaries.append(size)
+    return [(path, start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def _shard_lines(path: str, start: int, end: int) -> Iterator[str]:
+    if end < 0:
+        with open_dump(path) as dump:
+            yield from dump
+        return
+    with open(path, "rb") as dump:
+        dump.seek(start)
+        position = start
+        while position < end:
+            line = dump.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line.decode("utf-8")
+
+def sort_key(record: AuthorityRecord) -> str:
+    """
+    Order of records in a merged headings file: by URI, so that the parts of
+    a record found in different shards meet whatever their labels
+    """
+    return record.uri
+
+def process_shard(path: str, start: int, end: int, output_path: str) -> Dict[str, int]:
+    """
+    Parse, normalize and sort one shard into a partial headings file
+
+    Runs in a worker process.
+
+    Args:
+        path: Dump file
+        start: Byte offset the shard starts at
+        end: Byte offset the shard ends at, or -1 for end of file
+        output_path: Partial headings file to write
+
+    Returns:
+        Dictionary with the triples and records processed
+    """
+    stats = {"triples": 0}
+    lines = _shard_lines(path, start, end)
+    if is_jsonld_path(path):
+        records = iter_jsonld_records(lines, stats)
+    else:
+        records = iter_ntriples_records(lines, stats)
+    records = sorted(records, key=sort_key)
+
+    with open_headings(output_path, "w") as output:
+        stats["records"] = write_headings(records, output)
+    return stats
+
+def merge_partials(partial_paths: List[str], output_path: str) -> int:
+    """
+    K-way merge sorted partial headings files into one
+
+    Records of the same URI from several partials are merged into one, see
+    ``AuthorityRecord.merge``.
+
+    Args:
+        partial_paths: Partial files, each sorted by ``sort_key``
+        output_path: Merged headings file to write
+
+    Returns:
+        Number of records written
+    """
+    streams = [read_headings(path) for path in partial_paths]
+
+    def merged() -> Iterator[AuthorityRecord]:
+        current: Optional[AuthorityRecord] = None
+        for record in heapq.merge(*streams, key=sort_key):
+            # The same record from two shards: combine its parts
+            if current is not None and record.uri == current.uri:
+                current.merge(record)
+                continue
+            if current is not None:
+                yield current
+            current = record
+        if current is not None:
+            yield current
+
+    with open_headings(output_path, "w") as output:
+        return write_headings(merged(), output)
+
+def ingest_parallel(dumps: List[str], output_path: str, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Ingest LC dump files using a pool of worker processes
+
+    Each dump is cut into byte-range shards on record boundaries; workers
+    parse and sort the shards independently and the partial results are
+    combined with a k-way merge into a headings file sorted by URI.
+
+    Args:
+        dumps: N-Triples or line-delimited JSON-LD files; gzipped files are
+            processed as a single shard each
+        output_path: Headings file to write (.gz to compress)
+        workers: Number of worker processes, defaults to the CPU count
+
+    Returns:
+        Dictionary with triples and records processed, elapsed seconds,
+        throughput in triples per second and the number of shards
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    shards = [shard for path in dumps for shard in plan_shards(path, workers * 4)]
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    work_dir = tempfile.mkdtemp(prefix="lcsh-shards-", dir=output_dir)
+    try:
+        partial_paths = [os.path.join(work_dir, f"shard-{i:05d}.tsv") for i in range(len(shards))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(process_shard, path, start, end, partial)
+                for (path, start, end), partial in zip(shards, partial_paths)
+            ]
+            results = [future.result() for future in futures]
+        records = merge_partials(partial_paths, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - started
+    triples = sum(result["triples"] for result in results)
+    return {
+        "triples": triples,
+        "records": records,
+        "seconds": elapsed,
+        "triples_per_second": triples / elapsed if elapsed > 0 else 0.0,
+        "shards": len(shards),
+    }
@@ -0,0 +1,211 @@
+"""
+Trigram Index Module - Character-trigram inverted index for fuzzy heading lookup
+"""
+import math
+import os
+from typing import List, Dict, Any, Tuple, Optional
+
+import numpy as np
+
+from app.authority.heading_table import HeadingTable
+from app.normalize import heading_key
+
+def trigram_codes(key: str) -> np.ndarray:
+    """
+    Get the distinct trigrams of a folded key as sorted integer codes
+
+    The key is padded with a space on each side so that the first and last
+    characters get trigrams of their own. Three code points (21 bits each)
+    pack losslessly into one uint64.
+
+    Args:
+        key: Folded key, see ``heading_key``
+
+    Returns:
+        Sorted array of unique trigram codes
+    """
+    padded = f" {key} "
+    codes = {
+        (ord(padded[i]) << 42) | (ord(padded[i + 1]) << 21) | ord(padded[i + 2])
+        for i in range(len(padded) - 2)
+    }
+    return np.fromiter(sorted(codes), dtype=np.uint64, count=len(codes))
+
+
+class TrigramIndex:
+    """
+    Posting lists from trigrams to label entries, in compressed sparse row form
+
+    Every authorized and variant label of the heading table is an entry.
+    ``codes`` holds the sorted trigram codes, ``offsets`` where each code's
+    posting list starts in ``postings``, and ``postings`` the sorted entry
+    numbers. ``entry_row`` maps an entry back to its heading row and
+    ``entry_grams`` holds its trigram count for scoring. Entries are
+    numbered in order of trigram count, so the entries of a given length
+    range form a contiguous slice of every posting list. ``entry_variant``
+    flags the entries that are variant labels. All arrays are
+    memory-mapped.
+    """
+    FILES = ("codes", "offsets", "postings", "entry_row", "entry_grams")
+
+    def __init__(self, directory: str):
+        """
+        Open an index written with ``TrigramIndex.build``
+
+        Args:
+            directory: Index directory
+        """
+        for name in self.FILES:
+            setattr(self, name, np.load(os.path.join(directory, f"trigram_{name}.npy"), mmap_mode="r"))
+        # Indexes built before variant entries were flagged have no flags
+        variant_path = os.path.join(directory, "trigram_entry_variant.npy")
+        self.entry_variant = np.load(variant_path, mmap_mode="r") if os.path.exists(variant_path) else None
+
+    @staticmethod
+    def build(table: HeadingTable, directory: str) -> Dict[str, Any]:
+        """
+        Write the trigram index for every label in a heading table
+
+        Args:
+            table: Heading table to index
+            directory: Index directory to write
+
+        Returns:
+            Dictionary with the number of entries, distinct trigrams and postings
+        """
+        rows = np.concatenate([
+            np.arange(len(table), dtype=np.uint32),
+            np.asarray(table.variant_rows, dtype=np.uint32),
+        ])
+        variant = np.arange(len(rows)) >= len(table)
+        keys = [table.keys[i] for i in range(len(table.keys))]
+        keys += [table.variant_keys[i] for i in range(len(table.variant_keys))]
+
+        gram_lists = [trigram_codes(key) for key in keys]
+        entry_grams = np.fromiter((len(grams) for grams in gram_lists), dtype=np.uint16, count=len(keys))
+        by_length = np.argsort(entry_grams, kind="stable")
+        rows, entry_grams, variant = rows[by_length], entry_grams[by_length], variant[by_length]
+        gram_lists = [gram_lists[i] for i in by_length]
+
+        all_codes = np.concatenate(gram_lists) if gram_lists else np.zeros(0, dtype=np.uint64)
+        all_entries = np.repeat(np.arange(len(keys), dtype=np.uint32), entry_grams)
+
+        # A stable sort by code keeps each posting list in entry order
+        order = np.argsort(all_codes, kind="stable")
+        all_codes = all_codes[order]
+        postings = all_entries[order]
+        codes, starts = np.unique(all_codes, return_index=True)
+        offsets = np.append(starts, len(postings)).astype(np.uint64)
+
+        arrays = {
+            "codes": codes,
+            "offsets": offsets,
+            "postings": postings,
+            "entry_row": rows,
+            "entry_grams": entry_grams,
+            "entry_variant": variant,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"trigram_{name}.npy"), array)
+        return {"entries": len(keys), "trigrams": len(codes), "postings": len(postings)}
+
+    def matches(self, term: str, min_score: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find every label entry whose trigrams reach a Dice score with a term
+
+        Scores are Dice coefficients over trigram sets. Entries are numbered
+        by trigram count, so only the slice of each posting list holding
+        entries long enough and short enough to reach ``min_score`` is read.
+        Overlaps are then counted for all those entries at once with a single
+        ``bincount`` over the slices, and only entries sharing enough
+        trigrams are scored.
+
+        Args:
+            term: Term to look up
+            min_score: Minimum Dice coefficient
+
+        Returns:
+            Arrays of entry numbers and their scores, unordered
+        """
+        query = trigram_codes(heading_key(term))
+        total = len(query)
+        if total == 0 or len(self.codes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        positions = np.searchsorted(self.codes, query)
+        in_range = positions < len(self.codes)
+        positions, query = positions[in_range], query[in_range]
+        positions = positions[self.codes[positions] == query]
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        # Dice = 2o / (total + g) with o <= min(total, g) bounds the entry length g
+        lowest = math.ceil(min_score * total / (2 - min_score) - 1e-9)
+        highest = math.floor((2 - min_score) * total / min_score + 1e-9)
+        first_entry = int(np.searchsorted(self.entry_grams, lowest, side="left"))
+        last_entry = int(np.searchsorted(self.entry_grams, highest, side="right"))
+        if first_entry >= last_entry:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        slices = []
+        for position in positions:
+            posting = self.postings[self.offsets[position]:self.offsets[position + 1]]
+            start, end = np.searchsorted(posting, (first_entry, last_entry))
+            slices.append(posting[start:end])
+        overlap = np.bincount(np.concatenate(slices) - first_entry, minlength=last_entry - first_entry)
+
+        # Dice <= 2o / (total + o), so a match needs an overlap o >= this
+        needed = max(1, lowest)
+        candidates = np.flatnonzero(overlap >= needed)
+        scores = 2.0 * overlap[candidates] / (total + self.entry_grams[candidates + first_entry].astype(np.float64))
+        keep = scores >= min_score
+        candidates, scores = candidates[keep] + first_entry, scores[keep]
+        return candidates, scores
+
+    def shortlist(self, term: str, limit: int = 50, min_score: float = 0.3,
+                  allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the entries with the best Dice scores for a term, best first
+
+        Args:
+            term: Term to look up
+            limit: Maximum number of entries
+            min_score: Minimum Dice coefficient
+            allowed: Boolean mask over entries; others are left out before
+                the best ones are taken, so they cannot crowd them out
+
+        Returns:
+            Array of entry numbers
+        """
+        candidates, scores = self.matches(term, min_score)
+        if allowed is not None:
+            keep = allowed[candidates]
+            candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        return candidates[np.argsort(-scores, kind="stable")]
+
+    def search(self, term: str, limit: int = 5, min_score: float = 0.5) -> List[Tuple[int, float]]:
+        """
+        Find the headings whose labels share the most trigrams with a term
+
+        Args:
+            term: Term to look up
+            limit: Maximum number of headings to return
+            min_score: Minimum Dice coefficient
+
+        Returns:
+            List of (heading row, score) pairs, best first, one per heading
+        """
+        candidates, scores = self.matches(term, min_score)
+        if len(candidates) == 0:
+            return []
+
+        # Best entry per heading, then the top headings
+        order = np.argsort(-scores, kind="stable")
+        rows = self.entry_row[candidates[order]]
+        rows, first = np.unique(rows, return_index=True)
+        best = scores[order][first]
+        top = np.argsort(-best, kind="stable")[:limit]
+        return [(int(rows[i]), float(best[i])) for i in top]
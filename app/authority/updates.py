@@ -0,0 +1,251 @@
+"""
+Authority Updates Module - Applies LC weekly change files to an index as delta segments
+"""
+import json
+import os
+import shutil
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Set
+
+from app.authority.builder import build_index
+from app.authority.heading_table import HeadingTable
+from app.authority.ingest import expand_uri, open_headings, read_headings, write_headings
+from app.authority.records import AuthorityRecord
+from app.authority.semantic import SemanticIndex, make_embedder
+
+MANIFEST = "MANIFEST.json"
+TOMBSTONES = "tombstones.txt"
+SEGMENT_HEADINGS = "headings.tsv"
+# Names of the segment and base directories are these plus the generation
+SEGMENT_PREFIX = "segment-"
+BASE_PREFIX = "base-"
+# An update that leaves more segments than this compacts them into a new base
+COMPACT_AFTER = 8
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    """
+    Read the manifest of an index directory
+
+    An index built before manifests existed is its own base with no
+    segments.
+
+    Returns:
+        Dictionary with the ``generation``, the ``base`` directory and the
+        ``headings`` file it was built from (both relative to the index
+        directory), and the ``segments`` applied on top, oldest first
+    """
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {"generation": 0, "base": ".", "headings": None, "segments": []}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    """
+    Replace the manifest of an index directory atomically
+
+    The new manifest is written and synced under a temporary name and then
+    renamed over the old one, so a reader sees either the old or the new
+    manifest, never a partial one.
+    """
+    path = os.path.join(directory, MANIFEST)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+def reset_manifest(directory: str, headings: str) -> None:
+    """
+    Start a new manifest for an index directory the build command just wrote
+
+    The fresh build is the base and supersedes every segment and base of
+    an earlier build in the same directory, so their directories are
+    removed once the new manifest is in place.
+
+    Args:
+        directory: Index directory
+        headings: Headings file the index was built from
+    """
+    write_manifest(directory, {"generation": 0, "base": ".", "headings": os.path.abspath(headings),
+                               "segments": []})
+    for name in os.listdir(directory):
+        if name.startswith((SEGMENT_PREFIX, BASE_PREFIX)) and os.path.isdir(os.path.join(directory, name)):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+def _new_layer(directory: str, manifest: Dict[str, Any], name: str) -> str:
+    """
+    Create the empty directory of a new segment or base
+
+    A directory of that name that the manifest does not reference is left
+    over, from an update or compaction that crashed before switching the
+    manifest or from an earlier build, and is removed first.
+
+    Returns:
+        Path of the directory
+    """
+    if name == manifest["base"] or name in manifest["segments"]:
+        raise ValueError(f"{name} is already part of the index in {directory}")
+    target = os.path.join(directory, name)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.makedirs(target)
+    return target
+
+def read_tombstones(directory: str) -> Set[str]:
+    """
+    Get the URIs a segment replaces or cancels in the layers below it
+    """
+    with open(os.path.join(directory, TOMBSTONES), "r", encoding="utf-8") as file:
+        return {line.strip() for line in file if line.strip()}
+
+def read_uri_list(path: str) -> List[str]:
+    """
+    Read a file of authority URIs, one per line
+
+    Blank lines and lines starting with "#" are skipped, and the short
+    tokens of the headings file ("lcsh:sh85024107") are expanded.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return [expand_uri(line.strip()) for line in file if line.strip() and not line.startswith("#")]
+
+def _embed_like(source: str, directory: str, segment: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Build a semantic index with the same embedder as the one in ``source``, if any
+    """
+    if not SemanticIndex.exists(source):
+        return None
+    with open(os.path.join(source, "semantic.json"), "r", encoding="utf-8") as file:
+        meta = json.load(file)
+    dtype = meta["dtype"]
+    # Product quantization needs far more labels to train on than a segment has
+    if segment and dtype == "pq":
+        dtype = "float16"
+    return SemanticIndex.build(HeadingTable(directory), directory, make_embedder(meta["embedder"]),
+                               dtype, subspaces=meta.get("subspaces", 32))
+
+def apply_changes(directory: str, records: Iterable[AuthorityRecord], cancelled: Iterable[str] = (),
+                  compact_after: int = COMPACT_AFTER,
+                  log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Apply a change file to an index as a new delta segment
+
+    The new and changed records are built into a small index directory of
+    their own (string pools, membership filter, trigram index, relation
+    graph and, when the base has one, semantic index), next to a tombstone
+    list of every URI it supersedes in the layers below: the URIs of its
+    records and the cancelled ones. The segment becomes visible to readers
+    only when the manifest naming it replaces the old one, so a running
+    worker picks it up whole or not at all.
+
+    Only one update or compaction may run on an index at a time.
+
+    Args:
+        directory: Index directory written by the build command
+        records: New and changed authority records
+        cancelled: URIs of cancelled headings
+        compact_after: Compact into a new base once there are more
+            segments than this and the base headings file is known; 0 never
+        log: Called with one line of progress per step
+
+    Returns:
+        Dictionary with the ``segment`` name, its ``headings`` and
+        ``tombstones`` counts, the new ``generation`` and, when the update
+        compacted the index, the ``compacted`` stats
+    """
+    log = log or (lambda line: None)
+    manifest = read_manifest(directory)
+    generation = manifest["generation"] + 1
+    name = f"{SEGMENT_PREFIX}{generation:06d}"
+    target = _new_layer(directory, manifest, name)
+
+    tombstones = set(cancelled)
+
+    def tracked() -> Iterator[AuthorityRecord]:
+        for record in records:
+            tombstones.add(record.uri)
+            yield record
+
+    headings_path = os.path.join(target, SEGMENT_HEADINGS)
+    with open_headings(headings_path, "w") as output:
+        count = write_headings(tracked(), output)
+    with open(os.path.join(target, TOMBSTONES), "w", encoding="utf-8") as file:
+        file.writelines(uri + "\n" for uri in sorted(tombstones))
+
+    build_index(headings_path, target, log)
+    if _embed_like(os.path.join(directory, manifest["base"]), target, segment=True):
+        log(f"Embedded the labels of {name}")
+
+    manifest = dict(manifest, generation=generation, segments=manifest["segments"] + [name])
+    write_manifest(directory, manifest)
+    stats = {"segment": name, "headings": count, "tombstones": len(tombstones), "generation": generation}
+    log(f"Applied {count:,} changed headings and {len(tombstones):,} tombstones as {name}")
+
+    if compact_after and len(manifest["segments"]) > compact_after and manifest.get("headings"):
+        stats["compacted"] = compact(directory, log=log)
+    return stats
+
+def compact(directory: str, headings: Optional[str] = None,
+            log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Merge the base and every segment of an index into a new base
+
+    The base headings file is streamed with superseded records dropped and
+    each segment's records are appended unless a later segment supersedes
+    them; the merged file is kept in the new base directory and is the
+    base headings file of the next compaction. The manifest then switches
+    to the new base with no segments, and the old segment and base
+    directories are removed. Workers that still have them open keep
+    reading their maps until they reload.
+
+    Args:
+        directory: Index directory
+        headings: Headings file the base was built from, by default the one
+            recorded in the manifest by the build command
+        log: Called with one line of progress per step
+
+    Returns:
+        Dictionary with the new ``base``, its ``headings`` count, the
+        number of segments merged and the new ``generation``
+    """
+    log = log or (lambda line: None)
+    manifest = read_manifest(directory)
+    source = headings or (os.path.join(directory, manifest["headings"]) if manifest.get("headings") else None)
+    if not source:
+        raise ValueError(f"The headings file the base of {directory} was built from is not known")
+
+    segments = manifest["segments"]
+    tombstones = [read_tombstones(os.path.join(directory, segment)) for segment in segments]
+    # URIs superseded by the segments after each one
+    later: List[Set[str]] = [set() for _ in segments]
+    for i in range(len(segments) - 2, -1, -1):
+        later[i] = later[i + 1] | tombstones[i + 1]
+    superseded = later[0] | tombstones[0] if segments else set()
+
+    def merged() -> Iterator[AuthorityRecord]:
+        for record in read_headings(source):
+            if record.uri not in superseded:
+                yield record
+        for segment, dead in zip(segments, later):
+            for record in read_headings(os.path.join(directory, segment, SEGMENT_HEADINGS)):
+                if record.uri not in dead:
+                    yield record
+
+    generation = manifest["generation"] + 1
+    name = f"{BASE_PREFIX}{generation:06d}"
+    base = _new_layer(directory, manifest, name)
+    headings_path = os.path.join(name, "headings.tsv.gz")
+    with open_headings(os.path.join(directory, headings_path), "w") as output:
+        count = write_headings(merged(), output)
+
+    build_index(os.path.join(directory, headings_path), base, log)
+    if _embed_like(os.path.join(directory, manifest["base"]), base):
+        log(f"Embedded the labels of {name}")
+
+    write_manifest(directory, {"generation": generation, "base": name, "headings": headings_path, "segments": []})
+    for old in segments + [manifest["base"]]:
+        # The original build's files live in the index directory itself and are left alone
+        if old != ".":
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    log(f"Compacted {len(segments):,} segments into {name} of {count:,} headings")
+    return {"base": name, "headings": count, "segments": len(segments), "generation": generation}
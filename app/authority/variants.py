@@ -0,0 +1,165 @@
+"""
+Variants Module - Hash table resolving variant (see-from) labels to authorized headings
+"""
+import json
+import os
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+from app.authority.compound import SEPARATOR
+from app.authority.heading_table import HeadingTable
+from app.authority.membership import key_hashes
+from app.normalize import heading_key
+
+# Fingerprint marking an empty slot; real fingerprints of 0 are stored as 1
+EMPTY = 0
+
+class VariantTable:
+    """
+    Open-addressing hash table from folded variant labels to heading rows
+
+    Every 4XX see-from label of the heading table is hashed once at build
+    time. Slots are a power of two at most half full; a key starts at
+    ``(h2 >> 1) & mask`` (the low bit of ``h2`` is always set) and probes linearly until it finds its 64-bit fingerprint
+    (``h1``) or an empty slot. ``fingerprints`` and ``rows`` are
+    memory-mapped, so a lookup is a hash plus one or two array reads instead
+    of a binary search through the variant pool.
+
+    Subclasses index other keys of the table the same way by overriding
+    ``NAME``, ``fold`` and ``entries``.
+    """
+    # Prefix of the files written
+    NAME = "variants"
+
+    def __init__(self, directory: str, table: HeadingTable):
+        """
+        Open a table written with ``build``
+
+        Args:
+            directory: Index directory
+            table: Heading table the keys point into
+        """
+        self.table = table
+        with open(os.path.join(directory, f"{self.NAME}.json"), "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        fingerprints = np.load(os.path.join(directory, f"{self.NAME}_fingerprints.npy"), mmap_mode="r")
+        rows = np.load(os.path.join(directory, f"{self.NAME}_rows.npy"), mmap_mode="r")
+        # A memoryview reads single items far faster than NumPy scalar indexing
+        self.fingerprints = memoryview(fingerprints)
+        self.rows = memoryview(rows)
+        self.mask = len(fingerprints) - 1
+
+    def __len__(self) -> int:
+        return self.meta["keys"]
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, f"{cls.NAME}.json"))
+
+    @staticmethod
+    def fold(term: str) -> str:
+        """
+        Fold a term into the kind of key the table holds
+        """
+        return heading_key(term)
+
+    @classmethod
+    def entries(cls, table: HeadingTable) -> Tuple[List[str], np.ndarray]:
+        """
+        Get the distinct keys to index and the row each points to
+        """
+        return ([table.variant_keys[i] for i in range(len(table.variant_keys))],
+                np.asarray(table.variant_rows, dtype=np.uint32))
+
+    @classmethod
+    def build(cls, table: HeadingTable, directory: str) -> Dict[str, Any]:
+        """
+        Write the hash table for the keys of a heading table
+
+        Keys are placed in rounds with array operations: each round, every
+        pending key tries its next probe slot and the first key to claim a
+        free slot keeps it.
+
+        Args:
+            table: Heading table to index
+            directory: Index directory to write
+
+        Returns:
+            Dictionary with the number of keys and the bytes written
+        """
+        keys, variant_rows = cls.entries(table)
+        count = len(keys)
+        hashes = [key_hashes(key) for key in keys]
+        h1 = np.fromiter((hash1 for hash1, _ in hashes), dtype=np.uint64, count=count)
+        h2 = np.fromiter((hash2 for _, hash2 in hashes), dtype=np.uint64, count=count)
+        h1[h1 == EMPTY] = 1
+
+        size = 1 << max(4, (2 * count - 1).bit_length())
+        fingerprints = np.full(size, EMPTY, dtype=np.uint64)
+        rows = np.zeros(size, dtype=np.uint32)
+        home = ((h2 >> np.uint64(1)) & np.uint64(size - 1)).astype(np.int64)
+
+        pending = np.arange(count)
+        probe = 0
+        while len(pending):
+            slots = (home[pending] + probe) & (size - 1)
+            free = fingerprints[slots] == EMPTY
+            claimed, first = np.unique(slots[free], return_index=True)
+            winners = pending[free][first]
+            fingerprints[claimed] = h1[winners]
+            rows[claimed] = variant_rows[winners]
+            placed = np.zeros(count, dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            probe += 1
+
+        np.save(os.path.join(directory, f"{cls.NAME}_fingerprints.npy"), fingerprints)
+        np.save(os.path.join(directory, f"{cls.NAME}_rows.npy"), rows)
+        with open(os.path.join(directory, f"{cls.NAME}.json"), "w", encoding="utf-8") as file:
+            json.dump({"keys": count, "slots": size, "max_probe": probe}, file, indent=2)
+        return {"keys": count, "bytes": fingerprints.nbytes + rows.nbytes}
+
+    def find(self, term: str) -> int:
+        """
+        Find the heading that has a term as a variant (see-from) label
+
+        Returns:
+            Row of the authorized heading, or -1
+        """
+        h1, h2 = key_hashes(self.fold(term))
+        fingerprint = h1 or 1
+        slot = (h2 >> 1) & self.mask
+        while True:
+            stored = self.fingerprints[slot]
+            if stored == fingerprint:
+                return self.rows[slot]
+            if stored == EMPTY:
+                return -1
+            slot = (slot + 1) & self.mask
+
+    def resolve(self, term: str, alive: Optional[Callable[[int], bool]] = None) -> Optional[str]:
+        """
+        Rewrite a variant label to its authorized form
+
+        A compound term whose main heading is a variant keeps its
+        subdivisions, so "Movies--Japan" becomes "Motion pictures--Japan".
+
+        Args:
+            term: Term as suggested by the model
+            alive: Rows for which this returns False are treated as absent,
+                e.g. headings superseded by a later delta segment
+
+        Returns:
+            The authorized form, or None when the term is not a variant
+        """
+        row = self.find(term)
+        if row >= 0 and (alive is None or alive(row)):
+            return self.table.label(row)
+        if SEPARATOR not in term:
+            return None
+        main, subdivisions = term.split(SEPARATOR, 1)
+        row = self.find(main)
+        if row < 0 or (alive is not None and not alive(row)):
+            return None
+        return self.table.label(row) + SEPARATOR + subdivisions.strip()
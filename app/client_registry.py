@@ -0,0 +1,242 @@
+"""
+Client Registry Module - Keeps warm Gemini clients per API key across sessions
+"""
+import atexit
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, Optional, Set
+
+from google import genai
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def key_digest(api_key: str) -> str:
+    """
+    Get the SHA-256 digest the registry files a client under
+
+    The registry never holds API keys itself, only this digest and the
+    client built from the key.
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+def _close_client(client) -> None:
+    # Releases the client's connection pool; older google-genai clients have no close()
+    close = getattr(client, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class ClientRegistry:
+    """
+    Process-wide, thread-safe set of warm clients keyed by API key digest
+
+    Building a ``genai.Client`` and opening its first HTTPS connection costs
+    far more than a request on a warm one, so sessions that use the same
+    key share one client and its connection pool. Clients are handed out
+    as leases. A client idle for ``idle_ttl`` seconds, or the least recently
+    used one when more than ``max_clients`` keys are live, is dropped from
+    the registry and closed once its last lease ends. A background thread
+    drops idle clients even when no request comes in, so a key is never
+    kept much past its idle TTL.
+    """
+    def __init__(self, factory: Optional[Callable[[str], Any]] = None, max_clients: int = 32,
+                 idle_ttl: float = 600.0, sweep_interval: Optional[float] = None):
+        """
+        Initialize the registry
+
+        Args:
+            factory: Builds a client from an API key, ``genai.Client`` by default
+            max_clients: Maximum number of keys with a live client
+            idle_ttl: Seconds a client may go unused before it is closed
+            sweep_interval: Seconds between background checks for idle
+                clients, by default a tenth of ``idle_ttl``
+        """
+        self.factory = factory or (lambda api_key: genai.Client(api_key=api_key))
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval if sweep_interval is not None else max(idle_ttl / 10, 0.1)
+
+        self._condition = threading.Condition()
+        # Clients by key digest, least recently used first: [client, last used, leases]
+        self._clients: "OrderedDict[str, list]" = OrderedDict()
+        # Clients dropped while leased, closed when their last lease ends
+        self._retired: Dict[int, list] = {}
+        # Digests whose client is being built
+        self._building: Set[str] = set()
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "idle_evictions": 0,
+            "lru_evictions": 0,
+            "discarded": 0,
+            "closed": 0,
+        }
+
+        self._sweeper = threading.Thread(target=self._run, name="genai-client-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def close(self) -> None:
+        """
+        Stop the background thread and close every client that is not leased
+        """
+        with self._condition:
+            self._closed = True
+            entries = list(self._clients.values())
+            self._clients.clear()
+            for entry in entries:
+                self._retire(entry)
+            self._condition.notify_all()
+        self._sweeper.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get reuse metrics
+
+        Returns:
+            Dictionary with client creation, reuse and eviction counts, the
+            share of leases served by a warm client and the number of live
+            and leased clients
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["live"] = len(self._clients)
+            stats["leased"] = sum(1 for entry in self._clients.values() if entry[2]) + len(self._retired)
+        leases = stats["created"] + stats["reused"]
+        stats["reuse_rate"] = round(stats["reused"] / leases, 4) if leases else 0.0
+        return stats
+
+    def _retire(self, entry: list) -> None:
+        # Caller holds self._condition
+        if entry[2]:
+            self._retired[id(entry)] = entry
+        else:
+            _close_client(entry[0])
+            self._stats["closed"] += 1
+
+    def _evict_idle(self, now: float) -> None:
+        # Caller holds self._condition; the order is also by last use
+        for digest, entry in list(self._clients.items()):
+            if now - entry[1] < self.idle_ttl:
+                break
+            if not entry[2]:
+                del self._clients[digest]
+                self._retire(entry)
+                self._stats["idle_evictions"] += 1
+
+    def _run(self) -> None:
+        with self._condition:
+            while not self._closed:
+                self._condition.wait(self.sweep_interval)
+                self._evict_idle(time.monotonic())
+
+    def _acquire(self, api_key: str) -> list:
+        digest = key_digest(api_key)
+        with self._condition:
+            # Sessions arriving while a key's client is being built wait for it instead of building their own
+            while digest in self._building:
+                self._condition.wait()
+            if self._closed:
+                raise RuntimeError("The client registry is closed")
+            now = time.monotonic()
+            self._evict_idle(now)
+            entry = self._clients.get(digest)
+            if entry is not None:
+                self._clients.move_to_end(digest)
+                entry[1] = now
+                entry[2] += 1
+                self._stats["reused"] += 1
+                return entry
+            self._building.add(digest)
+
+        try:
+            client = self.factory(api_key)
+        except BaseException:
+            with self._condition:
+                self._building.discard(digest)
+                self._condition.notify_all()
+            raise
+        # The entry goes in with the build marker cleared, so waiters find it when they wake
+        with self._condition:
+            entry = [client, time.monotonic(), 1]
+            self._clients[digest] = entry
+            self._stats["created"] += 1
+            self._building.discard(digest)
+            self._condition.notify_all()
+            while len(self._clients) > self.max_clients:
+                _, oldest = self._clients.popitem(last=False)
+                self._retire(oldest)
+                self._stats["lru_evictions"] += 1
+            return entry
+
+    def _release(self, entry: list) -> None:
+        with self._condition:
+            entry[1] = time.monotonic()
+            entry[2] -= 1
+            if not entry[2] and self._retired.pop(id(entry), None) is not None:
+                _close_client(entry[0])
+                self._stats["closed"] += 1
+
+    @contextmanager
+    def lease(self, api_key: str) -> Iterator[Any]:
+        """
+        Borrow the warm client for an API key, building it if needed
+
+        The client stays open for as long as the lease lasts, even if it is
+        evicted meanwhile, so a lease should span the whole request,
+        including the reading of a streamed response.
+
+        Args:
+            api_key: Gemini API key
+
+        Yields:
+            The ``genai.Client`` for the key
+        """
+        entry = self._acquire(api_key)
+        try:
+            yield entry[0]
+        finally:
+            self._release(entry)
+
+    def discard(self, api_key: str) -> bool:
+        """
+        Drop the client of an API key, e.g. after the key was rejected
+
+        Returns:
+            True when the key had a live client
+        """
+        with self._condition:
+            entry = self._clients.pop(key_digest(api_key), None)
+            if entry is None:
+                return False
+            self._retire(entry)
+            self._stats["discarded"] += 1
+            return True
+
+
+def get_client_registry() -> ClientRegistry:
+    """
+    Get the process-wide Gemini client registry, creating it on first use
+
+    Settings (all optional):
+        GEMINI_CLIENT_MAX: Maximum number of API keys with a warm client
+        GEMINI_CLIENT_IDLE_SECONDS: Seconds an unused client, and with it
+            its API key, is kept in memory
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry(
+                max_clients=int(os.getenv("GEMINI_CLIENT_MAX") or 32),
+                idle_ttl=float(os.getenv("GEMINI_CLIENT_IDLE_SECONDS") or 600)
+            )
+            atexit.register(_registry.close)
+        return _registry
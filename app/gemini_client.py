@@ -4,26 +4,120 @@ Gemini Client Module - Handles interactions with Google Gemini AI
 import base64
 import os
 import json
-from typing import Optional, List, Dict, Any, Union
-from google import genai
+import re
+from typing import Optional, List, Dict, Any, Union, Tuple, Iterator
 from google.genai import types
 
-from app.lcsh_api import LCSHApi
+from app.authority.names import looks_like_personal_name
+from app.client_registry import get_client_registry
+from app.lcsh_service import get_validation_api, get_local_index
+from app.normalize import heading_key
+
+# A 6XX subject field tag and its indicators, up to the first subfield
+MARC_FIELD = re.compile(r"(?<![\w$‡|])(6\d\d)\b[^$‡|\n]{0,12}?(?=[$‡|][a-z0-9])")
+MARC_SUBFIELD = re.compile(r"[$‡|]([a-z0-9])\s*([^$‡|]*)")
+# Subfields of the heading itself (names, titles, dates) and of its subdivisions
+HEADING_CODES = set("abcdqtnp")
+SUBDIVISION_CODES = set("vxyz")
+LIST_NUMBER = re.compile(r"^\s*\d+[.)]\s+")
+# Dates of a personal name: "1892-1973", "1950-", "b. 1950", "active 12th century", "551-479 B.C."
+NAME_DATES = (r"(?:(?:b|d|fl|ca)\. ?|born |died |active |approximately )?-?\d{1,4}(?:\?|st|nd|rd|th)?"
+              r"(?: cent\.| century)?(?: B\.C\.)?(?:-(?:ca\. |approximately )?(?:\d{1,4}\??(?: B\.C\.)?)?)?")
+# An inverted personal name with forenames or initials, an optional fuller form and optional dates
+PERSONAL_NAME = re.compile(r"(?<![\w'-])([A-Z][^\W\d_]*(?:['-][A-Z][^\W\d_]+)*, [A-Z][^\W\d_]*\.?(?: ?[A-Z][^\W\d_]*\.?)*"
+                           r"(?: \([^)]+\))?(?:, " + NAME_DATES + r")?)")
+
+# What may follow a whole term on a line: a subdivision, a note, more words or the end
+TERM_END = r"(?=[*`.:,;]*(?:--| \(|\s|$))"
+# List numbers, bullets and emphasis in front of a recommended term
+LINE_PREFIX = re.compile(r"^[\s>#*-]*(?:\d+[.)]\s+)?[\s*`]*")
+
+def _read_marc_line(line: str) -> Optional[Tuple[str, str, Optional[Tuple[int, int]]]]:
+    """
+    Read a MARC subject line, e.g. "651 _0 $a Japan $x History."
+
+    Returns:
+        Tuple of (field tag, heading such as "Japan--History", span of the
+        ``$a`` value in the line), or None when the line codes no heading
+    """
+    match = MARC_FIELD.search(line)
+    if not match:
+        return None
+    heading, subdivisions = [], []
+    main_span = None
+    for subfield in MARC_SUBFIELD.finditer(line, match.end()):
+        code, value = subfield.group(1), subfield.group(2).strip(" *`")
+        if not value:
+            continue
+        if code in HEADING_CODES:
+            heading.append(value)
+            if code == "a" and main_span is None:
+                main_span = subfield.span(2)
+        elif code in SUBDIVISION_CODES:
+            subdivisions.append(value.rstrip(".,;: "))
+    if not heading:
+        return None
+    term = "--".join([" ".join(heading).rstrip(".,;: ")] + subdivisions)
+    return match.group(1), term.rstrip("."), main_span
+
+# An authorized personal name split into its $a, $q (fuller form) and $d (dates) parts
+NAME_SUBFIELDS = re.compile(r"^(.+?)(?: (\([^)]+\)))?(?:, (" + NAME_DATES + r"))?$")
+
+def _marc_value(tag: str, heading: str, delimiter: str) -> str:
+    """
+    Code a main heading as the value of an $a subfield, e.g.
+    "Tolkien, J. R. R. $q (John Ronald Reuel), $d 1892-1973" for a 600 field
+    """
+    match = NAME_SUBFIELDS.match(heading) if tag == "600" else None
+    if not match:
+        return heading
+    value, fuller, dates = match.groups()
+    if fuller:
+        value += f" {delimiter}q {fuller}"
+    if dates:
+        value += f", {delimiter}d {dates}"
+    return value
+
+def _subfield_value(line: str, span: Optional[Tuple[int, int]]) -> str:
+    """
+    Get a subfield value without its surrounding spaces, emphasis and punctuation
+    """
+    if span is None:
+        return ""
+    return line[span[0]:span[1]].strip(" *`").rstrip(".,;: ")
+
+def _rejected_key(error: Exception) -> bool:
+    """
+    Check whether the Gemini API refused a request because of its API key
+    """
+    code = getattr(error, "code", None)
+    return code in (401, 403) or (code == 400 and "api key" in str(error).lower())
 
 class GeminiClient:
     """
     Client for interacting with Google Gemini AI
     """
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, lcsh_api=None, variants=None, clients=None):
         """
         Initialize the Gemini client
         
         Args:
             api_key: Google Gemini API key
+            lcsh_api: LCSH API client to validate terms with. Defaults to the
+                process-wide client so its connection pool and term cache
+                are reused.
+            variants: Anything with a ``resolve(term)`` method, used to
+                rewrite suggested variant (see-from) terms to their authorized
+                form. Defaults to the local index, if one is configured.
+            clients: Registry to lease ``genai.Client`` instances from.
+                Defaults to the process-wide registry, so sessions with the
+                same key share one warm client.
         """
         self.api_key = api_key
         self.model_name = "gemini-2.0-flash"
-        self.lcsh_api = LCSHApi()
+        self.lcsh_api = lcsh_api or get_validation_api()
+        self.variants = variants if variants is not None else get_local_index()
+        self.clients = clients or get_client_registry()
         
     def get_system_prompt(self) -> str:
         """
@@ -98,14 +192,19 @@ Provide a detailed subject analysis and recommend 3-5 LCSH terms with proper MAR
                 
                 # Pattern 3: Look for terms that might be personal names (no -- but in 600 field)
                 if i < len(lines) - 1 and '600 ' in lines[i+1]:
-                    if '(' in line:
+                    # A parenthesized fuller form is part of the name, not an explanation
+                    name = PERSONAL_NAME.match(LIST_NUMBER.sub('', line))
+                    if name:
+                        term = name.group(1)
+                    elif '(' in line:
                         term = line.split('(')[0].strip()
                     else:
                         term = line.strip()
                     
                     term = term.rstrip('.:,')
                     
-                    if term and ',' in term:  # Personal names often contain commas
+                    # Names without a forename ("Murasaki Shikibu") have no comma
+                    if term:
                         terms.append(term)
                         continue
                 
@@ -167,9 +266,8 @@ Provide a detailed subject analysis and recommend 3-5 LCSH terms with proper MAR
             subdivision_terms = re.findall(subdivision_pattern, text)
             terms.extend(subdivision_terms)
             
-            # Pattern for personal names
-            name_pattern = r'([A-Z][a-z]+,\s+[A-Z][a-z]+(?:,\s+\d{4}-\d{4})?)'
-            name_terms = re.findall(name_pattern, text)
+            # Pattern for personal names, with initials, fuller forms and any form of dates
+            name_terms = [name.rstrip(',') for name in PERSONAL_NAME.findall(text)]
             terms.extend(name_terms)
             
             # Pattern for simple terms that might be LCSH
@@ -199,12 +297,146 @@ Provide a detailed subject analysis and recommend 3-5 LCSH terms with proper MAR
         
         return terms
     
-    def validate_terms(self, terms: List[str]) -> Dict[str, Any]:
+    def extract_candidate_fields(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Extract candidate terms along with the MARC field each was coded in
+        
+        MARC lines in the response, such as "651 _0 $a Japan $x History.",
+        are read subfield by subfield into headings ("Japan--History") and
+        come first. Terms found by ``extract_candidate_terms`` that no MARC
+        line covers follow without a tag, except those that read as
+        personal names ("Tolkien, J. R. R., 1892-1973"), which get 600.
+        
+        Args:
+            text: The model's response text
+            
+        Returns:
+            List of (term, tag) pairs; the tag is "" when the term has no
+            MARC line and does not read as a personal name
+        """
+        coded: List[Tuple[str, str]] = []
+        for line in text.split('\n'):
+            marc = _read_marc_line(line)
+            if marc:
+                coded.append((marc[1], marc[0]))
+        
+        fields = []
+        seen = set()
+        for term, tag in coded:
+            if heading_key(term) not in seen:
+                seen.add(heading_key(term))
+                fields.append((term, tag))
+        for term in self.extract_candidate_terms(text):
+            # The line scan also picks up list numbers and the MARC lines themselves
+            term = LIST_NUMBER.sub("", term)
+            if coded and MARC_FIELD.search(term):
+                continue
+            if heading_key(term) not in seen:
+                seen.add(heading_key(term))
+                fields.append((term, "600" if looks_like_personal_name(term) else ""))
+        return fields
+    
+    def resolve_variants(self, terms: List[str]) -> Tuple[List[str], List[Dict[str, str]]]:
+        """
+        Rewrite variant (see-from) labels to their authorized headings
+        
+        Args:
+            terms: Candidate terms extracted from the model's response
+            
+        Returns:
+            Tuple of (terms with variants replaced, list of the replacements
+            made as dictionaries with ``term`` and ``authorized``)
+        """
+        if self.variants is None:
+            return terms, []
+        
+        resolved_terms = []
+        resolved = []
+        for term in terms:
+            authorized = self.variants.resolve(term)
+            if authorized and authorized != term:
+                resolved.append({"term": term, "authorized": authorized})
+                term = authorized
+            if term not in resolved_terms:
+                resolved_terms.append(term)
+        return resolved_terms, resolved
+    
+    def apply_resolved_variants(self, text: str, resolved: List[Dict[str, str]],
+                                candidates: Optional[List[str]] = None) -> str:
+        """
+        Show the authorized forms in the model's response
+        
+        Only recommendation lines are rewritten: lines that consist of a
+        candidate term, apart from list markers, emphasis and a trailing
+        note in parentheses, and MARC lines. A replaced term must match
+        whole, followed by a subdivision, a space or the end of the line,
+        so "Films" never touches "Filmstrips" and the subject analysis
+        prose is left as the model wrote it. In MARC lines the ``$a``
+        subfield is rewritten, with the fuller form and dates of a personal
+        name moved to ``$q`` and ``$d``. A replacement that cannot be expressed in
+        the ``$a`` subfield of a MARC line coding the term is not applied
+        anywhere, so the list and the MARC coding stay consistent.
+        
+        Args:
+            text: The model's response text
+            resolved: Replacements returned by ``resolve_variants``
+            candidates: Candidate terms extracted from the text, by default
+                those of ``extract_candidate_fields``
+            
+        Returns:
+            The response text with the replaced terms rewritten
+        """
+        if not resolved:
+            return text
+        if candidates is None:
+            candidates = [term for term, _ in self.extract_candidate_fields(text)]
+        
+        # A line is a recommendation when a candidate term makes up all of it
+        listed = [re.compile(re.escape(LIST_NUMBER.sub("", term)) + r"[*`.:,;]*(?:\s*\(.*)?$")
+                  for term in candidates if term]
+        
+        lines = text.split('\n')
+        marc_lines = {i: _read_marc_line(line) for i, line in enumerate(lines)}
+        for item in resolved:
+            term, authorized = item["term"], item["authorized"]
+            main, _, subdivisions = term.partition("--")
+            new_main, _, new_subdivisions = authorized.partition("--")
+            
+            # MARC lines coding the term; only their $a subfield can follow the rewrite
+            coding = [i for i, marc in marc_lines.items()
+                      if marc and (heading_key(marc[1]) == heading_key(term)
+                                   or heading_key(marc[1]).startswith(heading_key(term) + "--"))]
+            if coding and (heading_key(subdivisions) != heading_key(new_subdivisions) or any(
+                    heading_key(_subfield_value(lines[i], marc_lines[i][2])) != heading_key(main) for i in coding)):
+                continue
+            for i in coding:
+                line = lines[i]
+                begin, stop = marc_lines[i][2]
+                value = _subfield_value(line, (begin, stop))
+                delimiter = line[max(line.rfind(mark, 0, begin) for mark in "$‡|")]
+                begin += line[begin:stop].index(value)
+                lines[i] = line[:begin] + _marc_value(marc_lines[i][0], new_main, delimiter) + line[begin + len(value):]
+                marc_lines[i] = _read_marc_line(lines[i])
+            
+            pattern = re.compile(re.escape(term) + TERM_END)
+            for i, line in enumerate(lines):
+                if marc_lines[i]:
+                    continue
+                prefix = LINE_PREFIX.match(line).end()
+                rest = line[prefix:]
+                if pattern.match(rest) and any(regex.match(rest) for regex in listed):
+                    lines[i] = line[:prefix] + authorized + rest[len(term):]
+        return '\n'.join(lines)
+    
+    def validate_terms(self, terms: List[str], tags: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Validate LCSH terms using the API
         
         Args:
             terms: List of terms to validate
+            tags: MARC field of each term, e.g. "600" for a personal name. A
+                local index matches each term only against headings of its
+                field; other clients ignore the tags.
             
         Returns:
             Dictionary containing validation results
@@ -212,6 +444,8 @@ Provide a detailed subject analysis and recommend 3-5 LCSH terms with proper MAR
         if not terms:
             return {"error": "No terms to validate", "recommendations": []}
         
+        if tags and any(tags) and getattr(self.lcsh_api, "routes_tags", False):
+            return self.lcsh_api.get_recommendations(terms, tags=tags)
         return self.lcsh_api.get_recommendations(terms)
     
     def format_validation_results(self, validation_results: Dict[str, Any]) -> str:
@@ -242,35 +476,49 @@ Provide a detailed subject analysis and recommend 3-5 LCSH terms with proper MAR
             
             formatted_results += f"### {term} ({status})\n"
             formatted_results += f"- **ID**: {term_id}\n"
+            if rec.get("scheme"):
+                tag = f" ({rec['tag']})" if rec.get("tag") else ""
+                formatted_results += f"- **Vocabulary**: {rec['scheme'].upper()}{tag}\n"
             formatted_results += f"- **URL**: {url}\n"
             formatted_results += f"- **Similarity Score**: {similarity}\n\n"
         
+        # Variant labels rewritten before lookup
+        resolved = validation_results.get("resolved", [])
+        if resolved:
+            formatted_results += "### Variants replaced with authorized headings\n"
+            for item in resolved:
+                formatted_results += f"- **{item['term']}** → {item['authorized']}\n"
+            formatted_results += "\n"
+        
+        # Terms fixed or rejected by the local subdivision check
+        repaired = validation_results.get("repaired", [])
+        if repaired:
+            formatted_results += "### Repaired before lookup\n"
+            for item in repaired:
+                formatted_results += f"- **{item['term']}** → {item['repaired']} ({'; '.join(item['repairs'])})\n"
+        rejected = validation_results.get("rejected", [])
+        if rejected:
+            formatted_results += "\n### Rejected before lookup\n"
+            for item in rejected:
+                formatted_results += f"- **{item['term']}**: {item['reason']}\n"
+        
         return formatted_results
     
-    def generate_lcsh_recommendations(self, 
-                                     text_input: Optional[str] = None, 
-                                     image_input: Optional[str] = None) -> str:
+    def _build_request(self, text_input: Optional[str], image_input: Optional[str]) -> Tuple[Any, Any]:
         """
-        Generate LCSH recommendations using Gemini
+        Build the prompt contents and generation config for a request
         
         Args:
             text_input: Text input for analysis
             image_input: Base64-encoded image for analysis
             
         Returns:
-            Generated recommendations as text
+            Tuple of (contents, config) for the Gemini API
         """
-        if not text_input and not image_input:
-            return "Error: No input provided. Please provide text or an image."
-        
-        try:
-            # Create a client
-            client = genai.Client(api_key=self.api_key)
-            
-            # Create a prompt that asks for LCSH recommendations
-            prompt = ""
-            if text_input:
-                prompt = f"""Please analyze the following bibliographic information and suggest appropriate Library of Congress Subject Headings (LCSH):
+        # Create a prompt that asks for LCSH recommendations
+        prompt = ""
+        if text_input:
+            prompt = f"""Please analyze the following bibliographic information and suggest appropriate Library of Congress Subject Headings (LCSH):
 
 {text_input}
 
@@ -280,8 +528,8 @@ Please provide:
 3. MARC coding for each recommendation
 
 DO NOT include any API validation information in your response as I will handle that separately."""
-            elif image_input:
-                prompt = """Please analyze this image and suggest appropriate Library of Congress Subject Headings (LCSH).
+        elif image_input:
+            prompt = """Please analyze this image and suggest appropriate Library of Congress Subject Headings (LCSH).
 
 Please provide:
 1. A detailed subject analysis
@@ -289,75 +537,162 @@ Please provide:
 3. MARC coding for each recommendation
 
 DO NOT include any API validation information in your response as I will handle that separately."""
+        
+        # Create config
+        config = types.GenerateContentConfig(
+            system_instruction=self.get_system_prompt(),
+            temperature=0.2,
+            top_p=0.8,
+            top_k=40,
+            max_output_tokens=4096
+        )
+        
+        # Prepare content based on input type
+        if image_input and text_input:
+            # Both text and image
+            contents = [
+                {"text": prompt},
+                {"inline_data": {"mime_type": "image/jpeg", "data": image_input}}
+            ]
+        elif image_input:
+            # Just image
+            contents = [
+                {"text": prompt},
+                {"inline_data": {"mime_type": "image/jpeg", "data": image_input}}
+            ]
+        else:
+            # Just text
+            contents = prompt
+        
+        return contents, config
+    
+    @staticmethod
+    def _response_text(response) -> str:
+        """
+        Get the text of a response or of one streamed chunk of it
+        """
+        text = getattr(response, 'text', None)
+        if text:
+            return text
+        
+        # Try to extract from candidates
+        text = ""
+        for candidate in getattr(response, 'candidates', None) or []:
+            content = getattr(candidate, 'content', None)
+            for part in getattr(content, 'parts', None) or []:
+                if getattr(part, 'text', None):
+                    text += part.text
+        return text
+    
+    def stream_model_response(self, 
+                              text_input: Optional[str] = None, 
+                              image_input: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream the model's subject analysis and recommendations as they are generated
+        
+        The client lease is held until the stream is read to the end or
+        closed, so a stream abandoned halfway (e.g. by a Streamlit rerun)
+        releases its client when the generator is closed.
+        
+        Args:
+            text_input: Text input for analysis
+            image_input: Base64-encoded image for analysis
             
-            # Create config
-            config = types.GenerateContentConfig(
-                system_instruction=self.get_system_prompt(),
-                temperature=0.2,
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=4096
-            )
-            
-            # Prepare content based on input type
-            if image_input and text_input:
-                # Both text and image
-                contents = [
-                    {"text": prompt},
-                    {"inline_data": {"mime_type": "image/jpeg", "data": image_input}}
-                ]
-            elif image_input:
-                # Just image
-                contents = [
-                    {"text": prompt},
-                    {"inline_data": {"mime_type": "image/jpeg", "data": image_input}}
-                ]
-            else:
-                # Just text
-                contents = prompt
-            
-            # Generate content
-            response = client.models.generate_content(
-                model=self.model_name,
-                contents=contents,
-                config=config
-            )
+        Yields:
+            Chunks of the model's response text
+        
+        Raises:
+            ValueError: If neither text nor an image is given
+        """
+        if not text_input and not image_input:
+            raise ValueError("No input provided. Please provide text or an image.")
+        
+        contents, config = self._build_request(text_input, image_input)
+        try:
+            # Generate content on the warm client for this key
+            with self.clients.lease(self.api_key) as client:
+                for chunk in client.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=contents,
+                    config=config
+                ):
+                    text = self._response_text(chunk)
+                    if text:
+                        yield text
+        except Exception as e:
+            # A rejected key must not keep its client in the registry
+            if _rejected_key(e):
+                self.clients.discard(self.api_key)
+            raise
+    
+    def complete_recommendations(self, model_response: str) -> Tuple[str, str]:
+        """
+        Resolve and validate the terms of a finished model response
+        
+        Args:
+            model_response: The model's full response text
             
-            # Extract the response text
-            model_response = ""
-            if hasattr(response, 'text'):
-                model_response = response.text
-            else:
-                # Try to extract from candidates
-                if hasattr(response, 'candidates') and response.candidates:
-                    for candidate in response.candidates:
-                        if hasattr(candidate, 'content') and candidate.content:
-                            if hasattr(candidate.content, 'parts') and candidate.content.parts:
-                                for part in candidate.content.parts:
-                                    if hasattr(part, 'text') and part.text:
-                                        model_response += part.text
+        Returns:
+            Tuple of (the response with variant labels rewritten to their
+            authorized headings, the formatted validation results)
+        """
+        # Extract candidate terms, with the MARC field each was coded in, from the model's response
+        candidate_fields = self.extract_candidate_fields(model_response)
+        candidate_terms = [term for term, _ in candidate_fields]
+        
+        # Rewrite variant labels to their authorized headings before display and validation
+        candidate_terms, resolved = self.resolve_variants(candidate_terms)
+        model_response = self.apply_resolved_variants(model_response, resolved,
+                                                      [term for term, _ in candidate_fields])
+        
+        # A rewritten term keeps the field of the term it replaced
+        field_tags = {heading_key(term): tag for term, tag in candidate_fields if tag}
+        for item in resolved:
+            if heading_key(item["term"]) in field_tags:
+                field_tags.setdefault(heading_key(item["authorized"]), field_tags[heading_key(item["term"])])
+        candidate_tags = [field_tags.get(heading_key(term), "") for term in candidate_terms]
+        
+        # Validate the terms using the LCSH API, each against the headings of its MARC field
+        validation_results = self.validate_terms(candidate_terms, candidate_tags)
+        if resolved:
+            validation_results["resolved"] = resolved
+        
+        # Format the validation results
+        formatted_validation = f"""{self.format_validation_results(validation_results)}
+
+Note: All suggested LCSH terms have been validated using the LCSH API. Terms with a similarity score of 0.85 or higher are considered valid.
+"""
+        return model_response, formatted_validation
+    
+    def generate_lcsh_recommendations(self, 
+                                     text_input: Optional[str] = None, 
+                                     image_input: Optional[str] = None) -> str:
+        """
+        Generate LCSH recommendations using Gemini
+        
+        Args:
+            text_input: Text input for analysis
+            image_input: Base64-encoded image for analysis
             
+        Returns:
+            Generated recommendations as text
+        """
+        if not text_input and not image_input:
+            return "Error: No input provided. Please provide text or an image."
+        
+        try:
+            model_response = "".join(self.stream_model_response(text_input, image_input))
             if not model_response:
                 return "Unable to generate recommendations. Please try again with different input."
             
-            # Extract candidate terms from the model's response
-            candidate_terms = self.extract_candidate_terms(model_response)
-            
-            # Validate the terms using the LCSH API
-            validation_results = self.validate_terms(candidate_terms)
-            
-            # Format the validation results
-            formatted_validation = self.format_validation_results(validation_results)
+            model_response, formatted_validation = self.complete_recommendations(model_response)
             
             # Combine the model's response with the validation results
             final_response = f"""# LCSH Recommendations
 
 {model_response}
 
-{formatted_validation}
-
-Note: All suggested LCSH terms have been validated using the LCSH API. Terms with a similarity score of 0.85 or higher are considered valid.
-"""
+{formatted_validation}"""
             
             # Print the final response for debugging
             print(f"Final response: {final_response[:500]}...")
@@ -1,36 +1,474 @@
 """
 LCSH API Module - Handles interactions with the LCSH API
 """
+import atexit
+import os
+import threading
+import time
 import requests
-import json
-from typing import List, Dict, Any, Union
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from typing import List, Dict, Any, Union, Optional
+
+from app.normalize import normalize_term
+from app.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker
+
+# Keys the API may use to echo back which input term a recommendation answers
+QUERY_KEYS = ("query", "input", "input_term", "original_term")
+
+# Status codes worth retrying: rate limiting and gateway/server hiccups
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Check whether a request error is likely to go away on retry
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return False
 
 class LCSHApi:
     """
     Client for interacting with the LCSH API
+
+    Requests go through a pooled, keep-alive ``requests.Session`` owned by the
+    client, so repeated validations reuse open connections instead of paying
+    for a new TCP+TLS handshake each time. The session is safe to share
+    between Streamlit sessions; use ``get_shared_api()`` for the process-wide
+    instance.
+
+    Transient failures are retried with jittered exponential backoff, and a
+    circuit breaker fails fast while the upstream is unhealthy. With hedging
+    enabled, a second identical request goes out once the first has taken
+    longer than the recent p95 latency, and the first reply wins.
     """
-    def __init__(self, base_url: str = "https://lcsh.098484.xyz"):
+    def __init__(self,
+                 base_url: str = "https://lcsh.098484.xyz",
+                 pool_connections: int = 4,
+                 pool_maxsize: int = 32,
+                 pool_block: bool = False,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 15.0,
+                 max_retries: int = 2,
+                 backoff_base: float = 0.2,
+                 backoff_max: float = 2.0,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedge: bool = False,
+                 hedge_percentile: float = 0.95):
+        """
+        Initialize the LCSH API client
+
+        Args:
+            base_url: Base URL of the LCSH API
+            pool_connections: Number of per-host connection pools to keep
+            pool_maxsize: Maximum number of connections kept per host
+            pool_block: Block when all connections to a host are busy instead
+                of opening a throwaway connection beyond ``pool_maxsize``
+            connect_timeout: Seconds to wait for a connection to be established
+            read_timeout: Seconds to wait for the server to send a response
+            max_retries: Retries after a transient failure (connection error,
+                timeout, 429 or 5xx); 0 disables retrying
+            backoff_base: Seconds of the first backoff, doubled on every retry
+            backoff_max: Upper bound on a single backoff
+            circuit_breaker: Breaker guarding the upstream; a default one
+                opening after 5 consecutive failures is used when omitted
+            hedge: Send a hedged second request for slow calls
+            hedge_percentile: Latency percentile after which to hedge
+        """
         self.base_url = base_url
         self.recommend_endpoint = f"{self.base_url}/recommend"
-    
+        self.timeout = (connect_timeout, read_timeout)
+
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.latency = LatencyTracker()
+        # Hedged calls run both attempts on worker threads
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=pool_maxsize,
+            thread_name_prefix="lcsh-hedge"
+        ) if hedge else None
+
+        # Usage counters, guarded by a lock since the client is shared
+        self._lock = threading.Lock()
+        self._closed = False
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._attempts = 0
+        self._retries = 0
+        self._short_circuited = 0
+        self._hedges_sent = 0
+        self._hedges_won = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close all pooled connections. The client cannot be used afterwards.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        self._session.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool usage counters
+
+        Returns:
+            Dictionary with request counters and per-host pool usage
+        """
+        with self._lock:
+            stats = {
+                "requests": self._requests,
+                "errors": self._errors,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "attempts": self._attempts,
+                "retries": self._retries,
+                "short_circuited": self._short_circuited,
+                "hedges_sent": self._hedges_sent,
+                "hedges_won": self._hedges_won,
+                "closed": self._closed,
+            }
+        stats["circuit_breaker"] = self.circuit_breaker.stats()
+        stats["latency_p95"] = self.latency.percentile(0.95)
+
+        # urllib3 keeps one connection pool per host; report how many
+        # connections each has opened and how many sit idle for reuse
+        connections_opened = 0
+        connections_idle = 0
+        hosts = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            # The pool queue is pre-filled with None placeholders
+            queue = list(pool.pool.queue) if pool.pool is not None else []
+            idle = sum(1 for conn in queue if conn is not None)
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": idle,
+            }
+            connections_opened += pool.num_connections
+            connections_idle += idle
+
+        stats["connections_opened"] = connections_opened
+        stats["connections_idle"] = connections_idle
+        stats["hosts"] = hosts
+        return stats
+
     def get_recommendations(self, terms: Union[List[str], str]) -> Dict[str, Any]:
         """
         Get LCSH recommendations for the given terms
-        
+
         Args:
             terms: A single term or list of terms to get recommendations for
-            
+
         Returns:
             Dictionary containing the recommendations
         """
+        if self._closed:
+            return {
+                "error": "LCSH API client is closed",
+                "recommendations": []
+            }
+
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
         try:
             payload = {"terms": terms}
-            response = requests.post(self.recommend_endpoint, json=payload)
-            response.raise_for_status()
-            return response.json()
+            retrying = Retrying(
+                retry=retry_if_exception(is_transient_error),
+                stop=stop_after_attempt(self.max_retries + 1),
+                wait=wait_random_exponential(multiplier=self.backoff_base, max=self.backoff_max),
+                before_sleep=self._count_retry,
+                reraise=True
+            )
+            return retrying(self._post_hedged, payload)
+        except CircuitOpenError:
+            with self._lock:
+                self._errors += 1
+                self._short_circuited += 1
+            return {
+                "error": "LCSH API is temporarily unavailable (circuit open)",
+                "recommendations": []
+            }
         except requests.exceptions.RequestException as e:
+            with self._lock:
+                self._errors += 1
             # Handle API errors gracefully
             return {
                 "error": str(e),
                 "recommendations": []
-            } 
\ No newline at end of file
+            }
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _count_retry(self, retry_state) -> None:
+        with self._lock:
+            self._retries += 1
+
+    def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a single request attempt through the circuit breaker
+        """
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError()
+        with self._lock:
+            self._attempts += 1
+
+        started = time.monotonic()
+        try:
+            response = self._session.post(self.recommend_endpoint, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+        except requests.exceptions.RequestException as e:
+            # Client errors mean the upstream is up, so only transient ones count against it
+            if is_transient_error(e):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            raise
+        self.circuit_breaker.record_success()
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    def _post_hedged(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a request, hedging with a second one if the first is slow
+        """
+        delay = self.latency.percentile(self.hedge_percentile) if self.hedge else None
+        if delay is None:
+            return self._post(payload)
+
+        primary = self._hedge_executor.submit(self._post, payload)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self._hedges_sent += 1
+        hedged = self._hedge_executor.submit(self._post, payload)
+        pending = {primary, hedged}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        with self._lock:
+                            self._hedges_won += 1
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+_shared_api: Optional[LCSHApi] = None
+_shared_api_lock = threading.Lock()
+
+def get_shared_api() -> LCSHApi:
+    """
+    Get the process-wide LCSH API client
+
+    All Streamlit sessions in a process share this client and therefore its
+    connection pool. It is closed automatically when the interpreter exits.
+
+    Settings (all optional):
+        LCSH_MAX_RETRIES: Retries after a transient upstream failure
+        LCSH_HEDGE: Set to 1 to hedge requests slower than the recent p95
+    """
+    global _shared_api
+    with _shared_api_lock:
+        if _shared_api is None or _shared_api.closed:
+            _shared_api = LCSHApi(
+                max_retries=int(os.getenv("LCSH_MAX_RETRIES") or 2),
+                hedge=os.getenv("LCSH_HEDGE", "0") == "1"
+            )
+            atexit.register(_shared_api.close)
+        return _shared_api
+
+
+def split_recommendations(terms: List[str],
+                          recommendations: List[Dict[str, Any]]) -> Optional[List[List[Dict[str, Any]]]]:
+    """
+    Attribute the recommendations of a batched request to its input terms
+
+    Used by the layers that combine several terms into one request and need
+    to hand each term its own share of the response. A recommendation is
+    attributed only by the query key the API echoes back; the split is
+    never guessed, since a wrong one would be cached and could hand one
+    session's results to another.
+
+    Args:
+        terms: Terms sent in the request, in order
+        recommendations: Recommendations returned by the API
+
+    Returns:
+        One list of recommendations per input term, or None when some
+        recommendation of a multi-term request does not echo one of its terms
+    """
+    groups = [[] for _ in terms]
+    if not terms:
+        return groups
+    if len(terms) == 1:
+        groups[0].extend(recommendations)
+        return groups
+
+    positions = {}
+    for i, term in enumerate(terms):
+        positions.setdefault(normalize_term(term), i)
+
+    for rec in recommendations:
+        query = next((rec[key] for key in QUERY_KEYS if isinstance(rec.get(key), str)), None)
+        if query is None or normalize_term(query) not in positions:
+            return None
+        groups[positions[normalize_term(query)]].append(rec)
+    return groups
+
+def split_term_entries(terms: List[str], result: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Turn the response for a batch of terms into one entry per term
+
+    Returns:
+        One ``{"recommendations": [...]}`` or ``{"error": "..."}`` entry per
+        term, or None when the response cannot be split exactly
+    """
+    if "error" in result:
+        return [{"error": result["error"]} for _ in terms]
+    groups = split_recommendations(terms, result.get("recommendations", []))
+    if groups is None:
+        return None
+    return [{"recommendations": group} for group in groups]
+
+class TermFetcher:
+    """
+    Looks terms up through a client and hands back one entry per term
+
+    Terms go out in one request while the upstream echoes which term each
+    recommendation answers. The first multi-term response that does not is
+    answered again one request per term, and from then on terms skip the
+    batch, whose answer would only be thrown away, and go out one request
+    each, concurrently, through the client's connection pool.
+    """
+    def __init__(self, api, max_workers: int = 16):
+        """
+        Initialize the fetcher
+
+        Args:
+            api: Client with the ``LCSHApi.get_recommendations`` contract
+            max_workers: Number of single-term requests sent at once
+        """
+        self.api = api
+        self._demultiplexes = True
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lcsh-term-fetch")
+
+    @property
+    def demultiplexes(self) -> bool:
+        """
+        Whether multi-term responses of the client can be split by term
+        """
+        return self._demultiplexes
+
+    def fetch(self, terms: List[str]) -> List[Dict[str, Any]]:
+        """
+        Look up terms and return one entry per term
+
+        Args:
+            terms: Terms to look up
+
+        Returns:
+            One ``{"recommendations": [...]}`` or ``{"error": "..."}`` entry per term
+        """
+        if len(terms) > 1 and self._demultiplexes:
+            entries = split_term_entries(terms, self.api.get_recommendations(terms))
+            if entries is not None:
+                return entries
+            self._demultiplexes = False
+        return self.fetch_each(terms)
+
+    def fetch_each(self, terms: List[str]) -> List[Dict[str, Any]]:
+        """
+        Look up every term in a request of its own, concurrently
+
+        Args:
+            terms: Terms to look up
+
+        Returns:
+            One ``{"recommendations": [...]}`` or ``{"error": "..."}`` entry per term
+        """
+        if len(terms) <= 1:
+            return [self._fetch_one(term) for term in terms]
+        return list(self._executor.map(self._fetch_one, terms))
+
+    def _fetch_one(self, term: str) -> Dict[str, Any]:
+        return split_term_entries([term], self.api.get_recommendations([term]))[0]
+
+def merge_term_results(entries: List[Dict[str, Any]], terms: List[str]) -> Dict[str, Any]:
+    """
+    Merge per-term results back into a single API-shaped response
+
+    Args:
+        entries: One result per term, each either ``{"recommendations": [...]}``
+            or ``{"error": "..."}``
+        terms: The terms the entries belong to, in the caller's order
+
+    Returns:
+        Dictionary containing the recommendations in term order, each
+        carrying the ``query`` it answers so that a layer above can split
+        the response again. When every term failed it carries the first
+        error, like a failed request would; partial failures are listed
+        under ``errors`` by term.
+    """
+    recommendations = []
+    errors = {}
+    for term, entry in zip(terms, entries):
+        if "error" in entry:
+            errors[term] = entry["error"]
+        else:
+            recommendations.extend(rec if any(key in rec for key in QUERY_KEYS) else {**rec, "query": term}
+                                   for rec in entry.get("recommendations", []))
+
+    if errors and len(errors) == len(terms):
+        return {
+            "error": next(iter(errors.values())),
+            "recommendations": []
+        }
+
+    merged = {"recommendations": recommendations}
+    if errors:
+        merged["errors"] = errors
+    return merged
@@ -0,0 +1,123 @@
+"""
+LCSH Service Module - Assembles the process-wide LCSH validation client
+"""
+import os
+import threading
+from typing import Optional
+
+from app.lcsh_api import get_shared_api
+from app.local_lcsh_api import SegmentedLCSHApi, LocalFirstLCSHApi
+from app.micro_batcher import MicroBatchingLCSHApi
+from app.single_flight import CoalescingLCSHApi
+from app.subdivisions import PreValidatingLCSHApi, SubdivisionAutomaton
+from app.term_cache import TermCache, CachedLCSHApi
+
+_validation_api = None
+_validation_api_lock = threading.Lock()
+_local_index = None
+_local_index_lock = threading.Lock()
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+def build_validation_api(cache_path: Optional[str] = None):
+    """
+    Build the LCSH validation client stack from environment settings
+
+    Settings (all optional):
+        LCSH_INDEX_PATH: Local authority index directory built with
+            ``python -m app.authority build``; when set, terms are validated
+            offline against it instead of the remote API. Its variant table
+            also rewrites see-from labels in the model's suggestions to their
+            authorized form, see ``get_local_index``
+        LCSH_INDEX_RELOAD_SECONDS: Seconds between checks for change files
+            applied to LCSH_INDEX_PATH with ``python -m app.authority update``
+        LCSH_LOCAL_FIRST: Set to 1 to keep using the remote API and answer
+            only exact authorized headings from LCSH_INDEX_PATH
+        LCSH_CACHE_SIZE: Maximum number of terms cached in memory
+        LCSH_CACHE_TTL: Seconds a validated term stays cached
+        LCSH_CACHE_NEGATIVE_TTL: Seconds a failed lookup stays cached
+        LCSH_CACHE_PATH: SQLite file shared by all worker processes
+        LCSH_BATCH_WAIT_MS: Milliseconds to hold a cross-session batch
+            open; 0, the default, sends each session's terms on their own
+        LCSH_BATCH_SIZE: Number of distinct terms that flushes a batch early
+        LCSH_MAX_RETRIES, LCSH_HEDGE: Settings of the shared remote client,
+            see ``get_shared_api``
+        LCSH_PREVALIDATE: Set to 0 to send compound headings upstream
+            without checking their subdivisions first
+        LCSH_SUBDIVISIONS_PATH: Free-floating subdivision lists file, by
+            default the bundled app/data/free_floating_subdivisions.tsv
+
+    Args:
+        cache_path: Overrides LCSH_CACHE_PATH
+
+    Returns:
+        Client with the ``LCSHApi.get_recommendations`` contract
+    """
+    index_path = os.getenv("LCSH_INDEX_PATH")
+    local_first = os.getenv("LCSH_LOCAL_FIRST", "0") == "1"
+    if index_path and not local_first:
+        return _pre_validated(get_local_index())
+
+    cache = TermCache(
+        max_entries=int(_env_float("LCSH_CACHE_SIZE", 4096)),
+        ttl=_env_float("LCSH_CACHE_TTL", 7 * 24 * 3600),
+        negative_ttl=_env_float("LCSH_CACHE_NEGATIVE_TTL", 30.0),
+        db_path=cache_path or os.getenv("LCSH_CACHE_PATH") or None
+    )
+    # The remote client, and its connection pool, is the process-wide one
+    api = get_shared_api()
+    batch_wait_ms = _env_float("LCSH_BATCH_WAIT_MS", 0.0)
+    if batch_wait_ms > 0:
+        api = MicroBatchingLCSHApi(
+            api,
+            max_wait=batch_wait_ms / 1000,
+            max_batch_size=int(_env_float("LCSH_BATCH_SIZE", 64))
+        )
+    # Cache misses from concurrent sessions share one request per term
+    api = CachedLCSHApi(CoalescingLCSHApi(api), cache)
+    if index_path:
+        api = LocalFirstLCSHApi(api, get_local_index())
+    return _pre_validated(api)
+
+def _pre_validated(api):
+    """
+    Put the subdivision automaton in front of a client unless disabled
+    """
+    if os.getenv("LCSH_PREVALIDATE", "1") == "0":
+        return api
+    automaton = SubdivisionAutomaton.from_path(os.getenv("LCSH_SUBDIVISIONS_PATH") or None)
+    return PreValidatingLCSHApi(api, automaton)
+
+def get_validation_api():
+    """
+    Get the process-wide LCSH validation client, building it on first use
+    """
+    global _validation_api
+    with _validation_api_lock:
+        if _validation_api is None:
+            _validation_api = build_validation_api()
+        return _validation_api
+
+def get_local_index() -> Optional[SegmentedLCSHApi]:
+    """
+    Get the process-wide client of the local index, opening it on first use
+
+    It serves both validation and the rewriting of variant (see-from)
+    labels, and picks up change files applied to the index while the
+    process runs.
+
+    Returns:
+        The client of the index at LCSH_INDEX_PATH, or None when no local
+        index is configured
+    """
+    global _local_index
+    index_path = os.getenv("LCSH_INDEX_PATH")
+    if not index_path:
+        return None
+    with _local_index_lock:
+        if _local_index is None:
+            _local_index = SegmentedLCSHApi(index_path,
+                                            reload_interval=_env_float("LCSH_INDEX_RELOAD_SECONDS", 30.0))
+        return _local_index
@@ -0,0 +1,775 @@
+"""
+Local LCSH API Module - Validates terms against a local authority index
+"""
+import os
+import threading
+import time
+from typing import List, Dict, Any, Union, Tuple, Optional, FrozenSet, Callable
+
+import numpy as np
+
+from app.authority.compound import CompoundIndex, SEPARATOR
+from app.authority.graph import RelationGraph, NARROWER
+from app.authority.heading_table import HeadingTable
+from app.authority.membership import HeadingMembership
+from app.authority.names import NameIndex, PERSONAL_NAME_TAG, looks_like_personal_name
+from app.authority.records import subject_tag
+from app.authority.romanization import RomanizationTable
+from app.authority.scorer import SimilarityScorer
+from app.authority.semantic import SemanticIndex
+from app.authority.trigram import TrigramIndex
+from app.authority.updates import MANIFEST, read_manifest, read_tombstones
+from app.authority.variants import VariantTable
+from app.lcsh_api import TermFetcher, merge_term_results
+
+# Score given to a term that exactly matches a variant (see-from) label
+VARIANT_MATCH_SCORE = 0.9
+# Score given to a term that matches a heading or variant only once romanizations are folded;
+# below the 0.85 at which validation counts a heading as verified, since the folds are loose
+ROMANIZATION_MATCH_SCORE = 0.8
+# Score given to a compound heading built from an authorized heading and valid subdivisions
+COMPOUND_MATCH_SCORE = 0.95
+# Fuzzy matches scoring below this are also looked up in the semantic index
+SEMANTIC_FALLBACK_BELOW = 0.85
+
+def _check_tags(terms: List[str], tags: Optional[List]) -> None:
+    """
+    Make sure a batch of terms has one MARC field tag per term, if any
+
+    Raises:
+        ValueError: If ``tags`` is given but does not match ``terms`` in length
+    """
+    if tags and len(tags) != len(terms):
+        raise ValueError(f"Got {len(tags)} tags for {len(terms)} terms; pass one tag per term, "
+                         f"empty for terms of any field")
+
+class LocalLCSHApi:
+    """
+    Offline drop-in for ``LCSHApi`` backed by a local authority index
+
+    ``get_recommendations`` returns the same dictionary shape as the remote
+    API, so ``GeminiClient.format_validation_results`` works unchanged, but
+    no network round-trip is involved. Each recommendation also echoes the
+    input term under ``query``.
+
+    Terms without an exact match are scored in one batch: the trigram index
+    shortlists candidate labels per term, and the similarity scorer rates
+    every term against the union of the shortlists in a single matrix
+    operation. Compound headings that are not established as a whole are
+    first checked segment by segment against the compound index, and terms
+    whose best fuzzy match is weak are also looked up in the semantic index
+    when the index directory has one.
+
+    An index may hold several vocabularies (LCSH, LCNAF, LCGFT, FAST) with
+    each heading tagged by the MARC subject field it is used in. Terms
+    passed with the tag of the field they came from, e.g. "600" for a
+    personal name, are matched only against headings of that field (and
+    untagged ones), through a per-field mask over the trigram entries; a
+    mixed batch is still scored in one pass.
+
+    Personal names, terms tagged 600 or untagged terms that read as names,
+    are matched in the name index by surname, forenames and dates before
+    the trigram search, which scores "Tolkien, J.R.R., 1892-1973" poorly
+    against "Tolkien, J. R. R. (John Ronald Reuel), 1892-1973".
+    """
+    # Accepts ``tags`` in ``get_recommendations``
+    routes_tags = True
+
+    def __init__(self, table: HeadingTable, trigrams: TrigramIndex, scorer: SimilarityScorer,
+                 compounds: Optional[CompoundIndex] = None, membership: Optional[HeadingMembership] = None,
+                 variants: Optional[VariantTable] = None, graph: Optional[RelationGraph] = None,
+                 semantic: Optional[SemanticIndex] = None, romanizations: Optional[RomanizationTable] = None,
+                 names: Optional[NameIndex] = None, limit: int = 1, fuzzy_cutoff: float = 0.3,
+                 shortlist_size: int = 50, semantic_cutoff: float = 0.6):
+        """
+        Initialize the local client
+
+        Args:
+            table: Table of authorized headings
+            trigrams: Trigram index over the table's labels
+            scorer: Similarity scorer built from the trigram index
+            compounds: Main heading and subdivision index for "--" headings
+            membership: Constant-time exact-match check for authorized headings
+            variants: Hash table of variant (see-from) labels
+            graph: Broader, narrower and related links between headings
+            semantic: Embedding index consulted when a fuzzy match is weak
+            romanizations: Hash table of labels folded across East Asian
+                romanizations and original script
+            names: Surname-keyed index of personal name headings
+            limit: Number of recommendations to return per term
+            fuzzy_cutoff: Minimum similarity of fuzzy matches
+            shortlist_size: Candidate labels taken from the trigram index per term
+            semantic_cutoff: Minimum cosine similarity of semantic matches
+        """
+        self.table = table
+        self.trigrams = trigrams
+        self.scorer = scorer
+        self.compounds = compounds
+        self.membership = membership
+        self.variants = variants
+        self.graph = graph
+        self.semantic = semantic
+        self.romanizations = romanizations
+        self.names = names
+        self.limit = limit
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.shortlist_size = shortlist_size
+        self.semantic_cutoff = semantic_cutoff
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._terms = 0
+        self._unmatched = 0
+        self._compound = 0
+        self._semantic = 0
+        self._names = 0
+        self._routed = 0
+        # Per-field masks over trigram entries, built on first use
+        self._entry_masks: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "LocalLCSHApi":
+        """
+        Open the index directory built by ``python -m app.authority build``
+        """
+        table = HeadingTable(path)
+        trigrams = TrigramIndex(path)
+        # The semantic index is built separately, with ``python -m app.authority embed``
+        semantic = SemanticIndex(path, table) if SemanticIndex.exists(path) else None
+        romanizations = RomanizationTable(path, table) if RomanizationTable.exists(path) else None
+        names = NameIndex(path, table) if NameIndex.exists(path) else None
+        return cls(table, trigrams, SimilarityScorer(path, trigrams), CompoundIndex(path, table),
+                   HeadingMembership(path), VariantTable(path, table), RelationGraph(path, table),
+                   semantic, romanizations, names, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "requests": self._requests,
+                "terms": self._terms,
+                "unmatched": self._unmatched,
+                "compound_matches": self._compound,
+                "semantic_matches": self._semantic,
+                "name_matches": self._names,
+                "routed_terms": self._routed,
+                "headings": len(self.table),
+            }
+        if self.compounds is not None:
+            stats["compounds"] = self.compounds.stats()
+        if self.graph is not None:
+            stats["links"] = self.graph.stats()
+        if self.semantic is not None:
+            stats["semantic"] = self.semantic.stats()
+        if self.romanizations is not None:
+            stats["romanized_keys"] = len(self.romanizations)
+        if self.names is not None:
+            stats["personal_names"] = len(self.names)
+        return stats
+
+    def recommendation(self, row: int, score: float, query: str, label: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build a recommendation in the remote API's format for an index row
+
+        ``label`` overrides the row's own label, e.g. for a compound heading
+        that extends it with subdivisions.
+        """
+        return {
+            "term": label or self.table.label(row),
+            "id": self.table.id(row),
+            "url": self.table.uri(row),
+            "similarity_score": round(score, 4),
+            "query": query,
+            "scheme": self.table.scheme(row),
+            "tag": self.table.tag(row),
+        }
+
+    def accepts(self, row: int, tag: int) -> bool:
+        """
+        Check whether a heading may be used in a MARC subject field
+
+        Untagged headings and untagged terms match anything.
+        """
+        if not tag:
+            return True
+        row_tag = self.table.tag(row)
+        return not row_tag or row_tag == tag
+
+    def entry_mask(self, tag: int) -> Optional[np.ndarray]:
+        """
+        Get the mask of trigram entries whose heading may be used in a field
+
+        Returns:
+            Boolean array over entries, or None when every entry qualifies
+        """
+        if not tag or self.table.tags is None:
+            return None
+        with self._lock:
+            mask = self._entry_masks.get(tag)
+        if mask is None:
+            entry_tags = np.asarray(self.table.tags)[np.asarray(self.trigrams.entry_row)]
+            mask = (entry_tags == tag) | (entry_tags == 0)
+            with self._lock:
+                self._entry_masks[tag] = mask
+        return mask
+
+    def exact_match(self, term: str, tag: int = 0,
+                    alive: Optional[Callable[[int], bool]] = None) -> List[Tuple[int, float]]:
+        """
+        Look a term up as an authorized or variant label
+
+        Authorized labels go through the membership check and variant labels
+        through the variant hash table when they are present; otherwise both are
+        binary searches in the table. A term that matches neither is probed
+        once more with its romanizations folded.
+
+        Args:
+            term: Term to look up
+            tag: MARC subject field the term is for, 0 for any
+            alive: Rows for which this returns False are treated as absent,
+                e.g. headings superseded by a later delta segment
+
+        Returns:
+            A single (row, similarity score) pair, or an empty list
+        """
+        def usable(row: int) -> bool:
+            return row >= 0 and self.accepts(row, tag) and (alive is None or alive(row))
+
+        row = self.membership.find(term) if self.membership is not None else self.table.find(term)
+        if row >= 0:
+            # Headings sharing a label, e.g. a topic and a place, are adjacent rows
+            key = self.table.keys[row]
+            while row < len(self.table) and self.table.keys[row] == key:
+                if usable(row):
+                    return [(row, 1.0)]
+                row += 1
+        row = self.variants.find(term) if self.variants is not None else self.table.find_variant(term)
+        if usable(row):
+            return [(row, VARIANT_MATCH_SCORE)]
+        if self.romanizations is not None:
+            row = self.romanizations.find(term)
+            if usable(row):
+                return [(row, ROMANIZATION_MATCH_SCORE)]
+        return []
+
+    def fuzzy_matches(self, terms: List[str], tags: Optional[List[int]] = None,
+                      limit: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Find the best headings for a batch of terms by similarity score
+
+        Args:
+            terms: Terms without an exact match
+            tags: MARC subject field of each term, 0 for any
+            limit: Number of headings per term, by default ``self.limit``
+
+        Returns:
+            For each term, a list of (row, similarity score) pairs, best first
+        """
+        limit = limit or self.limit
+        tags = tags or [0] * len(terms)
+        shortlists = [self.trigrams.shortlist(term, limit=self.shortlist_size, allowed=self.entry_mask(tag))
+                      for term, tag in zip(terms, tags)]
+        entries = np.unique(np.concatenate(shortlists)) if shortlists else np.zeros(0, dtype=np.int64)
+        if len(entries) == 0:
+            return [[] for _ in terms]
+
+        scores = self.scorer.score(terms, entries)
+        if self.trigrams.entry_variant is not None:
+            # A variant label is not the heading, however close the term comes to it
+            variant = np.asarray(self.trigrams.entry_variant[entries], dtype=bool)
+            scores = np.where(variant, np.minimum(scores, VARIANT_MATCH_SCORE), scores)
+        rows = np.asarray(self.trigrams.entry_row[entries], dtype=np.int64)
+        # Best entries first, so the first occurrence of a row is its best label
+        ranking = np.argsort(-scores, axis=1, kind="stable")
+
+        results = []
+        for term_scores, order in zip(scores, ranking):
+            matches: List[Tuple[int, float]] = []
+            seen = set()
+            for entry in order:
+                score = float(term_scores[entry])
+                if score < self.fuzzy_cutoff or len(matches) >= limit:
+                    break
+                row = int(rows[entry])
+                if row not in seen:
+                    seen.add(row)
+                    matches.append((row, score))
+            results.append(matches)
+        return results
+
+    def match(self, term: str) -> List[Tuple[int, float]]:
+        """
+        Find the headings that best match a term
+
+        Args:
+            term: Term to look up
+
+        Returns:
+            List of (row, similarity score) pairs, best first
+        """
+        return self.exact_match(term) or self.fuzzy_matches([term])[0]
+
+    def related_headings(self, term: str, relation: str = NARROWER, hops: int = 1, limit: int = 20) -> Dict[str, Any]:
+        """
+        Suggest headings linked to a term, e.g. more specific ones
+
+        Args:
+            term: Term to start from; it is matched like any other term
+            relation: "narrower", "broader" or "related"
+            hops: Maximum number of links to follow
+            limit: Maximum number of headings to return
+
+        Returns:
+            Dictionary with the matched ``heading`` (None when nothing
+            matched) and the ``related`` headings, nearest first, each with
+            the ``relation`` followed and its number of ``hops``
+        """
+        if self.graph is None:
+            return {"error": "The local index has no relation graph", "heading": None, "related": []}
+        found = self.match(term)
+        if not found:
+            return {"heading": None, "related": []}
+
+        row, score = found[0]
+        rows, depths = self.graph.expand(row, relation, hops)
+        related = []
+        for linked, depth in zip(rows[:limit], depths[:limit]):
+            linked = int(linked)
+            related.append({
+                "term": self.table.label(linked),
+                "id": self.table.id(linked),
+                "url": self.table.uri(linked),
+                "relation": relation,
+                "hops": int(depth),
+            })
+        return {"heading": self.recommendation(row, score, term), "related": related}
+
+    def authorized(self, term: str, tag=0) -> Optional[Dict[str, Any]]:
+        """
+        Get the recommendation for a term that is exactly an authorized heading
+
+        Args:
+            term: Term to look up
+            tag: MARC field the term came from, e.g. "650"; 0 for any
+
+        Returns:
+            The recommendation with a score of 1.0, or None
+        """
+        found = self.exact_match(term, subject_tag(tag) if tag else 0)
+        if not found or found[0][1] < 1.0:
+            return None
+        return self.recommendation(found[0][0], 1.0, term)
+
+    def term_recommendations(self, terms: List[str], tags: Optional[List] = None, limit: Optional[int] = None,
+                             alive: Optional[Callable[[int], bool]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Get the recommendations for each of a batch of terms
+
+        Args:
+            terms: Terms to look up
+            tags: MARC field each term came from, e.g. "651"; empty or
+                unrecognized tags match headings of any field
+            limit: Number of recommendations per term, by default ``self.limit``
+            alive: Rows for which this returns False are skipped by the
+                exact and compound matches; ranked matches may still
+                include them, so a caller filtering those out should ask
+                for a higher ``limit``
+
+        Returns:
+            One list of recommendations per term, best first
+
+        Raises:
+            ValueError: If ``tags`` is given but does not match ``terms`` in length
+        """
+        _check_tags(terms, tags)
+        limit = limit or self.limit
+        tags = [subject_tag(tag) if tag else 0 for tag in tags] if tags else [0] * len(terms)
+        matches = [self.exact_match(term, tag, alive) for term, tag in zip(terms, tags)]
+        labels: Dict[int, str] = {}
+        if self.compounds is not None:
+            for i, term in enumerate(terms):
+                if not matches[i] and SEPARATOR in term:
+                    result = self.compounds.check(term)
+                    if result["valid"] and self.accepts(result["row"], tags[i]) and (alive is None or alive(result["row"])):
+                        matches[i] = [(result["row"], COMPOUND_MATCH_SCORE)]
+                        labels[i] = result["label"]
+
+        names = 0
+        if self.names is not None:
+            for i, term in enumerate(terms):
+                if matches[i] or SEPARATOR in term:
+                    continue
+                if tags[i] == PERSONAL_NAME_TAG or not tags[i] and looks_like_personal_name(term):
+                    matches[i] = self.names.match(term, limit)
+                    names += bool(matches[i])
+
+        fuzzy = [i for i, found in enumerate(matches) if not found]
+        for i, found in zip(fuzzy, self.fuzzy_matches([terms[i] for i in fuzzy], [tags[i] for i in fuzzy], limit)):
+            matches[i] = found
+
+        # Paraphrases share few trigrams with their heading; keep the semantic match when it scores higher
+        semantic = 0
+        if self.semantic is not None:
+            weak = [i for i in fuzzy if not matches[i] or matches[i][0][1] < SEMANTIC_FALLBACK_BELOW]
+            # Routed terms look further down the list for a heading of their field
+            k = limit * 10 if any(tags[i] for i in weak) else limit
+            for i, found in zip(weak, self.semantic.search([terms[i] for i in weak], k)):
+                found = [(row, score) for row, score in found
+                         if score >= self.semantic_cutoff and self.accepts(row, tags[i])][:limit]
+                if found and (not matches[i] or found[0][1] > matches[i][0][1]):
+                    matches[i] = found
+                    semantic += 1
+
+        with self._lock:
+            self._requests += 1
+            self._terms += len(terms)
+            self._unmatched += sum(1 for found in matches if not found)
+            self._compound += len(labels)
+            self._semantic += semantic
+            self._names += names
+            self._routed += sum(1 for tag in tags if tag)
+        return [[self.recommendation(row, score, term, labels.get(i)) for row, score in found]
+                for i, (term, found) in enumerate(zip(terms, matches))]
+
+    def get_recommendations(self, terms: Union[List[str], str], tags: Optional[List] = None) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+            tags: MARC field each term came from, see ``term_recommendations``
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+        return {"recommendations": [item for group in self.term_recommendations(terms, tags) for item in group]}
+
+
+class SegmentedLCSHApi:
+    """
+    Local client over a base index and the delta segments applied to it
+
+    Every layer, the base and each segment written by ``apply_changes``, is
+    a complete index opened as a ``LocalLCSHApi``. A term is looked up in
+    every layer, newest first; recommendations of headings that a newer
+    segment replaced or cancelled are dropped, and the best remaining one
+    wins, the newest layer on ties.
+
+    The manifest is checked at most every ``reload_interval`` seconds. When
+    an update or compaction replaced it, the new list of layers is opened,
+    reusing the layers already open, and swapped in whole, so requests in
+    flight finish on the layers they started with and a running worker
+    picks up changes without a restart.
+
+    Links are followed within the layer that matched the term; a link to a
+    heading that a segment changed shows the changed heading, and links
+    from a segment's headings to older layers appear after the next
+    compaction.
+    """
+    routes_tags = True
+    def __init__(self, directory: str, reload_interval: float = 30.0, **kwargs):
+        """
+        Open an index directory and its segments
+
+        Args:
+            directory: Index directory built by ``python -m app.authority build``
+            reload_interval: Seconds between checks of the manifest, 0 to
+                check on every request
+            **kwargs: Passed to ``LocalLCSHApi`` for every layer
+        """
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.kwargs = kwargs
+        # Layers newest first, each with the URIs superseded by newer layers
+        self._layers: Tuple[Tuple[LocalLCSHApi, FrozenSet[str]], ...] = ()
+        self._opened: Dict[str, LocalLCSHApi] = {}
+        # Current segment headings by URI, to relabel links from older layers
+        self._current: Dict[str, Dict[str, Any]] = {}
+        self.generation = 0
+
+        self._reload_lock = threading.Lock()
+        self._manifest_state = self._state()
+        self._checked = time.monotonic()
+        self._reloads = 0
+        self._failed_reloads = 0
+        self._load()
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "SegmentedLCSHApi":
+        return cls(path, **kwargs)
+
+    def _state(self) -> Optional[Tuple[int, int]]:
+        # A replaced manifest is a new file, so its inode changes even within one mtime tick
+        try:
+            status = os.stat(os.path.join(self.directory, MANIFEST))
+        except FileNotFoundError:
+            return None
+        return status.st_ino, status.st_mtime_ns
+
+    def _load(self) -> None:
+        """
+        Open the layers named by the manifest and swap them in
+        """
+        manifest = read_manifest(self.directory)
+        names = [manifest["base"]] + manifest["segments"]
+        tombstones = [frozenset()] + [frozenset(read_tombstones(os.path.join(self.directory, name)))
+                                       for name in manifest["segments"]]
+        opened: Dict[str, LocalLCSHApi] = {}
+        current: Dict[str, Dict[str, Any]] = {}
+        layers = []
+        superseded: FrozenSet[str] = frozenset()
+        for i, (name, dead) in enumerate(zip(reversed(names), reversed(tombstones))):
+            layer = self._opened.get(name)
+            if layer is None:
+                layer = LocalLCSHApi.from_path(os.path.normpath(os.path.join(self.directory, name)), **self.kwargs)
+            opened[name] = layer
+            layers.append((layer, superseded))
+            if i < len(names) - 1:
+                for row in range(len(layer.table)):
+                    uri = layer.table.uri(row)
+                    current.setdefault(uri, {"term": layer.table.label(row), "id": layer.table.id(row), "url": uri})
+            superseded = superseded | dead
+        self._layers = tuple(layers)
+        self._opened = opened
+        self._current = current
+        self.generation = manifest["generation"]
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Pick up segments applied or compacted since the last check
+
+        Args:
+            force: Check the manifest now, whatever the reload interval
+
+        Returns:
+            True when a new set of layers was swapped in
+        """
+        if not force and time.monotonic() - self._checked < self.reload_interval:
+            return False
+        with self._reload_lock:
+            if not force and time.monotonic() - self._checked < self.reload_interval:
+                return False
+            self._checked = time.monotonic()
+            state = self._state()
+            if state == self._manifest_state:
+                return False
+            try:
+                self._load()
+            except (OSError, ValueError, KeyError):
+                # A compaction removed a layer between reading the manifest and opening it; retry next check
+                self._failed_reloads += 1
+                return False
+            self._manifest_state = state
+            self._reloads += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        layers = self._layers
+        return {
+            "generation": self.generation,
+            "segments": len(layers) - 1,
+            "superseded": len(layers[-1][1]),
+            "reloads": self._reloads,
+            "failed_reloads": self._failed_reloads,
+            "base": layers[-1][0].stats(),
+            "delta_headings": sum(len(layer.table) for layer, _ in layers[:-1]),
+        }
+
+    def authorized(self, term: str, tag=0) -> Optional[Dict[str, Any]]:
+        """
+        Get the recommendation for a term that is exactly an authorized heading
+
+        Args:
+            term: Term to look up
+            tag: MARC field the term came from, 0 for any
+
+        Returns:
+            The recommendation from the newest layer that still has the
+            heading, or None
+        """
+        self.refresh()
+        for layer, superseded in self._layers:
+            found = layer.authorized(term, tag)
+            if found is not None and found["url"] not in superseded:
+                return found
+        return None
+
+    def resolve(self, term: str) -> Optional[str]:
+        """
+        Rewrite a variant, romanized or original-script label to its authorized form
+
+        See ``VariantTable.resolve``.
+        """
+        self.refresh()
+        # Variant labels in every layer first, then romanized and original-script forms
+        for name in ("variants", "romanizations"):
+            if name == "romanizations" and self.authorized(term) is not None:
+                # Folded keys are loose; an authorized heading must not turn into another one
+                return None
+            for layer, superseded in self._layers:
+                keys = getattr(layer, name)
+                if keys is None:
+                    continue
+                resolved = keys.resolve(term, lambda row: layer.table.uri(row) not in superseded)
+                if resolved is not None:
+                    return resolved
+        return None
+
+    def related_headings(self, term: str, relation: str = NARROWER, hops: int = 1, limit: int = 20) -> Dict[str, Any]:
+        """
+        Suggest headings linked to a term, see ``LocalLCSHApi.related_headings``
+
+        The term is matched in the newest layer that has a current heading
+        for it, and links are followed within that layer.
+        """
+        self.refresh()
+        result = {"heading": None, "related": []}
+        for layer, superseded in self._layers:
+            result = layer.related_headings(term, relation, hops, limit)
+            heading = result.get("heading")
+            if heading is not None and heading["url"] not in superseded:
+                related = []
+                for item in result["related"]:
+                    if item["url"] in superseded:
+                        if item["url"] not in self._current:
+                            continue
+                        item = dict(item, **self._current[item["url"]])
+                    related.append(item)
+                result["related"] = related
+                return result
+        return result if result.get("error") else {"heading": None, "related": []}
+
+    def get_recommendations(self, terms: Union[List[str], str], tags: Optional[List] = None) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+            tags: MARC field each term came from, see ``LocalLCSHApi.term_recommendations``
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+        self.refresh()
+        layers = self._layers
+        if len(layers) == 1:
+            return layers[0][0].get_recommendations(terms, tags)
+
+        best: List[List[Dict[str, Any]]] = [[] for _ in terms]
+        for layer, superseded in layers:
+            for i, group in enumerate(self._current_recommendations(layer, superseded, terms, tags)):
+                if group and (not best[i] or group[0]["similarity_score"] > best[i][0]["similarity_score"]):
+                    best[i] = group
+        return {"recommendations": [item for group in best for item in group]}
+
+    @staticmethod
+    def _current_recommendations(layer: LocalLCSHApi, superseded: FrozenSet[str], terms: List[str],
+                                 tags: Optional[List]) -> List[List[Dict[str, Any]]]:
+        """
+        Get a layer's recommendations for each term, leaving out superseded headings
+
+        Superseded rows are skipped by the exact and compound matches. A
+        ranked list that loses hits to newer segments is fetched again with
+        room for that many more, until ``layer.limit`` current headings
+        remain or the layer has no further matches, so a term falls back to
+        the layer's next best current heading.
+        """
+        if not superseded:
+            return layer.term_recommendations(terms, tags)
+
+        def alive(row: int) -> bool:
+            return layer.table.uri(row) not in superseded
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in terms]
+        pending = list(range(len(terms)))
+        limit = layer.limit
+        while pending:
+            groups = layer.term_recommendations([terms[i] for i in pending],
+                                                [tags[i] for i in pending] if tags else None, limit, alive)
+            short, dropped = [], 0
+            for i, group in zip(pending, groups):
+                current = [item for item in group if item["url"] not in superseded]
+                results[i] = current[:layer.limit]
+                # A full list may hold further current headings past the superseded ones
+                if len(current) < layer.limit and len(group) >= limit:
+                    short.append(i)
+                    dropped = max(dropped, len(group) - len(current))
+            pending = short
+            limit += dropped
+        return results
+
+
+class LocalFirstLCSHApi:
+    """
+    LCSH API client that answers exact authorized headings locally
+
+    Has the same ``get_recommendations`` contract as ``LCSHApi``. Terms that
+    are exactly an authorized heading are confirmed by the membership check
+    of a local index and answered at once with a score of 1.0; only the
+    remaining, ambiguous terms are sent on to the wrapped client.
+    """
+    routes_tags = True
+
+    def __init__(self, api, local: LocalLCSHApi):
+        """
+        Initialize the local-first client
+
+        Args:
+            api: Client to send ambiguous terms to, e.g. the cached remote stack
+            local: Local index client, ``LocalLCSHApi`` or ``SegmentedLCSHApi``
+        """
+        self.api = api
+        self.local = local
+        self._fetcher = TermFetcher(api)
+
+        self._lock = threading.Lock()
+        self._answered = 0
+        self._forwarded = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "answered_locally": self._answered,
+                "forwarded": self._forwarded,
+                "api": self.api.stats(),
+            }
+
+    def get_recommendations(self, terms: Union[List[str], str], tags: Optional[List] = None) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+            tags: MARC field each term came from; only the local check uses
+                them, the wrapped client gets the terms alone
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+        _check_tags(terms, tags)
+
+        entries: List[Optional[Dict[str, Any]]] = []
+        forwarded = []
+        for term, tag in zip(terms, tags or [0] * len(terms)):
+            found = self.local.authorized(term, tag)
+            if found is not None:
+                entries.append({"recommendations": [found]})
+            else:
+                entries.append(None)
+                forwarded.append(term)
+
+        with self._lock:
+            self._answered += len(terms) - len(forwarded)
+            self._forwarded += len(forwarded)
+        if not forwarded:
+            return merge_term_results(entries, terms)
+
+        if len(forwarded) == len(terms):
+            return self.api.get_recommendations(forwarded)
+        fetched_entries = iter(self._fetcher.fetch(forwarded))
+        return merge_term_results([entry or next(fetched_entries) for entry in entries], terms)
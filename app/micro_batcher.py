@@ -0,0 +1,193 @@
+"""
+Micro Batcher Module - Combines lookups from concurrent sessions into shared requests
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Union, Optional
+
+from app.lcsh_api import TermFetcher, merge_term_results
+from app.normalize import normalize_term
+
+class MicroBatchingLCSHApi:
+    """
+    LCSH API client that batches terms across concurrent callers
+
+    Callers enqueue their terms and block on the result. A background thread
+    flushes the queue as one ``/recommend`` request as soon as it holds
+    ``max_batch_size`` distinct terms, or ``max_wait`` seconds after the first
+    queued term arrived, whichever happens first. Each caller then gets back
+    just its own terms' recommendations.
+
+    Terms of different sessions are only merged while the upstream echoes
+    which term each recommendation answers. The first merged response that
+    does not is answered one request per term, and from then on every
+    caller's terms bypass the queue and go upstream one request per term,
+    concurrently; see ``TermFetcher``.
+    """
+    def __init__(self, api, max_wait: float = 0.01, max_batch_size: int = 64, max_in_flight: int = 4):
+        """
+        Initialize the batching client
+
+        Args:
+            api: Client to send combined batches to, e.g. an ``LCSHApi``
+            max_wait: Seconds to hold a batch open for more terms
+            max_batch_size: Number of distinct terms that flushes a batch immediately
+            max_in_flight: Number of batches that may be awaiting a response at once
+        """
+        self.api = api
+        self._fetcher = TermFetcher(api)
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self._senders = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="lcsh-batch-sender")
+
+        self._condition = threading.Condition()
+        # Pending terms by normalized key: (term, future, enqueue time)
+        self._pending: Dict[str, tuple] = {}
+        self._closed = False
+        self._bypassed = 0
+
+        self._batches = 0
+        self._terms = 0
+        self._flush_reasons = {"size": 0, "timeout": 0, "close": 0}
+        # Recent batches for the size and wait distributions
+        self._recent = deque(maxlen=1024)
+
+        self._worker = threading.Thread(target=self._run, name="lcsh-micro-batcher", daemon=True)
+        self._worker.start()
+
+    def close(self) -> None:
+        """
+        Flush pending terms and stop the background thread
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join()
+        self._senders.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get batching metrics
+
+        Returns:
+            Dictionary with batch counts, flush reasons and the distribution
+            of batch sizes and queue wait times over recent batches
+        """
+        with self._condition:
+            recent = list(self._recent)
+            stats = {
+                "batches": self._batches,
+                "terms": self._terms,
+                "pending": len(self._pending),
+                "demultiplexes": self._fetcher.demultiplexes,
+                "bypassed": self._bypassed,
+                "flush_reasons": dict(self._flush_reasons),
+            }
+        sizes = sorted(size for size, _ in recent)
+        waits = sorted(wait for _, wait in recent)
+        stats["batch_size"] = _summary(sizes)
+        stats["wait_ms"] = _summary([wait * 1000 for wait in waits])
+        stats["api"] = self.api.stats()
+        return stats
+
+    def get_recommendations(self, terms: Union[List[str], str]) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+
+        unique = {}
+        for term in terms:
+            unique.setdefault(normalize_term(term), term)
+
+        futures = {}
+        with self._condition:
+            if self._closed:
+                return {
+                    "error": "LCSH micro-batcher is closed",
+                    "recommendations": []
+                }
+            bypass = not self._fetcher.demultiplexes
+            if bypass:
+                self._bypassed += 1
+            else:
+                now = time.monotonic()
+                for key, term in unique.items():
+                    # A term already queued by another caller rides along with it
+                    if key not in self._pending:
+                        self._pending[key] = (term, Future(), now)
+                    futures[key] = self._pending[key][1]
+                self._condition.notify()
+        if bypass:
+            return merge_term_results(self._fetcher.fetch_each(list(unique.values())), list(unique.values()))
+
+        return merge_term_results([futures[key].result() for key in unique], list(unique.values()))
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+
+                # Hold the batch open until it is full or its oldest term has waited long enough
+                oldest = min(enqueued for _, _, enqueued in self._pending.values())
+                flush_at = oldest + self.max_wait
+                reason = "timeout"
+                while True:
+                    if len(self._pending) >= self.max_batch_size:
+                        reason = "size"
+                        break
+                    if self._closed:
+                        reason = "close"
+                        break
+                    remaining = flush_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                keys = list(self._pending)[:self.max_batch_size]
+                batch = [(key, *self._pending.pop(key)) for key in keys]
+                flushed_at = time.monotonic()
+                self._batches += 1
+                self._terms += len(batch)
+                self._flush_reasons[reason] += 1
+                self._recent.append((len(batch), flushed_at - min(item[3] for item in batch)))
+
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch: List[tuple]) -> None:
+        batch_terms = [term for _, term, _, _ in batch]
+        try:
+            entries = self._fetcher.fetch(batch_terms)
+        except Exception as e:
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, _, future, _), entry in zip(batch, entries):
+            future.set_result(entry)
+
+
+def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+    """
+    Summarize sorted values as mean and percentiles
+    """
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "max": None}
+    return {
+        "mean": sum(values) / len(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
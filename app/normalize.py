@@ -0,0 +1,139 @@
+"""
+Normalization Module - Canonical keys for LCSH terms
+"""
+import re
+import unicodedata
+from typing import List
+
+# Dash variants models and catalogers use in place of the "--" subdivision separator
+_DASHES = re.compile(r"\s*(?:--|[–—―]|\s-\s)\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_term(term: str) -> str:
+    """
+    Normalize a term into a lookup key
+
+    Two spellings of the same heading that differ only in case, spacing,
+    subdivision dash style or trailing punctuation map to the same key.
+    Diacritics are kept, since they can distinguish headings.
+
+    Args:
+        term: Term as written by the model or the cataloger
+
+    Returns:
+        Normalized key
+    """
+    key = unicodedata.normalize("NFKC", term).casefold()
+    key = _WHITESPACE.sub(" ", key).strip()
+    key = _DASHES.sub("--", key)
+    return key.rstrip(" .,;:")
+
+# Marks of aspiration (McCune-Reischauer "P'yŏngyang") and syllable breaks (Pinyin "Xi'an")
+_SYLLABLE_MARKS = re.compile(r"['‘’ʻʼ`´·・‧]")
+# Pinyin tone numbers, as in "zhong1guo2"; years and other numbers are left alone
+_TONE_NUMBERS = re.compile(r"(?<=[a-z])[1-5](?![0-9])")
+# Word division differs between romanization schemes and catalogers
+_WORD_BREAKS = re.compile(r"[\s\-‐]+")
+# Spellings that vary between romanization schemes, folded in this order:
+# Revised Romanization "eo"/"eu" for McCune-Reischauer "ŏ"/"ŭ", long vowels
+# written out in place of Hepburn macrons, and traditional Hepburn "m" for
+# syllabic "n" before labials
+_SPELLING_FOLDS = (("eo", "o"), ("eu", "u"), ("ou", "o"), ("oo", "o"), ("uu", "u"),
+                   ("mb", "nb"), ("mp", "np"), ("mm", "nm"))
+
+# Han, kana and Hangul, as in the original-script variants of LC records
+_EAST_ASIAN_SCRIPT = re.compile(r"[\u1100-\u11ff\u3040-\u30ff\u3130-\u318f\u3400-\u4dbf"
+                                r"\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+# Macrons (Hepburn), breves and aspiration marks (McCune-Reischauer) and Pinyin syllable marks
+_ROMANIZATION_MARKS = re.compile(r"[āēīōūĀĒĪŌŪăĕŏŭĂĔŎŬʻʼ]")
+
+def is_east_asian(label: str) -> bool:
+    """
+    Check whether a label is in East Asian script or romanized with LC's marks
+
+    Args:
+        label: Label as written in the authority record, with its diacritics
+
+    Returns:
+        True for labels such as "東京", "서울" or "Pʻyŏngyang"
+    """
+    label = unicodedata.normalize("NFC", label)
+    return bool(_EAST_ASIAN_SCRIPT.search(label) or _ROMANIZATION_MARKS.search(label))
+
+def romanization_key(term: str) -> str:
+    """
+    Fold a term into a key shared by its East Asian romanizations
+
+    Goes further than ``heading_key``: besides tone marks, macrons and
+    breves, it drops aspiration apostrophes, tone numbers and word breaks,
+    and folds spellings that differ between Pinyin, Hepburn, McCune-Reischauer
+    and Revised Romanization, so "Pʻyŏngyang", "Pyeongyang" and "pyongyang"
+    share a key, as do "Tōkyō" and "Toukyou". Original-script terms lose
+    their spacing and middle dots. Subdivision separators are kept.
+
+    The key is too loose to tell every heading apart ("Good" and "God"
+    share one) and is only meant for a lookup of East Asian headings that
+    has already failed on ``heading_key``.
+
+    Args:
+        term: Term or authorized heading
+
+    Returns:
+        Folded key
+    """
+    return "--".join(fold_romanization(segment) for segment in heading_key(term).split("--"))
+
+def fold_romanization(key: str) -> str:
+    """
+    Apply the folds of ``romanization_key`` to one segment of a ``heading_key``
+
+    For callers that already hold folded keys and would otherwise fold them
+    twice.
+    """
+    key = _SYLLABLE_MARKS.sub("", key)
+    key = _TONE_NUMBERS.sub("", key)
+    key = _WORD_BREAKS.sub("", key)
+    for spelling, folded in _SPELLING_FOLDS:
+        key = key.replace(spelling, folded)
+    return key
+
+def heading_segments(term: str) -> List[str]:
+    """
+    Split a term into its subdivision segments, keeping their spelling
+
+    Any dash style is accepted as the separator, and surrounding whitespace
+    and trailing punctuation are trimmed from each segment.
+
+    Args:
+        term: Term as written by the model or the cataloger
+
+    Returns:
+        List of segments; empty segments are kept
+    """
+    term = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", term)).strip()
+    segments = []
+    for segment in _DASHES.split(term):
+        segment = segment.strip()
+        # "etc." is part of headings like "Handbooks, manuals, etc."
+        if not segment.endswith("etc."):
+            segment = segment.rstrip(" .,;:")
+        segments.append(segment)
+    return segments
+
+def heading_key(term: str) -> str:
+    """
+    Fold a term into a loose matching key for the local authority index
+
+    Like ``normalize_term`` but also strips diacritics, so "Tōkyō" and
+    "Tokyo" share a key.
+
+    Args:
+        term: Term or authorized heading
+
+    Returns:
+        Folded key
+    """
+    key = unicodedata.normalize("NFKD", normalize_term(term))
+    # Only the Latin diacritics block; kana voicing marks and the like must stay
+    key = "".join(ch for ch in key if not "\u0300" <= ch <= "\u036f")
+    return unicodedata.normalize("NFC", key)
@@ -0,0 +1,227 @@
+"""
+Single Flight Module - Coalesces concurrent lookups of the same LCSH term
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import List, Dict, Any, Union, Optional
+
+from app.lcsh_api import TermFetcher, split_term_entries, merge_term_results
+from app.normalize import normalize_term
+
+class CoalescingLCSHApi:
+    """
+    LCSH API client that deduplicates in-flight lookups across threads
+
+    The first caller to ask for a term sends the request; callers that ask for
+    the same term while that request is outstanding wait for its result
+    instead of sending their own. Deduplication is per term, so a batch that
+    only partly overlaps with in-flight requests sends just the new terms.
+    """
+    def __init__(self, api):
+        """
+        Initialize the coalescing client
+
+        Args:
+            api: Client to send lookups to, e.g. an ``LCSHApi``
+        """
+        self.api = api
+        self._fetcher = TermFetcher(api)
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._requests = 0
+        self._terms_fetched = 0
+        self._terms_coalesced = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "terms_fetched": self._terms_fetched,
+                "terms_coalesced": self._terms_coalesced,
+                "terms_in_flight": len(self._in_flight),
+                "demultiplexes": self._fetcher.demultiplexes,
+                "api": self.api.stats(),
+            }
+
+    def get_recommendations(self, terms: Union[List[str], str]) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+
+        unique = {}
+        for term in terms:
+            unique.setdefault(normalize_term(term), term)
+
+        futures: Dict[str, Future] = {}
+        owned = []
+        with self._lock:
+            for key in unique:
+                future = self._in_flight.get(key)
+                if future is None:
+                    future = Future()
+                    self._in_flight[key] = future
+                    owned.append(key)
+                futures[key] = future
+            self._terms_fetched += len(owned)
+            self._terms_coalesced += len(unique) - len(owned)
+            if owned:
+                self._requests += 1
+
+        if owned:
+            owned_terms = [unique[key] for key in owned]
+            try:
+                entries = self._fetcher.fetch(owned_terms)
+            except BaseException as e:
+                self._settle(owned, futures, error=e)
+                raise
+            self._settle(owned, futures, entries=entries)
+
+        return merge_term_results([futures[key].result() for key in unique], list(unique.values()))
+
+    def _settle(self, owned: List[str], futures: Dict[str, Future],
+                entries: Optional[List[Dict[str, Any]]] = None,
+                error: Optional[BaseException] = None) -> None:
+        # Unregister first so callers arriving after this point send a fresh request
+        with self._lock:
+            for key in owned:
+                self._in_flight.pop(key, None)
+        for i, key in enumerate(owned):
+            if error is not None:
+                futures[key].set_exception(error)
+            else:
+                futures[key].set_result(entries[i])
+
+
+class AsyncCoalescingLCSHApi:
+    """
+    Asyncio counterpart to ``CoalescingLCSHApi``
+
+    The shared request runs in its own task, so cancelling the caller that
+    started it does not cancel the lookup for the other callers waiting on it.
+    A caller's timeout or deadline bounds only its own wait.
+    """
+    def __init__(self, api):
+        """
+        Initialize the coalescing client
+
+        Args:
+            api: Async client to send lookups to, e.g. an ``AsyncLCSHApi``
+        """
+        self.api = api
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+        # Cleared once a multi-term response cannot be split back exactly
+        self._demultiplexes = True
+        self._requests = 0
+        self._terms_fetched = 0
+        self._terms_coalesced = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self._requests,
+            "terms_fetched": self._terms_fetched,
+            "terms_coalesced": self._terms_coalesced,
+            "terms_in_flight": len(self._in_flight),
+            "demultiplexes": self._demultiplexes,
+            "api": self.api.stats(),
+        }
+
+    async def get_recommendations(self,
+                                  terms: Union[List[str], str],
+                                  timeout: Optional[float] = None,
+                                  deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+            timeout: Seconds from now after which to give up
+            deadline: Event loop time after which to give up
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+
+        loop = asyncio.get_running_loop()
+        if timeout is not None:
+            timeout_deadline = loop.time() + timeout
+            deadline = timeout_deadline if deadline is None else min(deadline, timeout_deadline)
+
+        unique = {}
+        for term in terms:
+            unique.setdefault(normalize_term(term), term)
+
+        # No await between the lookup and the registration, so this is atomic
+        futures: Dict[str, asyncio.Future] = {}
+        owned = []
+        for key in unique:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._in_flight[key] = future
+                owned.append(key)
+            futures[key] = future
+        self._terms_fetched += len(owned)
+        self._terms_coalesced += len(unique) - len(owned)
+
+        if owned:
+            self._requests += 1
+            # Keep a reference so the task is not garbage collected mid-flight
+            task = asyncio.create_task(self._fetch(owned, [unique[key] for key in owned], futures))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        entries = []
+        try:
+            async with asyncio.timeout_at(deadline):
+                for key in unique:
+                    entries.append(await asyncio.shield(futures[key]))
+        except TimeoutError:
+            entries.extend({"error": "LCSH API request exceeded its deadline"}
+                           for _ in range(len(unique) - len(entries)))
+        return merge_term_results(entries, list(unique.values()))
+
+    async def _fetch(self, owned: List[str], owned_terms: List[str],
+                     futures: Dict[str, asyncio.Future]) -> None:
+        try:
+            entries = None
+            if len(owned_terms) > 1 and self._demultiplexes:
+                entries = split_term_entries(owned_terms, await self.api.get_recommendations(owned_terms))
+                # The response does not echo its terms; stop batching them
+                self._demultiplexes = entries is not None
+            if entries is None:
+                results = await asyncio.gather(*(self.api.get_recommendations([term]) for term in owned_terms))
+                entries = [split_term_entries([term], result)[0] for term, result in zip(owned_terms, results)]
+        except asyncio.CancelledError:
+            # Only happens when the loop shuts down; release the waiters
+            self._settle(owned, futures, [{"error": "LCSH API request was cancelled"}] * len(owned))
+            raise
+        except Exception as e:
+            self._settle(owned, futures, error=e)
+            return
+        self._settle(owned, futures, entries)
+
+    def _settle(self, owned: List[str], futures: Dict[str, asyncio.Future],
+                entries: Optional[List[Dict[str, Any]]] = None,
+                error: Optional[BaseException] = None) -> None:
+        for i, key in enumerate(owned):
+            self._in_flight.pop(key, None)
+            if futures[key].done():
+                continue
+            if error is not None:
+                futures[key].set_exception(error)
+                # Callers that gave up waiting never await the future; mark its exception retrieved
+                futures[key].exception()
+            else:
+                futures[key].set_result(entries[i])
@@ -0,0 +1,367 @@
+"""
+Subdivisions Module - Pre-validates compound headings against the free-floating subdivision lists
+"""
+import difflib
+import os
+import threading
+from functools import lru_cache
+from typing import List, Dict, Any, Union, Optional, Tuple
+
+from app.authority.compound import is_chronological
+from app.normalize import heading_key, heading_segments
+
+DEFAULT_LISTS_PATH = os.path.join(os.path.dirname(__file__), "data", "free_floating_subdivisions.tsv")
+
+# Subdivision kinds, as bits; the letters are the MARC subfield codes
+TOPICAL = 1
+CHRONOLOGICAL = 2
+GEOGRAPHIC = 4
+FORM = 8
+KIND_CODES = {"x": TOPICAL, "y": CHRONOLOGICAL, "z": GEOGRAPHIC, "v": FORM}
+
+# Grammar states are the kind of the last segment read, or the main heading
+MAIN = 16
+# Kinds that may follow each state
+ALLOWED = {
+    MAIN: TOPICAL | CHRONOLOGICAL | GEOGRAPHIC | FORM,
+    TOPICAL: TOPICAL | CHRONOLOGICAL | GEOGRAPHIC | FORM,
+    GEOGRAPHIC: TOPICAL | CHRONOLOGICAL | GEOGRAPHIC | FORM,
+    CHRONOLOGICAL: TOPICAL | FORM,
+    FORM: FORM,
+}
+
+# An unlisted segment is taken to be a place, a topic or a qualifier outside
+# the lists, such as the language of "Chinese language--Dictionaries--English";
+# the grammar accepts it wherever it stands
+UNLISTED = TOPICAL | GEOGRAPHIC
+# Shorter unlisted segments are too close to too many words to correct
+MIN_CORRECTION_LENGTH = 6
+
+def read_subdivision_lists(path: str) -> List[Tuple[str, int, bool]]:
+    """
+    Read a subdivision lists file
+
+    Each non-comment line holds a subdivision, its kind letters (x, y, z, v)
+    and "yes" or "no" for whether it is also used as a main heading.
+
+    Args:
+        path: Tab-separated lists file
+
+    Returns:
+        List of (subdivision, kind bits, usable as main heading)
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            label, codes, main = (line.split("\t") + ["", ""])[:3]
+            kinds = 0
+            for code in codes.strip():
+                if code not in KIND_CODES:
+                    raise ValueError(f"Unknown subdivision kind {code!r} for {label!r} in {path}")
+                kinds |= KIND_CODES[code]
+            entries.append((label.strip(), kinds, main.strip().lower() != "no"))
+    return entries
+
+
+class SubdivisionAutomaton:
+    """
+    Finite-state check of subdivision order for compound headings
+
+    The subdivision lists are compiled into a character trie over folded
+    labels whose accepting nodes carry kind bits. A term is read once, left
+    to right: characters advance the trie, and every "--" feeds the finished
+    segment's kinds into a small grammar automaton (topical and geographic
+    subdivisions may be followed by anything, chronological ones only by
+    topical or form subdivisions, form subdivisions only by other forms).
+    Segments missing from the lists are not held to the grammar.
+
+    Malformed headings are repaired when the fix is unambiguous: empty and
+    repeated segments are dropped, near-misses of listed subdivisions are
+    corrected, form subdivisions are moved to the end when every segment is
+    a listed one, and a heading that starts with a subdivision-only term is
+    rotated. Headings that still fail are rejected with a reason.
+    """
+    def __init__(self, entries: List[Tuple[str, int, bool]], close_match_cutoff: float = 0.85):
+        """
+        Compile the automaton
+
+        Args:
+            entries: Subdivisions as returned by ``read_subdivision_lists``
+            close_match_cutoff: Minimum difflib ratio to correct a misspelled subdivision
+        """
+        self.close_match_cutoff = close_match_cutoff
+        # Trie as parallel lists of transitions and kind bits per node
+        self._next: List[Dict[str, int]] = [{}]
+        self._kinds: List[int] = [0]
+        self._subdivision_only = set()
+        self._vocabulary: Dict[str, str] = {}
+
+        for label, kinds, main in entries:
+            key = heading_key(label)
+            node = 0
+            for char in key:
+                following = self._next[node].get(char)
+                if following is None:
+                    following = len(self._next)
+                    self._next[node][char] = following
+                    self._next.append({})
+                    self._kinds.append(0)
+                node = following
+            self._kinds[node] |= kinds
+            self._vocabulary.setdefault(key, label)
+            if not main:
+                self._subdivision_only.add(key)
+
+        # Unlisted segments are mostly the same few places and topics
+        self.close_match = lru_cache(maxsize=4096)(self._close_match)
+
+    @classmethod
+    def from_path(cls, path: Optional[str] = None, **kwargs) -> "SubdivisionAutomaton":
+        """
+        Compile the automaton from a lists file, by default the bundled one
+        """
+        return cls(read_subdivision_lists(path or DEFAULT_LISTS_PATH), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._vocabulary)
+
+    def scan(self, key: str) -> Tuple[List[str], List[int], int]:
+        """
+        Run a folded term through the trie and the grammar in one pass
+
+        Args:
+            key: Folded term, see ``heading_key``
+
+        Returns:
+            Tuple of (segments, kind bits of each segment, index of the first
+            segment the grammar rejects or -1). The main heading's kind is 0.
+        """
+        segments: List[str] = []
+        kinds: List[int] = []
+        states = MAIN
+        failed = -1
+        node = 0
+        start = 0
+        position = 0
+        length = len(key)
+
+        while position <= length:
+            at_separator = key.startswith("--", position)
+            if position < length and not at_separator:
+                if node >= 0:
+                    node = self._next[node].get(key[position], -1)
+                position += 1
+                continue
+
+            segment = key[start:position].strip()
+            if not segments:
+                kind = 0
+            elif node >= 0 and self._kinds[node]:
+                kind = self._kinds[node]
+            elif is_chronological(segment):
+                kind = CHRONOLOGICAL
+            else:
+                kind = UNLISTED
+            segments.append(segment)
+            kinds.append(kind)
+
+            if len(segments) > 1 and failed < 0:
+                # A segment of several possible kinds keeps every state it allows
+                allowed = 0
+                for state in ALLOWED:
+                    if states & state:
+                        allowed |= ALLOWED[state]
+                states = allowed if kind == UNLISTED else kind & allowed
+                if not states:
+                    failed = len(segments) - 1
+
+            position += 2
+            start = position
+            node = 0
+        return segments, kinds, failed
+
+    def _close_match(self, segment_key: str) -> str:
+        """
+        Get the listed subdivision a folded segment is a likely misspelling of
+        """
+        matches = difflib.get_close_matches(segment_key, self._vocabulary, n=1, cutoff=self.close_match_cutoff)
+        return self._vocabulary[matches[0]] if matches else ""
+
+    def check(self, term: str) -> Dict[str, Any]:
+        """
+        Check a term and repair it where possible
+
+        Args:
+            term: Term as suggested by the model
+
+        Returns:
+            Dictionary with ``status`` ("valid", "repaired" or "rejected"),
+            the ``term`` to look up, the ``repairs`` applied and, when
+            rejected, the ``reason``
+        """
+        # Fast path: one scan of the folded term settles well-formed headings
+        found, kinds, failed = self.scan(heading_key(term))
+        if (failed < 0 and all(found) and UNLISTED not in kinds[1:]
+                and found[0] not in self._subdivision_only and not is_chronological(found[0])
+                and all(found[i] != found[i - 1] for i in range(1, len(found)))):
+            return {"status": "valid", "term": term, "repairs": []}
+
+        segments = heading_segments(term)
+        repairs: List[str] = []
+
+        kept = [segment for segment in segments if segment]
+        if len(kept) < len(segments):
+            repairs.append("dropped empty segments")
+        segments = [segment for i, segment in enumerate(kept)
+                    if i == 0 or heading_key(segment) != heading_key(kept[i - 1])]
+        if len(segments) < len(kept):
+            repairs.append("dropped repeated segments")
+        if not segments:
+            return {"status": "rejected", "term": term, "repairs": repairs, "reason": "empty heading"}
+
+        key = "--".join(heading_key(segment) for segment in segments)
+        found, kinds, failed = self.scan(key)
+
+        if is_chronological(found[0]):
+            return {"status": "rejected", "term": term, "repairs": repairs,
+                    "reason": f"chronological subdivision '{segments[0]}' used as a main heading"}
+
+        if found[0] in self._subdivision_only:
+            if len(segments) > 1 and found[1] not in self._subdivision_only and kinds[1] & GEOGRAPHIC:
+                repairs.append(f"moved '{segments[0]}' after '{segments[1]}'")
+                segments = [segments[1], segments[0]] + segments[2:]
+            else:
+                return {"status": "rejected", "term": term, "repairs": repairs,
+                        "reason": f"'{segments[0]}' is only used as a subdivision"}
+
+        # Listed spellings and corrections of near-misses
+        for i in range(1, len(segments)):
+            segment_key = heading_key(segments[i])
+            if segment_key in self._vocabulary:
+                segments[i] = self._vocabulary[segment_key]
+            elif kinds[i] == UNLISTED and len(segment_key) >= MIN_CORRECTION_LENGTH:
+                correction = self.close_match(segment_key)
+                if correction:
+                    repairs.append(f"corrected '{segments[i]}' to '{correction}'")
+                    segments[i] = correction
+
+        key = "--".join(heading_key(segment) for segment in segments)
+        found, kinds, failed = self.scan(key)
+        if failed >= 0 and UNLISTED not in kinds[1:]:
+            # Form subdivisions come last; with an unlisted segment the right order is unknown
+            forms = [i for i in range(1, failed) if kinds[i] == FORM]
+            if forms:
+                moved = [segments[i] for i in forms]
+                segments = [segment for i, segment in enumerate(segments) if i not in forms] + moved
+                repairs.append(f"moved form subdivisions {', '.join(moved)} to the end")
+                found, kinds, failed = self.scan("--".join(heading_key(segment) for segment in segments))
+
+        if failed >= 0:
+            return {"status": "rejected", "term": term, "repairs": repairs,
+                    "reason": f"'{segments[failed]}' cannot follow '{segments[failed - 1]}'"}
+
+        repaired = "--".join(segments)
+        if repairs:
+            return {"status": "repaired", "term": repaired, "repairs": repairs}
+        return {"status": "valid", "term": term, "repairs": []}
+
+
+class PreValidatingLCSHApi:
+    """
+    LCSH API client that checks compound headings locally before any lookup
+
+    Has the same ``get_recommendations`` contract as ``LCSHApi``. Malformed
+    terms are repaired before they are sent on, and terms that cannot be
+    repaired never leave the process: they are reported under ``rejected``
+    next to the recommendations, and a request whose terms are all rejected
+    makes no upstream call at all.
+    """
+    def __init__(self, api, automaton: SubdivisionAutomaton):
+        """
+        Initialize the pre-validating client
+
+        Args:
+            api: Client to send valid and repaired terms to
+            automaton: Compiled subdivision automaton
+        """
+        self.api = api
+        self.automaton = automaton
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "terms": 0,
+            "repaired": 0,
+            "rejected": 0,
+            "upstream_calls_avoided": 0,
+            "upstream_terms_avoided": 0,
+        }
+
+    @property
+    def routes_tags(self) -> bool:
+        return getattr(self.api, "routes_tags", False)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get pre-validation metrics
+
+        Returns:
+            Dictionary with request, term, repair and rejection counts, and
+            the upstream work saved: ``upstream_terms_avoided`` counts every
+            rejected term kept out of an upstream request, and
+            ``upstream_calls_avoided`` the requests whose terms were all
+            rejected, so that no upstream call was made at all
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["subdivisions"] = len(self.automaton)
+        stats["api"] = self.api.stats()
+        return stats
+
+    def get_recommendations(self, terms: Union[List[str], str], tags: Optional[List] = None) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+            tags: MARC field each term came from, passed on with the accepted
+                terms when the wrapped client routes by field
+
+        Returns:
+            Dictionary containing the recommendations, plus ``repaired`` and
+            ``rejected`` lists when any term was repaired or rejected
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+
+        checks = [self.automaton.check(term) for term in terms]
+        accepted = [check["term"] for check in checks if check["status"] != "rejected"]
+        rejected = [{"term": term, "reason": check["reason"]}
+                    for term, check in zip(terms, checks) if check["status"] == "rejected"]
+        repaired = [{"term": term, "repaired": check["term"], "repairs": check["repairs"]}
+                    for term, check in zip(terms, checks) if check["status"] == "repaired"]
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["terms"] += len(terms)
+            self._stats["repaired"] += len(repaired)
+            self._stats["rejected"] += len(rejected)
+            self._stats["upstream_terms_avoided"] += len(rejected)
+            if not accepted:
+                self._stats["upstream_calls_avoided"] += 1
+
+        if not accepted:
+            result = {"recommendations": []}
+        elif tags and self.routes_tags:
+            accepted_tags = [tag for tag, check in zip(tags, checks) if check["status"] != "rejected"]
+            result = self.api.get_recommendations(accepted, tags=accepted_tags)
+        else:
+            result = self.api.get_recommendations(accepted)
+        if repaired:
+            result["repaired"] = repaired
+        if rejected:
+            result["rejected"] = rejected
+        return result
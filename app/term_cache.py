@@ -0,0 +1,275 @@
+"""
+Term Cache Module - Caches LCSH validation results per term
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Union, Optional, Iterable
+
+from app.lcsh_api import TermFetcher, merge_term_results
+from app.normalize import normalize_term
+
+class TermCache:
+    """
+    Two-tier cache of per-term validation results
+
+    The first tier is a bounded in-process LRU. The optional second tier is a
+    SQLite database that every worker process on the host can share. Entries
+    are either ``{"recommendations": [...]}`` or, for failed lookups,
+    ``{"error": "..."}``; failures are kept for a much shorter TTL so a
+    flapping upstream is not hammered but recovers quickly.
+    """
+    def __init__(self,
+                 max_entries: int = 4096,
+                 ttl: float = 7 * 24 * 3600,
+                 negative_ttl: float = 30.0,
+                 db_path: Optional[str] = None):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl: Seconds a successful lookup stays valid
+            negative_ttl: Seconds a failed lookup stays valid
+            db_path: Path of the SQLite database for the shared tier, or None
+                to cache in memory only
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._local = threading.local()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+        if db_path:
+            directory = os.path.dirname(os.path.abspath(db_path))
+            os.makedirs(directory, exist_ok=True)
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS term_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, expires_at: float, entry: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        self._memory[key] = (expires_at, entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up cached entries
+
+        Args:
+            keys: Normalized term keys
+
+        Returns:
+            Dictionary of the keys that were found and still valid
+        """
+        now = time.time()
+        found = {}
+        missing = []
+
+        with self._lock:
+            for key in keys:
+                item = self._memory.get(key)
+                if item is not None and item[0] <= now:
+                    del self._memory[key]
+                    self._stats["expirations"] += 1
+                    item = None
+                if item is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = item[1]
+                self._stats["memory_hits"] += 1
+                if "error" in item[1]:
+                    self._stats["negative_hits"] += 1
+
+        if missing and self.db_path:
+            placeholders = ",".join("?" * len(missing))
+            conn = self._connection()
+            rows = conn.execute(
+                f"SELECT key, value, expires_at FROM term_cache WHERE key IN ({placeholders})",
+                missing
+            ).fetchall()
+            expired = [key for key, _, expires_at in rows if expires_at <= now]
+            if expired:
+                with conn:
+                    conn.execute(
+                        f"DELETE FROM term_cache WHERE key IN ({','.join('?' * len(expired))}) "
+                        "AND expires_at <= ?",
+                        [*expired, now]
+                    )
+
+            with self._lock:
+                self._stats["expirations"] += len(expired)
+                for key, value, expires_at in rows:
+                    if expires_at <= now:
+                        continue
+                    entry = json.loads(value)
+                    found[key] = entry
+                    self._remember(key, expires_at, entry)
+                    self._stats["disk_hits"] += 1
+                    if "error" in entry:
+                        self._stats["negative_hits"] += 1
+
+        with self._lock:
+            self._stats["misses"] += sum(1 for key in missing if key not in found)
+        return found
+
+    def put_many(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Store entries in both tiers
+
+        Args:
+            entries: Entries by normalized term key
+        """
+        if not entries:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, entry in entries.items():
+                ttl = self.negative_ttl if "error" in entry else self.ttl
+                self._remember(key, now + ttl, entry)
+                rows.append((key, json.dumps(entry), now + ttl))
+            self._stats["stores"] += len(rows)
+
+        if self.db_path:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO term_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    rows
+                )
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired entries from both tiers
+
+        Returns:
+            Number of entries deleted
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._memory.items() if expires_at <= now]
+            for key in expired:
+                del self._memory[key]
+            purged = len(expired)
+
+        if self.db_path:
+            conn = self._connection()
+            with conn:
+                purged += conn.execute("DELETE FROM term_cache WHERE expires_at <= ?", (now,)).rowcount
+
+        with self._lock:
+            self._stats["expirations"] += purged
+        return purged
+
+    def clear(self) -> None:
+        """
+        Drop every entry from both tiers
+        """
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM term_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss/eviction counters
+
+        Returns:
+            Dictionary of counters and the current in-memory size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+class CachedLCSHApi:
+    """
+    LCSH API client that answers repeated terms from a ``TermCache``
+
+    Has the same ``get_recommendations`` contract as ``LCSHApi``. Only the
+    terms missing from the cache are sent upstream, in a single request, and
+    the results are merged back in the caller's term order. A response that
+    does not echo its terms is not split by guesswork; see ``TermFetcher``
+    for how such an upstream is queried, so nothing is cached under the
+    wrong term.
+    """
+    def __init__(self, api, cache: TermCache):
+        """
+        Initialize the cached client
+
+        Args:
+            api: Client to send cache misses to, e.g. an ``LCSHApi``
+            cache: Cache to read and populate
+        """
+        self.api = api
+        self.cache = cache
+        self._fetcher = TermFetcher(api)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache": self.cache.stats(), "api": self.api.stats()}
+
+    def get_recommendations(self, terms: Union[List[str], str]) -> Dict[str, Any]:
+        """
+        Get LCSH recommendations for the given terms
+
+        Args:
+            terms: A single term or list of terms to get recommendations for
+
+        Returns:
+            Dictionary containing the recommendations
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+
+        # One entry per distinct key, keeping the first spelling seen
+        unique = {}
+        for term in terms:
+            unique.setdefault(normalize_term(term), term)
+
+        entries = self.cache.get_many(unique.keys())
+        missing = [key for key in unique if key not in entries]
+
+        if missing:
+            missing_terms = [unique[key] for key in missing]
+            fetched = dict(zip(missing, self._fetcher.fetch(missing_terms)))
+            self.cache.put_many(fetched)
+            entries.update(fetched)
+
+        return merge_term_results([entries[key] for key in unique], list(unique.values()))
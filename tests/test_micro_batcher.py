@@ -0,0 +1,35 @@
+from app.micro_batcher import MicroBatchingLCSHApi
+from app.single_flight import CoalescingLCSHApi
+
+from tests.test_term_fetcher import FakeApi
+
+
+def test_bypass_sends_single_term_requests_and_echoes_terms():
+    api = FakeApi(echo=False)
+    batcher = MicroBatchingLCSHApi(api, max_wait=0.001)
+    try:
+        first = batcher.get_recommendations(["Cats", "Dogs"])
+        assert [rec["term"] for rec in first["recommendations"]] == ["Cats (heading)", "Dogs (heading)"]
+        assert not batcher.stats()["demultiplexes"]
+
+        api.requests.clear()
+        # The layer above splits the bypassed response without a second round of requests
+        coalescing = CoalescingLCSHApi(batcher)
+        result = coalescing.get_recommendations(["Birds", "Fish"])
+        assert sorted(api.requests) == [["Birds"], ["Fish"]]
+        assert [rec["query"] for rec in result["recommendations"]] == ["Birds", "Fish"]
+        assert batcher.stats()["bypassed"] == 1
+    finally:
+        batcher.close()
+
+
+def test_echoing_upstream_keeps_batching():
+    api = FakeApi(echo=True)
+    batcher = MicroBatchingLCSHApi(api, max_wait=0.001)
+    try:
+        result = batcher.get_recommendations(["Cats", "Dogs"])
+        assert api.requests == [["Cats", "Dogs"]]
+        assert [rec["query"] for rec in result["recommendations"]] == ["Cats", "Dogs"]
+        assert batcher.stats()["demultiplexes"]
+    finally:
+        batcher.close()
@@ -0,0 +1,86 @@
+import pytest
+
+from app.authority.builder import build_index
+from app.authority.heading_table import HeadingTable
+from app.authority.ingest import open_headings, write_headings
+from app.authority.names import NO_YEAR_HI, NO_YEAR_LO, LIFESPAN, NameIndex, parse_dates, parse_personal_name
+from app.authority.records import AuthorityRecord
+
+NAMES = "http://id.loc.gov/authorities/names/"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1892-1973", (1892, 1892, 1973, 1973)),
+    ("1950-", (1950, 1950, NO_YEAR_LO, NO_YEAR_HI)),
+    ("-1912", (NO_YEAR_LO, NO_YEAR_HI, 1912, 1912)),
+    ("b. 1950", (1950, 1950, NO_YEAR_LO, NO_YEAR_HI)),
+    ("born 1950", (1950, 1950, NO_YEAR_LO, NO_YEAR_HI)),
+    ("d. 1616", (NO_YEAR_LO, NO_YEAR_HI, 1616, 1616)),
+    ("died 1616", (NO_YEAR_LO, NO_YEAR_HI, 1616, 1616)),
+    ("1868 or 1869-1912", (1868, 1869, 1912, 1912)),
+    ("ca. 1450-1500", (1440, 1460, 1500, 1500)),
+    ("1868?-1912", (1867, 1869, 1912, 1912)),
+    ("551-479 B.C.", (-551, -551, -479, -479)),
+    ("fl. 12th cent.", (1101 - LIFESPAN, 1200, 1101, 1200 + LIFESPAN)),
+    ("active 1950s", (1950 - LIFESPAN, 1959, 1950, 1959 + LIFESPAN)),
+])
+def test_parse_dates(text, expected):
+    assert parse_dates(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "Hamlet", "12 angry men x"])
+def test_parse_dates_rejects_non_dates(text):
+    assert parse_dates(text) is None
+
+
+def test_parse_personal_name():
+    name = parse_personal_name("Tolkien, J. R. R. (John Ronald Reuel), 1892-1973")
+    assert (name.surname, name.given, name.fuller) == ("tolkien", "j. r. r.", "john ronald reuel")
+    assert name.dates == (1892, 1892, 1973, 1973)
+    # Name-title headings and subdivided headings are not plain names
+    assert parse_personal_name("Shakespeare, William, 1564-1616. Hamlet") is None
+    assert parse_personal_name("Lincoln, Abraham, 1809-1865--Assassination") is None
+
+
+@pytest.fixture(scope="module")
+def names(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("names")
+    records = [
+        AuthorityRecord(uri=NAMES + "n1", label="Tolkien, J. R. R. (John Ronald Reuel), 1892-1973", tag=600),
+        AuthorityRecord(uri=NAMES + "n2", label="Smith, John, 1580-1631", tag=600),
+        AuthorityRecord(uri=NAMES + "n3", label="Smith, John, 1938-", tag=600),
+        AuthorityRecord(uri=NAMES + "n4", label="Mao, Zedong, 1893-1976", variants=["Mao, Tse-tung, 1893-1976"],
+                        tag=600),
+    ]
+    headings = str(directory / "headings.tsv")
+    with open_headings(headings, "w") as output:
+        write_headings(records, output)
+    index = str(directory / "index")
+    build_index(headings, index)
+    table = HeadingTable(index)
+    return NameIndex(index, table), table
+
+
+def best_label(names, term):
+    index, table = names
+    found = index.match(term)
+    return table.label(found[0][0]) if found else None
+
+
+def test_name_index_matches_forms_of_a_name(names):
+    assert best_label(names, "Tolkien, J. R. R.") == "Tolkien, J. R. R. (John Ronald Reuel), 1892-1973"
+    assert best_label(names, "Tolkien, John Ronald Reuel, 1892-1973") == \
+        "Tolkien, J. R. R. (John Ronald Reuel), 1892-1973"
+    assert best_label(names, "Mao Zedong") == "Mao, Zedong, 1893-1976"
+    assert best_label(names, "Mao, Tse-tung") == "Mao, Zedong, 1893-1976"
+
+
+def test_dates_tell_namesakes_apart(names):
+    assert best_label(names, "Smith, John, 1580-1631") == "Smith, John, 1580-1631"
+    assert best_label(names, "Smith, John, b. 1938") == "Smith, John, 1938-"
+    assert best_label(names, "Smith, John, ca. 1590-1631") == "Smith, John, 1580-1631"
+
+
+def test_other_people_are_not_matched(names):
+    assert best_label(names, "Smith, John, 1700-1750") is None
+    assert best_label(names, "Tolkien, Christopher") is None
@@ -0,0 +1,85 @@
+from app.authority.heading_table import HeadingTable
+from app.authority.records import AuthorityRecord, iter_ntriples_records
+
+MADS = "http://www.loc.gov/mads/rdf/v1#"
+SKOS = "http://www.w3.org/2004/02/skos/core#"
+SH = "http://id.loc.gov/authorities/subjects/"
+
+
+def triple(subject, predicate, obj):
+    subject = subject if subject.startswith("_:") else f"<{subject}>"
+    return f"{subject} <{predicate}> {obj} .\n"
+
+
+def test_detour_into_a_linked_heading_does_not_split_the_record():
+    lines = [
+        triple(SH + "sh1", MADS + "authoritativeLabel", '"Cats"'),
+        triple(SH + "sh1", MADS + "hasBroaderAuthority", f"<{SH}sh2>"),
+        triple(SH + "sh2", MADS + "authoritativeLabel", '"Felidae"'),
+        triple(SH + "sh1", MADS + "hasVariant", "_:b1"),
+        triple("_:b1", MADS + "variantLabel", '"House cats"'),
+        triple(SH + "sh1", MADS + "hasVariant", "_:b2"),
+        triple(SH + "sh1", "http://www.w3.org/1999/02/22-rdf-syntax-ns#type", f"<{MADS}Topic>"),
+    ]
+    # The label of the second variant comes after the record has moved on
+    lines.append(triple("_:b2", MADS + "variantLabel", '"Domestic cats"'))
+
+    records = {record.uri: record for record in iter_ntriples_records(lines)}
+
+    cats = records[SH + "sh1"]
+    assert cats.label == "Cats"
+    assert cats.variants == ["House cats", "Domestic cats"]
+    assert cats.broader == [SH + "sh2"]
+    assert cats.tag == 650
+    assert records[SH + "sh2"].label == "Felidae"
+
+
+def test_blank_node_labels_read_before_their_link_are_attached():
+    lines = [
+        triple(SH + "sh1", SKOS + "prefLabel", '"Dogs"'),
+        triple("_:b1", MADS + "variantLabel", '"Canis familiaris"'),
+        triple(SH + "sh1", MADS + "hasVariant", "_:b1"),
+    ]
+    [record] = iter_ntriples_records(lines)
+    assert record.variants == ["Canis familiaris"]
+
+
+def test_unlinked_blank_nodes_are_dropped_with_their_block():
+    lines = []
+    for i in range(200):
+        uri = f"{SH}sh{i}"
+        lines.append(triple(uri, MADS + "authoritativeLabel", f'"Heading {i}"'))
+        lines.append(triple(uri, MADS + "componentList", f"_:c{i}"))
+        lines.append(triple(f"_:c{i}", MADS + "authoritativeLabel", f'"Component {i}"'))
+
+    records = list(iter_ntriples_records(lines, window=4))
+
+    assert len(records) == 200
+    assert all(record.variants == [] for record in records)
+
+
+def test_parts_of_a_uri_far_apart_are_merged_by_the_heading_table(tmp_path):
+    lines = [triple(SH + "sh1", MADS + "authoritativeLabel", '"Cats"')]
+    for i in range(2, 10):
+        lines.append(triple(f"{SH}sh{i}", MADS + "authoritativeLabel", f'"Heading {i}"'))
+    # A linked heading's label is also written where it is linked from
+    lines.append(triple(SH + "sh1", MADS + "authoritativeLabel", '"Cats"'))
+    lines.append(triple(SH + "sh1", MADS + "variantLabel", '"House cats"'))
+
+    records = list(iter_ntriples_records(lines, window=2))
+    assert [record.uri for record in records].count(SH + "sh1") == 2
+
+    HeadingTable.build(records, str(tmp_path))
+    table = HeadingTable(str(tmp_path))
+    assert len(table) == 9
+    row = table.find("Cats")
+    assert table.uri(row) == SH + "sh1"
+    assert table.find_variant("House cats") == row
+
+
+def test_merge_keeps_the_first_label_and_tag():
+    record = AuthorityRecord(uri=SH + "sh1", label="Cats", variants=["House cats"])
+    record.merge(AuthorityRecord(uri=SH + "sh1", label="", variants=["House cats", "Felis catus"], tag=650))
+    assert record.label == "Cats"
+    assert record.tag == 650
+    assert record.variants == ["House cats", "Felis catus"]
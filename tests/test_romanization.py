@@ -0,0 +1,58 @@
+import pytest
+
+from app.authority.builder import build_index
+from app.authority.ingest import open_headings, write_headings
+from app.authority.records import AuthorityRecord
+from app.local_lcsh_api import ROMANIZATION_MATCH_SCORE, LocalLCSHApi, SegmentedLCSHApi
+from app.normalize import is_east_asian, romanization_key
+
+NAMES = "http://id.loc.gov/authorities/names/"
+SH = "http://id.loc.gov/authorities/subjects/"
+
+RECORDS = [
+    AuthorityRecord(uri=NAMES + "n1", label="Pʻyŏngyang (Korea)", variants=["평양"], tag=651),
+    AuthorityRecord(uri=NAMES + "n2", label="Tokyo (Japan)", variants=["東京"], tag=651),
+    AuthorityRecord(uri=SH + "sh1", label="God", tag=650),
+    AuthorityRecord(uri=SH + "sh2", label="Mon (Southeast Asian people)", tag=650),
+    AuthorityRecord(uri=SH + "sh3", label="Oilpollution", tag=650),
+]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("romanized")
+    headings = str(directory / "headings.tsv")
+    with open_headings(headings, "w") as output:
+        write_headings(RECORDS, output)
+    build_index(headings, str(directory / "index"))
+    return str(directory / "index")
+
+
+def test_romanizations_share_a_key():
+    assert romanization_key("Pʻyŏngyang") == romanization_key("Pyeongyang") == romanization_key("pyongyang")
+    assert romanization_key("Tōkyō") == romanization_key("Toukyou")
+
+
+def test_east_asian_labels():
+    assert all(map(is_east_asian, ["東京", "서울", "Pʻyŏngyang (Korea)", "Tōkyō (Japan)"]))
+    assert not any(map(is_east_asian, ["Good", "Moon", "Oil pollution"]))
+
+
+def test_romanized_and_original_script_terms_match_below_the_verified_score(index):
+    api = LocalLCSHApi.from_path(index)
+    for term, row_label in [("Pyeongyang (Korea)", "Pʻyŏngyang (Korea)"), ("Toukyou (Japan)", "Tokyo (Japan)"),
+                            ("東 京", "Tokyo (Japan)")]:
+        [(row, score)] = api.exact_match(term)
+        assert api.table.label(row) == row_label
+        assert score == ROMANIZATION_MATCH_SCORE < 0.85
+
+
+@pytest.mark.parametrize("term", ["Good", "Moon (Southeast Asian people)", "Oil pollution"])
+def test_latin_terms_do_not_collide_with_other_headings(index, term):
+    api = LocalLCSHApi.from_path(index)
+    assert api.exact_match(term) == []
+    assert SegmentedLCSHApi(index).resolve(term) is None
+
+
+def test_resolve_rewrites_romanizations_to_the_authorized_form(index):
+    assert SegmentedLCSHApi(index).resolve("Pyeongyang (Korea)") == "Pʻyŏngyang (Korea)"
@@ -0,0 +1,54 @@
+from app.authority.builder import build_index
+from app.authority.heading_table import HeadingTable
+from app.authority.ingest import open_headings, read_headings, write_headings
+from app.authority.records import iter_ntriples_records
+from app.authority.semantic import HashingEmbedder, SemanticIndex, scope_note_text
+
+SH = "http://id.loc.gov/authorities/subjects/"
+MADS = "http://www.loc.gov/mads/rdf/v1#"
+SKOS = "http://www.w3.org/2004/02/skos/core#"
+
+DUMP = [
+    f'<{SH}sh1> <{MADS}authoritativeLabel> "Motion pictures" .\n',
+    f'<{SH}sh1> <{MADS}note> "Here are entered works on films, movies and cinema in general." .\n',
+    f'<{SH}sh2> <{SKOS}prefLabel> "Cats" .\n',
+    f'<{SH}sh2> <{SKOS}scopeNote> "Here are entered works on domestic felines kept as pets." .\n',
+    f'<{SH}sh3> <{MADS}authoritativeLabel> "Dogs" .\n',
+]
+
+
+def build(tmp_path):
+    headings = str(tmp_path / "headings.tsv")
+    with open_headings(headings, "w") as output:
+        write_headings(iter_ntriples_records(DUMP), output)
+    index = str(tmp_path / "index")
+    build_index(headings, index)
+    return headings, index
+
+
+def test_scope_notes_are_carried_into_the_heading_table(tmp_path):
+    headings, index = build(tmp_path)
+
+    notes = {record.label: record.note for record in read_headings(headings)}
+    assert notes["Cats"] == "Here are entered works on domestic felines kept as pets."
+    assert notes["Dogs"] == ""
+
+    table = HeadingTable(index)
+    assert table.note(table.find("Motion pictures")).startswith("Here are entered works on films")
+    assert table.note(table.find("Dogs")) == ""
+
+
+def test_scope_note_text_drops_the_stock_opening():
+    assert scope_note_text("Here are entered works on films, movies and cinema.") == "films, movies and cinema."
+    assert scope_note_text("Use for works on cats.") == "Use for works on cats."
+
+
+def test_paraphrase_found_through_the_scope_note(tmp_path):
+    _, index = build(tmp_path)
+    table = HeadingTable(index)
+    stats = SemanticIndex.build(table, index, HashingEmbedder())
+    assert stats["notes"] == 2
+
+    semantic = SemanticIndex(index, table)
+    [(row, _), *_] = semantic.search(["domestic felines"], k=3)[0]
+    assert table.label(row) == "Cats"
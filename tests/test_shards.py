@@ -0,0 +1,54 @@
+from app.authority.ingest import open_headings, read_headings, write_headings
+from app.authority.records import AuthorityRecord
+from app.authority.shards import ingest_parallel, merge_partials, sort_key
+
+SH = "http://id.loc.gov/authorities/subjects/"
+MADS = "http://www.loc.gov/mads/rdf/v1#"
+
+
+def write_partial(path, records):
+    with open_headings(str(path), "w") as output:
+        write_headings(sorted(records, key=sort_key), output)
+    return str(path)
+
+
+def test_parts_of_a_record_are_merged_whatever_their_label_and_tag(tmp_path):
+    first = write_partial(tmp_path / "a.tsv", [
+        AuthorityRecord(uri=SH + "sh1", label="Texas", variants=["Tejas"]),
+        AuthorityRecord(uri=SH + "sh3", label="Cats"),
+    ])
+    second = write_partial(tmp_path / "b.tsv", [
+        AuthorityRecord(uri=SH + "sh1", label="", variants=["Tex."], broader=[SH + "sh2"], tag=651),
+        AuthorityRecord(uri=SH + "sh2", label="Southwest, New", tag=651),
+    ])
+    output = str(tmp_path / "merged.tsv")
+
+    assert merge_partials([first, second], output) == 3
+
+    records = {record.uri: record for record in read_headings(output)}
+    texas = records[SH + "sh1"]
+    assert texas.label == "Texas"
+    assert texas.tag == 651
+    assert texas.variants == ["Tejas", "Tex."]
+    assert texas.broader == [SH + "sh2"]
+
+
+def test_parallel_ingest_matches_a_record_split_by_a_detour(tmp_path):
+    lines = []
+    for i in range(200):
+        uri = f"<{SH}sh{i}>"
+        lines.append(f'{uri} <{MADS}authoritativeLabel> "Heading {i}" .\n')
+        lines.append(f"{uri} <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <{MADS}Topic> .\n")
+        # Every record also states the label of the one before it
+        if i:
+            lines.append(f'<{SH}sh{i - 1}> <{MADS}authoritativeLabel> "Heading {i - 1}" .\n')
+    dump = tmp_path / "dump.nt"
+    dump.write_text("".join(lines), encoding="utf-8")
+    output = str(tmp_path / "headings.tsv")
+
+    stats = ingest_parallel([str(dump)], output, workers=2)
+
+    records = list(read_headings(output))
+    assert stats["shards"] > 1
+    assert len(records) == len({record.uri for record in records}) == 200
+    assert all(record.tag == 650 for record in records)
@@ -0,0 +1,55 @@
+import pytest
+
+from app.subdivisions import PreValidatingLCSHApi, SubdivisionAutomaton
+
+from tests.test_term_fetcher import FakeApi
+
+
+@pytest.fixture(scope="module")
+def automaton():
+    return SubdivisionAutomaton.from_path()
+
+
+@pytest.mark.parametrize("heading", [
+    "Chinese language--Dictionaries--English",
+    "French language--Dictionaries--German",
+    "United States--History--Civil War, 1861-1865--Personal narratives",
+    "World War, 1939-1945--Campaigns--France--Maps",
+    "Education--Texas--History--20th century",
+    "Japan--Description and travel--Guidebooks",
+    "Cats--Behavior--Juvenile literature",
+    "Physics--Periodicals--Bibliography",
+])
+def test_valid_headings_are_left_alone(automaton, heading):
+    assert automaton.check(heading) == {"status": "valid", "term": heading, "repairs": []}
+
+
+def test_form_subdivision_is_moved_after_listed_topical_one(automaton):
+    check = automaton.check("Cats--Juvenile literature--History")
+    assert check["status"] == "repaired"
+    assert check["term"] == "Cats--History--Juvenile literature"
+
+
+def test_no_reorder_is_guessed_around_an_unlisted_segment(automaton):
+    check = automaton.check("Cats--Dictionaries--History--Texas")
+    assert check["status"] == "rejected"
+
+
+def test_repairs(automaton):
+    assert automaton.check("Cats--Histroy--Periodicals")["term"] == "Cats--History--Periodicals"
+    assert automaton.check("Cats----History--History")["term"] == "Cats--History"
+    assert automaton.check("Administration--France")["term"] == "France--Administration"
+    assert automaton.check("1900-1950--Cats")["status"] == "rejected"
+
+
+def test_rejected_terms_stay_out_of_upstream_requests(automaton):
+    api = FakeApi(echo=True)
+    client = PreValidatingLCSHApi(api, automaton)
+
+    result = client.get_recommendations(["1900-1950--Cats", "Chinese language--Dictionaries--English"])
+
+    assert api.requests == [["Chinese language--Dictionaries--English"]]
+    assert [item["term"] for item in result["rejected"]] == ["1900-1950--Cats"]
+    stats = client.stats()
+    assert stats["upstream_terms_avoided"] == 1
+    assert stats["upstream_calls_avoided"] == 0
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from app.lcsh_api import TermFetcher
+from app.single_flight import CoalescingLCSHApi
+from app.term_cache import TermCache, CachedLCSHApi
+
+
+class FakeApi:
+    """Upstream answering each term with one recommendation"""
+    def __init__(self, echo: bool, delay: float = 0.0):
+        self.echo = echo
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.peak_in_flight = 0
+
+    def stats(self):
+        return {}
+
+    def get_recommendations(self, terms):
+        with self._lock:
+            self.requests.append(list(terms))
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self._in_flight -= 1
+        recommendations = []
+        for term in terms:
+            rec = {"term": f"{term} (heading)", "similarity_score": 0.9}
+            if self.echo:
+                rec["query"] = term
+            recommendations.append(rec)
+        return {"recommendations": recommendations}
+
+
+def test_echoing_upstream_is_batched():
+    api = FakeApi(echo=True)
+    fetcher = TermFetcher(api)
+
+    entries = fetcher.fetch(["Cats", "Dogs"])
+
+    assert api.requests == [["Cats", "Dogs"]]
+    assert [entry["recommendations"][0]["term"] for entry in entries] == ["Cats (heading)", "Dogs (heading)"]
+    assert fetcher.demultiplexes
+
+
+def test_non_echoing_upstream_switches_to_concurrent_single_term_requests():
+    api = FakeApi(echo=False, delay=0.05)
+    fetcher = TermFetcher(api)
+
+    first = fetcher.fetch(["Cats", "Dogs"])
+    assert [entry["recommendations"][0]["term"] for entry in first] == ["Cats (heading)", "Dogs (heading)"]
+    assert not fetcher.demultiplexes
+
+    api.requests.clear()
+    api.peak_in_flight = 0
+    second = fetcher.fetch(["Birds", "Fish", "Frogs"])
+
+    # No batch is sent once the upstream is known not to echo its terms
+    assert sorted(api.requests) == [["Birds"], ["Fish"], ["Frogs"]]
+    assert api.peak_in_flight > 1
+    assert [entry["recommendations"][0]["term"] for entry in second] == [
+        "Birds (heading)", "Fish (heading)", "Frogs (heading)"]
+
+
+def test_cached_stack_caches_each_term_under_its_own_key():
+    api = FakeApi(echo=False)
+    cached = CachedLCSHApi(CoalescingLCSHApi(api), TermCache())
+
+    result = cached.get_recommendations(["Cats", "Dogs"])
+    assert [rec["term"] for rec in result["recommendations"]] == ["Cats (heading)", "Dogs (heading)"]
+
+    api.requests.clear()
+    result = cached.get_recommendations(["Dogs"])
+    assert api.requests == []
+    assert [rec["term"] for rec in result["recommendations"]] == ["Dogs (heading)"]
@@ -0,0 +1,86 @@
+import os
+
+from app.authority.builder import build_index
+from app.authority.ingest import open_headings, write_headings
+from app.authority.records import AuthorityRecord
+from app.authority.updates import apply_changes, compact, read_manifest, reset_manifest
+from app.local_lcsh_api import SegmentedLCSHApi
+
+SH = "http://id.loc.gov/authorities/subjects/"
+
+BASE = [
+    AuthorityRecord(uri=SH + "sh1", label="Motion pictures", variants=["Films"], tag=650),
+    AuthorityRecord(uri=SH + "sh2", label="Motion picture music", tag=650),
+    AuthorityRecord(uri=SH + "sh3", label="Cats", variants=["House cats"], tag=650),
+    AuthorityRecord(uri=SH + "sh4", label="Dogs", tag=650),
+]
+
+
+def build(tmp_path, records=BASE):
+    headings = str(tmp_path / "headings.tsv")
+    with open_headings(headings, "w") as output:
+        write_headings(records, output)
+    index = str(tmp_path / "index")
+    build_index(headings, index)
+    reset_manifest(index, headings)
+    return index
+
+
+def test_segment_supersedes_changed_and_cancelled_headings(tmp_path):
+    index = build(tmp_path)
+    api = SegmentedLCSHApi(index, reload_interval=0)
+    assert api.authorized("Cats") is not None
+
+    apply_changes(index, [AuthorityRecord(uri=SH + "sh1", label="Motion picture films", tag=650)],
+                  cancelled=[SH + "sh3"])
+
+    assert api.authorized("Motion pictures") is None
+    assert api.authorized("Motion picture films")["url"] == SH + "sh1"
+    assert api.authorized("Cats") is None
+    assert api.authorized("Dogs")["url"] == SH + "sh4"
+
+
+def test_compact_keeps_only_current_headings(tmp_path):
+    index = build(tmp_path)
+    apply_changes(index, [AuthorityRecord(uri=SH + "sh1", label="Motion picture films", tag=650)])
+    apply_changes(index, [AuthorityRecord(uri=SH + "sh1", label="Films", tag=650)], cancelled=[SH + "sh4"])
+
+    stats = compact(index)
+
+    manifest = read_manifest(index)
+    assert manifest["segments"] == []
+    assert manifest["base"] == stats["base"]
+    assert not any(name.startswith("segment-") for name in os.listdir(index))
+    api = SegmentedLCSHApi(index, reload_interval=0)
+    assert api.authorized("Films")["url"] == SH + "sh1"
+    assert api.authorized("Motion picture films") is None
+    assert api.authorized("Dogs") is None
+    assert api.authorized("Cats")["url"] == SH + "sh3"
+
+
+def test_rebuild_removes_old_segments_so_updates_keep_working(tmp_path):
+    index = build(tmp_path)
+    apply_changes(index, [AuthorityRecord(uri=SH + "sh4", label="Puppies", tag=650)])
+
+    index = build(tmp_path)
+    assert not any(name.startswith("segment-") for name in os.listdir(index))
+    stats = apply_changes(index, [AuthorityRecord(uri=SH + "sh4", label="Hounds", tag=650)])
+
+    assert stats["segment"] == "segment-000001"
+    api = SegmentedLCSHApi(index, reload_interval=0)
+    assert api.authorized("Hounds") is not None
+    assert api.authorized("Puppies") is None
+
+
+def test_update_replaces_the_leftover_of_a_crashed_update(tmp_path):
+    index = build(tmp_path)
+    leftover = os.path.join(index, "segment-000001")
+    os.makedirs(leftover)
+    with open(os.path.join(leftover, "headings.tsv"), "w") as partial:
+        partial.write("lcsh:sh9\tHalf-written\n")
+
+    apply_changes(index, [AuthorityRecord(uri=SH + "sh4", label="Hounds", tag=650)])
+
+    api = SegmentedLCSHApi(index, reload_interval=0)
+    assert api.authorized("Hounds") is not None
+    assert api.authorized("Half-written") is None
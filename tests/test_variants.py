@@ -0,0 +1,54 @@
+import pytest
+
+from app.gemini_client import GeminiClient
+
+
+@pytest.fixture
+def client():
+    return GeminiClient("test-key", lcsh_api=object(), variants=None, clients=object())
+
+
+def test_rewrites_recommendation_lines_only(client):
+    text = ("1. **Motion pictures--History**\n"
+            "2. Motion pictures (see also Cinema)\n"
+            "Motion pictures are the subject of the whole book.")
+    resolved = [{"term": "Motion pictures", "authorized": "Films"}]
+    out = client.apply_resolved_variants(text, resolved, ["Motion pictures--History", "Motion pictures"])
+    assert out.split("\n") == ["1. **Films--History**",
+                               "2. Films (see also Cinema)",
+                               "Motion pictures are the subject of the whole book."]
+
+
+def test_matches_whole_terms(client):
+    text = "- Films\n- Filmstrips"
+    resolved = [{"term": "Films", "authorized": "Motion pictures"}]
+    out = client.apply_resolved_variants(text, resolved, ["Films", "Filmstrips"])
+    assert out == "- Motion pictures\n- Filmstrips"
+
+
+def test_rewrites_marc_subfield_a(client):
+    text = "650 _0 $a Motion pictures $x History."
+    resolved = [{"term": "Motion pictures", "authorized": "Films"}]
+    out = client.apply_resolved_variants(text, resolved, ["Motion pictures--History"])
+    assert out == "650 _0 $a Films $x History."
+
+
+def test_splits_personal_name_into_subfields(client):
+    text = "600 10 $a Tolkien, John Ronald Reuel"
+    resolved = [{"term": "Tolkien, John Ronald Reuel",
+                 "authorized": "Tolkien, J. R. R. (John Ronald Reuel), 1892-1973"}]
+    out = client.apply_resolved_variants(text, resolved, ["Tolkien, John Ronald Reuel"])
+    assert out == "600 10 $a Tolkien, J. R. R. $q (John Ronald Reuel), $d 1892-1973"
+
+
+def test_skips_replacement_marc_cannot_follow(client):
+    # The authorized form changes the subdivision, which the $a subfield cannot carry
+    text = "1. Motion pictures--History\n650 _0 $a Motion pictures $x History."
+    resolved = [{"term": "Motion pictures--History", "authorized": "Films--History and criticism"}]
+    out = client.apply_resolved_variants(text, resolved, ["Motion pictures--History"])
+    assert out == text
+
+
+def test_nothing_resolved(client):
+    text = "1. Motion pictures"
+    assert client.apply_resolved_variants(text, [], ["Motion pictures"]) is text